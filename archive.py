@@ -0,0 +1,112 @@
+import os
+import sqlite3
+import time
+from threading import Lock
+
+from metadata_cache import CACHE_DIR
+from url_ingest import VIDEO, parse_url
+
+
+def format_key(video_quality, audio_quality):
+    return f'{video_quality}|{audio_quality}'
+
+
+def archive_id_from_url(url):
+    # (extractor, video id) for URLs we can recognise without any network
+    # work; anything else is checked once the resolver knows the ID
+    parsed = parse_url(url)
+    if parsed and parsed[0] == VIDEO:
+        return 'youtube', parsed[1]
+    return None
+
+
+class DownloadArchive:
+    # Index of videos already downloaded, keyed by (extractor, video id,
+    # format choice). Membership is answered from an in-memory set loaded at
+    # startup; SQLite only sees the insert when a download completes.
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CACHE_DIR, 'archive.sqlite3')
+        self.lock = Lock()
+        self.hits = 0
+
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS archive ('
+            ' extractor TEXT NOT NULL,'
+            ' video_id TEXT NOT NULL,'
+            ' format_key TEXT NOT NULL,'
+            ' filename TEXT,'
+            ' completed REAL NOT NULL,'
+            ' PRIMARY KEY (extractor, video_id, format_key))'
+        )
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(playlist_cursors)')]
+        if 'entry_count' in columns:
+            # Cursors used to record an entry count that nothing read
+            self.conn.execute('ALTER TABLE playlist_cursors RENAME TO playlist_cursors_old')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS playlist_cursors ('
+            ' playlist TEXT PRIMARY KEY,'
+            ' head_id TEXT,'
+            ' synced REAL NOT NULL)'
+        )
+        if 'entry_count' in columns:
+            self.conn.execute('INSERT INTO playlist_cursors (playlist, head_id, synced)'
+                              ' SELECT playlist, head_id, synced FROM playlist_cursors_old')
+            self.conn.execute('DROP TABLE playlist_cursors_old')
+        self.conn.commit()
+        self.entries = set(self.conn.execute(
+            'SELECT extractor, video_id, format_key FROM archive'
+        ).fetchall())
+
+    def count(self):
+        return len(self.entries)
+
+    def contains(self, extractor, video_id, key):
+        found = (extractor, video_id, key) in self.entries
+        if found:
+            self.hits += 1
+        return found
+
+    def add(self, extractor, video_id, key, filename=None):
+        entry = (extractor, video_id, key)
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO archive (extractor, video_id, format_key, filename, completed)'
+                ' VALUES (?, ?, ?, ?, ?)',
+                entry + (filename, time.time())
+            )
+            self.conn.commit()
+            self.entries.add(entry)
+
+    def remove(self, extractor, video_id, key):
+        entry = (extractor, video_id, key)
+        with self.lock:
+            self.conn.execute(
+                'DELETE FROM archive WHERE extractor = ? AND video_id = ? AND format_key = ?', entry
+            )
+            self.conn.commit()
+            self.entries.discard(entry)
+
+    def get_cursor(self, playlist):
+        # Newest entry of the last channel sync whose jobs all completed
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT head_id FROM playlist_cursors WHERE playlist = ?', (playlist,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_cursor(self, playlist, head_id):
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO playlist_cursors (playlist, head_id, synced) VALUES (?, ?, ?)',
+                (playlist, head_id, time.time())
+            )
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,136 @@
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+# Media paths look like /media/<name>.<ext>?size=<bytes>
+MEDIA_RE = re.compile(r'^/media/(?P<name>[^/?]+)\?size=(?P<size>\d+)$')
+RANGE_RE = re.compile(r'^bytes=(\d+)-(\d*)$')
+BLOCK = bytes(range(256)) * 256  # 64 KB pattern the bodies are cut from
+THUMBNAIL = b'\xff\xd8\xff\xe0' + bytes(4092)  # JPEG magic, not a real image
+
+
+def media_bytes(start, end):
+    # Body of bytes [start, end) of any synthetic file, one block at a time
+    while start < end:
+        offset = start % len(BLOCK)
+        chunk = BLOCK[offset:offset + min(len(BLOCK) - offset, end - start)]
+        yield chunk
+        start += len(chunk)
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.serve(send_body=False)
+
+    def do_GET(self):
+        self.serve(send_body=True)
+
+    def serve(self, send_body):
+        server = self.server
+        server.count('requests')
+        if server.latency:
+            time.sleep(server.latency)
+        if server.fail_rate and random.random() < server.fail_rate:
+            server.count('failures')
+            self.send_error(503)
+            return
+
+        if self.path.startswith('/thumb/'):
+            self.send_body(200, THUMBNAIL, 'image/jpeg', send_body)
+            return
+        match = MEDIA_RE.match(self.path)
+        if not match:
+            self.send_error(404)
+            return
+
+        size = int(match.group('size'))
+        start, end, status = 0, size, 200
+        byte_range = RANGE_RE.match(self.headers.get('Range', ''))
+        if byte_range:
+            start = int(byte_range.group(1))
+            end = min(size, int(byte_range.group(2)) + 1) if byte_range.group(2) else size
+            if start >= size:
+                self.send_error(416)
+                return
+            status = 206
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start))
+        self.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end - 1}/{size}')
+        self.end_headers()
+        if not send_body:
+            return
+
+        # Per-connection throttle: each chunk is paced to the configured rate
+        started = time.monotonic()
+        sent = 0
+        try:
+            for chunk in media_bytes(start, end):
+                self.wfile.write(chunk)
+                sent += len(chunk)
+                if server.throttle:
+                    delay = sent / server.throttle - (time.monotonic() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        server.count('bytes', sent)
+
+    def send_body(self, status, body, content_type, send_body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+            self.server.count('bytes', len(body))
+
+
+class MediaServer(ThreadingHTTPServer):
+    # Local stand-in for a video CDN: serves synthetic files of any size
+    # with Range support, optional per-connection throttling (bytes/s),
+    # a fixed latency before each response and a random failure rate.
+    daemon_threads = True
+
+    def __init__(self, port=0, throttle=None, latency=0.0, fail_rate=0.0):
+        super().__init__(('127.0.0.1', port), MediaHandler)
+        self.throttle = throttle
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.lock = Lock()
+        self.counters = {'requests': 0, 'failures': 0, 'bytes': 0}
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def media_url(self, name, size):
+        return f'{self.base_url}/media/{name}?size={size}'
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.counters[key] += amount
+
+    def start(self):
+        self.thread = Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
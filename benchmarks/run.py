@@ -0,0 +1,232 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; peak RSS is then omitted
+    resource = None
+
+from benchmarks.media_server import MediaServer
+from benchmarks.stub_engine import StubEngine
+from download_engine import summarize_info
+from format_planner import plan_formats
+from metadata_cache import MetadataCache
+from thumbnail_cache import ThumbnailCache
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+MB = 1024 * 1024
+
+# Sizes at --scale 1
+SCENARIOS = {
+    'small_files': {'jobs': 200, 'size': 256 * 1024},
+    'huge_file': {'jobs': 1, 'size': 512 * MB, 'segments': 4},
+    'large_playlist': {'entries': 2000, 'size': 64 * 1024},
+    'preview_heavy': {'previews': 500},
+}
+
+# Metric -> True if a larger value is better
+COMPARED_METRICS = {
+    'jobs_per_s': True,
+    'mb_per_s': True,
+    'ttfb_p95': False,
+    'peak_rss_mb': False,
+    'hook_calls': False,
+    'event_calls': False,
+}
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (MB if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_downloads(engine, server, spec, scale):
+    size = spec['size']
+    engine.start()
+    started = time.monotonic()
+    if 'entries' in spec:
+        count = max(1, int(spec['entries'] * scale))
+        url = f'{server.base_url}/playlist/bench?count={count}&size={size}'
+        jobs = len(engine.submit_playlist(url, priority='low'))
+    else:
+        jobs = max(1, int(spec['jobs'] * scale))
+        for index in range(jobs):
+            engine.submit(f'{server.base_url}/watch/v{index:06d}?size={size}',
+                          segments=spec.get('segments', 1))
+    engine.wait()
+    elapsed = time.monotonic() - started
+    engine.stop()
+    return jobs, engine.progress.failed_jobs, elapsed
+
+
+def run_previews(engine, server, spec, scale, folder):
+    # What the GUI does per pasted URL: resolve, plan, summarise and show a
+    # thumbnail. Every URL is previewed twice; the second round is served
+    # by the metadata and thumbnail caches.
+    engine.metadata_cache = MetadataCache(':memory:')
+    thumbnails = ThumbnailCache(os.path.join(folder, 'thumbnails'))
+    count = max(1, int(spec['previews'] * scale))
+    started = time.monotonic()
+    first_bytes = []
+    for _ in range(2):
+        for index in range(count):
+            begin = time.monotonic()
+            info = engine.fetch_video_info(f'{server.base_url}/watch/p{index:06d}?size={MB}')
+            summary = summarize_info(info, plan_formats(info, '1080p', '192kbps'))
+            thumbnails.get(info['id'], summary['thumbnail'])
+            first_bytes.append(time.monotonic() - begin)
+    elapsed = time.monotonic() - started
+    return count * 2, 0, elapsed, first_bytes
+
+
+def run_scenario(name, scale=1.0, workers=3, throttle=None, latency=0.0, fail_rate=0.0,
+                 dash=False):
+    spec = SCENARIOS[name]
+    server = MediaServer(throttle=throttle, latency=latency, fail_rate=fail_rate).start()
+    folder = tempfile.mkdtemp(prefix='ytdl-bench-')
+    engine = StubEngine(server, dash=dash, download_folder=folder, workers=workers,
+                        adaptive=False)
+    try:
+        if 'previews' in spec:
+            jobs, failed, elapsed, first_bytes = run_previews(engine, server, spec, scale, folder)
+        else:
+            jobs, failed, elapsed = run_downloads(engine, server, spec, scale)
+            first_bytes = engine.time_to_first_byte()
+    finally:
+        server.stop()
+        shutil.rmtree(folder, ignore_errors=True)
+
+    served = server.stats()
+    return {
+        'scenario': name,
+        'jobs': jobs,
+        'failed': failed,
+        'seconds': round(elapsed, 3),
+        'jobs_per_s': round(jobs / elapsed, 2) if elapsed else None,
+        'mb_per_s': round(served['bytes'] / MB / elapsed, 2) if elapsed else None,
+        'ttfb_avg': round(sum(first_bytes) / len(first_bytes), 4) if first_bytes else None,
+        'ttfb_p95': round(percentile(first_bytes, 0.95), 4) if first_bytes else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'hook_calls': engine.hook_calls,
+        'event_calls': engine.event_calls,
+        'requests': served['requests'],
+        'server_failures': served['failures'],
+    }
+
+
+def run_isolated(name, args):
+    # One process per scenario so peak RSS belongs to that scenario alone
+    command = [sys.executable, '-m', 'benchmarks.run', '--child', name,
+               '--scale', str(args.scale), '--workers', str(args.workers),
+               '--latency', str(args.latency), '--fail-rate', str(args.fail_rate)]
+    if args.throttle:
+        command += ['--throttle', str(args.throttle)]
+    if args.dash:
+        command.append('--dash')
+    result = subprocess.run(command, cwd=REPO_DIR, stdout=subprocess.PIPE, check=True)
+    return json.loads(result.stdout.decode().strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    # Lines describing each compared metric, plus whether any regressed by
+    # more than tolerance (a fraction of the baseline value) or has no
+    # baseline at all
+    lines = []
+    regressed = False
+    for result in results:
+        base = baseline.get(result['scenario'])
+        if not base:
+            # Nothing to compare against is a failure, not a pass
+            lines.append(f"{result['scenario']:>15} no baseline (run with --save-baseline)  MISSING")
+            regressed = True
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = ''
+            if worse > tolerance:
+                flag = '  REGRESSION'
+                regressed = True
+            lines.append(f"{result['scenario']:>15} {metric:<12} {old:>10} -> {new:<10} "
+                         f"({change:+.1%}){flag}")
+    return lines, regressed
+
+
+def print_result(result):
+    print(f"{result['scenario']:>15}: {result['jobs']} jobs in {result['seconds']}s, "
+          f"{result['jobs_per_s']} jobs/s, {result['mb_per_s']} MB/s, "
+          f"TTFB p95 {result['ttfb_p95']}s, peak RSS {result['peak_rss_mb']} MB, "
+          f"{result['hook_calls']} hook / {result['event_calls']} event callbacks"
+          + (f", {result['failed']} failed" if result['failed'] else ''), flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.run',
+        description='Measure the download engine against a local media server.'
+    )
+    parser.add_argument('scenarios', nargs='*', help=f"any of {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply job counts by this')
+    parser.add_argument('--workers', type=int, default=3, help='simultaneous downloads')
+    parser.add_argument('--throttle', type=int, default=None, help='per-connection bytes/s')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before each response')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='fraction of requests answered 503')
+    parser.add_argument('--dash', action='store_true', help='separate video/audio streams (needs ffmpeg)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='write these results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='allowed regression before failing')
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(sorted(unknown))}")
+
+    if args.child:
+        result = run_scenario(args.child, args.scale, args.workers, args.throttle,
+                              args.latency, args.fail_rate, args.dash)
+        print(json.dumps(result))
+        return 0
+
+    results = []
+    for name in args.scenarios or list(SCENARIOS):
+        result = run_isolated(name, args)
+        print_result(result)
+        results.append(result)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({result['scenario']: result for result in results}, f, indent=2)
+        print(f'Baseline written to {args.baseline}')
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}; create one with --save-baseline', file=sys.stderr)
+        return 2
+    with open(args.baseline) as f:
+        lines, regressed = compare(results, json.load(f), args.tolerance)
+    print('\n'.join(lines))
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,58 @@
+import argparse
+import json
+import subprocess
+import sys
+
+from benchmarks.run import REPO_DIR
+
+# Runs in a fresh interpreter: how long the GUI's non-Kivy imports take,
+# whether they pulled in yt_dlp, and how long the background warm-up takes
+PROBE = '''
+import json, sys, time
+begin = time.perf_counter()
+import download_engine
+imported = time.perf_counter() - begin
+loaded_early = 'yt_dlp' in sys.modules
+engine = download_engine.DownloadEngine()
+warm_up = engine.warm_up()
+print(json.dumps({'import': imported, 'yt_dlp_at_import': loaded_early, 'warm_up': warm_up}))
+'''
+
+
+def measure(runs):
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', PROBE], cwd=REPO_DIR,
+                                stdout=subprocess.PIPE, check=True).stdout
+        results.append(json.loads(output.decode().strip().splitlines()[-1]))
+    return {
+        'import': min(r['import'] for r in results),
+        'warm_up': min(r['warm_up'] for r in results),
+        'yt_dlp_at_import': any(r['yt_dlp_at_import'] for r in results),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.startup',
+        description='Check that startup imports stay fast and do not load yt_dlp.'
+    )
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters to try (best is kept)')
+    parser.add_argument('--max-import', type=float, default=0.5,
+                        help='fail if importing the engine takes longer than this many seconds')
+    args = parser.parse_args(argv)
+
+    result = measure(args.runs)
+    print(f"import {result['import']:.3f}s, yt_dlp warm-up {result['warm_up']:.3f}s "
+          f"(off the UI thread)")
+    if result['yt_dlp_at_import']:
+        print('yt_dlp was imported at startup')
+        return 1
+    if result['import'] > args.max_import:
+        print(f"import slower than {args.max_import}s")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import time
+from threading import Lock
+from urllib.parse import parse_qs, urlsplit
+
+from download_engine import DownloadEngine
+
+DURATION = 120  # seconds; only used for size estimates
+
+
+def stub_info(server, video_id, size, dash=False):
+    # What extract_info(process=False) would return for a video hosted on the
+    # local media server: either one progressive MP4 or a DASH-style pair of
+    # video-only and audio-only streams (merged afterwards, needs ffmpeg)
+    if dash:
+        audio_size = max(1, size // 10)
+        formats = [
+            {'format_id': '137', 'ext': 'mp4', 'vcodec': 'avc1.640028', 'acodec': 'none',
+             'height': 1080, 'width': 1920, 'format_note': '1080p', 'protocol': 'http',
+             'filesize': size - audio_size, 'url': server.media_url(f'{video_id}.f137.mp4', size - audio_size)},
+            {'format_id': '140', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a.40.2',
+             'abr': 129, 'protocol': 'http',
+             'filesize': audio_size, 'url': server.media_url(f'{video_id}.f140.m4a', audio_size)},
+        ]
+    else:
+        formats = [
+            {'format_id': '22', 'ext': 'mp4', 'vcodec': 'avc1.64001F', 'acodec': 'mp4a.40.2',
+             'height': 1080, 'width': 1920, 'format_note': '1080p', 'abr': 192, 'protocol': 'http',
+             'filesize': size, 'url': server.media_url(f'{video_id}.mp4', size)},
+        ]
+    webpage_url = f'{server.base_url}/watch/{video_id}?size={size}'
+    return {
+        'id': video_id,
+        'title': f'Benchmark {video_id}',
+        'duration': DURATION,
+        'extractor': 'generic',
+        'extractor_key': 'Generic',
+        'webpage_url': webpage_url,
+        'webpage_url_basename': video_id,
+        'webpage_url_domain': '127.0.0.1',
+        'thumbnails': [{'url': f'{server.base_url}/thumb/{video_id}.jpg', 'width': 320, 'height': 180}],
+        'formats': formats,
+    }
+
+
+class StubEngine(DownloadEngine):
+    # DownloadEngine with extraction answered locally. Video URLs look like
+    # <server>/watch/<id>?size=<bytes> and playlist URLs like
+    # <server>/playlist/<name>?count=<n>&size=<bytes>; everything after
+    # extraction (planning, yt-dlp transfers, merging, progress) is the real
+    # code path. Also records the timings and callback counts the benchmark
+    # reports.
+
+    def __init__(self, server, dash=False, extract_latency=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.server = server
+        self.dash = dash
+        self.extract_latency = extract_latency
+        self.counter_lock = Lock()
+        self.submitted_at = {}
+        self.first_byte_at = {}
+        self.hook_calls = 0
+        self.event_calls = 0
+
+    def submit(self, url, *args, **kwargs):
+        submitted = time.monotonic()
+        job_id = super().submit(url, *args, **kwargs)
+        if job_id is not None:
+            self.submitted_at[job_id] = submitted
+        return job_id
+
+    def emit(self, event, job):
+        # Every listener call is one UI-thread hop in the GUI
+        with self.counter_lock:
+            self.event_calls += 1
+        super().emit(event, job)
+
+    def progress_hook(self, job, d):
+        with self.counter_lock:
+            self.hook_calls += 1
+        if job['id'] not in self.first_byte_at and d.get('downloaded_bytes'):
+            self.first_byte_at[job['id']] = time.monotonic()
+        super().progress_hook(job, d)
+
+    def extract_video_info(self, url):
+        if self.extract_latency:
+            time.sleep(self.extract_latency)
+        parts = urlsplit(url)
+        size = int(parse_qs(parts.query).get('size', ['1048576'])[0])
+        return stub_info(self.server, parts.path.rsplit('/', 1)[-1], size, self.dash)
+
+    def iter_playlist_entries(self, url):
+        parts = urlsplit(url)
+        query = parse_qs(parts.query)
+        name = parts.path.rsplit('/', 1)[-1]
+        size = int(query.get('size', ['1048576'])[0])
+        for index in range(int(query.get('count', ['100'])[0])):
+            video_id = f'{name}-{index:06d}'
+            yield {
+                'url': f'{self.server.base_url}/watch/{video_id}?size={size}',
+                'id': video_id,
+                'title': f'Benchmark {video_id}',
+                'duration': DURATION,
+            }
+
+    def time_to_first_byte(self):
+        return [self.first_byte_at[job_id] - self.submitted_at[job_id]
+                for job_id in self.first_byte_at if job_id in self.submitted_at]
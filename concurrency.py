@@ -0,0 +1,123 @@
+import time
+from threading import Thread, Condition, Event
+
+
+class ConcurrencyController:
+    # Decides how many download workers may run at once. Every interval it
+    # samples aggregate throughput and grows the limit by one worker while
+    # that keeps paying off (additive increase). When an added worker brings
+    # no gain, or throughput collapses, it cuts the limit by a factor
+    # (multiplicative decrease) and holds for a few intervals before probing
+    # again.
+
+    def __init__(self, min_workers=1, max_workers=8, initial=3, adaptive=True,
+                 interval=5.0, min_gain=0.05, decrease_factor=0.75, hold_intervals=3):
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers)
+        self.target = min(max(initial, self.min_workers), self.max_workers)
+        self.adaptive = adaptive
+        self.interval = interval
+        self.min_gain = min_gain
+        self.decrease_factor = decrease_factor
+        self.hold_intervals = hold_intervals
+
+        self.active = 0
+        self.closed = False
+        self.condition = Condition()
+        self.stopping = Event()
+        self.thread = None
+        self.on_change = None
+
+        self.last_throughput = None
+        self.last_action = 'start'
+        self.hold = 0
+        self.last_decision = self.make_decision('start', 'initial limit', 0.0, 0)
+
+    def acquire(self):
+        # Block until a worker slot is free; False once the controller closes
+        with self.condition:
+            self.condition.wait_for(lambda: self.closed or self.active < self.target)
+            if self.closed:
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+    def set_target(self, target):
+        with self.condition:
+            self.target = min(max(target, self.min_workers), self.max_workers)
+            self.condition.notify_all()
+
+    def start(self, sample):
+        # sample() returns (aggregate bytes/s, number of jobs waiting)
+        if not self.adaptive or self.thread:
+            return
+        self.stopping.clear()
+        self.thread = Thread(target=self.run, args=(sample,), daemon=True)
+        self.thread.start()
+
+    def run(self, sample):
+        while not self.stopping.wait(self.interval):
+            throughput, backlog = sample()
+            self.adjust(throughput, backlog)
+
+    def close(self):
+        self.stopping.set()
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def adjust(self, throughput, backlog):
+        previous = self.last_throughput
+        self.last_throughput = throughput
+        target = self.target
+        busy = self.active >= target
+
+        if self.hold > 0:
+            self.hold -= 1
+            action, reason = 'hold', 'cooling down after decrease'
+        elif previous is not None and throughput < previous * self.decrease_factor:
+            action, reason = 'decrease', 'throughput dropped'
+        elif self.last_action == 'increase' and previous is not None \
+                and throughput < previous * (1 + self.min_gain):
+            action, reason = 'decrease', 'extra worker brought no gain'
+        elif backlog > 0 and busy and target < self.max_workers:
+            action, reason = 'increase', 'probing for more throughput'
+        else:
+            action, reason = 'hold', 'no backlog' if backlog <= 0 else 'steady'
+
+        if action == 'increase':
+            self.set_target(target + 1)
+        elif action == 'decrease':
+            self.set_target(int(target * self.decrease_factor))
+            self.hold = self.hold_intervals
+
+        self.last_action = action
+        self.last_decision = self.make_decision(action, reason, throughput, backlog)
+        if self.on_change and self.target != target:
+            self.on_change(self.last_decision)
+        return self.last_decision
+
+    def make_decision(self, action, reason, throughput, backlog):
+        active = self.active
+        return {
+            'time': time.time(),
+            'action': action,
+            'reason': reason,
+            'target': self.target,
+            'active': active,
+            'throughput': throughput,
+            'per_job_speed': throughput / active if active else 0.0,
+            'backlog': backlog,
+            'bounds': (self.min_workers, self.max_workers),
+        }
+
+    def decision(self):
+        return dict(self.last_decision)
@@ -0,0 +1,378 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from archive import DownloadArchive
+from download_engine import (AUDIO_QUALITIES, DEFAULT_RETENTION, FILENAME_FORMATS, VIDEO_QUALITIES,
+                             DownloadEngine, is_playlist_url, public_job)
+from journal import JobJournal
+from metadata_cache import MetadataCache
+from scheduler import PRIORITIES, parse_rate
+from storage import DEFAULT_MIN_FREE, parse_size
+from url_ingest import extract_urls
+
+DEFAULT_PORT = 8765
+MAX_BODY = 1024 * 1024
+SNAPSHOT_INTERVAL = 0.2  # the job list served to pollers is at most this old
+PROGRESS_INTERVAL = 1.0  # seconds between progress events on /events
+KEEPALIVE_INTERVAL = 15.0
+PLAYLIST_MODES = ('Download All', 'Download First')
+REASONS = {
+    200: 'OK',
+    202: 'Accepted',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    409: 'Conflict',
+    413: 'Payload Too Large',
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def job_request(body):
+    # Validated (urls, options, playlist mode) from a POST /jobs body. Takes
+    # the same options as the GUI's add_to_queue.
+    if not isinstance(body, dict):
+        raise HTTPError(400, 'Expected a JSON object')
+    urls = body.get('urls') or ([body['url']] if body.get('url') else [])
+    if not isinstance(urls, list) or not urls or not all(isinstance(url, str) for url in urls):
+        raise HTTPError(400, "'url' or 'urls' is required")
+    options = {
+        'video_quality': body.get('video_quality', '1080p'),
+        'audio_quality': body.get('audio_quality', '192kbps'),
+        'filename_format': body.get('filename_format', 'Title Only'),
+        'priority': body.get('priority', 'normal'),
+        'segments': body.get('segments', 1),
+    }
+    if body.get('download_folder'):
+        options['download_folder'] = os.path.expanduser(str(body['download_folder']))
+    for name, choices in (('video_quality', VIDEO_QUALITIES), ('audio_quality', AUDIO_QUALITIES),
+                          ('filename_format', FILENAME_FORMATS), ('priority', PRIORITIES)):
+        if options[name] not in choices:
+            raise HTTPError(400, f"Unknown {name}: {options[name]}")
+    # bool is an int subclass, but true/false isn't a segment count
+    segments = options['segments']
+    if not isinstance(segments, int) or isinstance(segments, bool) or not 1 <= segments <= 16:
+        raise HTTPError(400, 'segments must be an integer from 1 to 16')
+    mode = body.get('playlist_mode', 'Download All')
+    if mode not in PLAYLIST_MODES:
+        raise HTTPError(400, f'Unknown playlist_mode: {mode}')
+
+    # Same canonicalisation as pasted text; other links pass through as-is
+    canonical = []
+    for url in urls:
+        canonical.extend(extract_urls(url) or [url.strip()])
+    return canonical, options, mode
+
+
+class DownloadDaemon:
+    # Localhost HTTP/JSON front end to one DownloadEngine:
+    #
+    #   POST   /jobs        submit {"url" | "urls", options...}
+    #   GET    /jobs        all jobs (?state=queued to filter)
+    #   GET    /jobs/<id>   one job
+    #   DELETE /jobs/<id>   cancel a job, also mid-download
+    #   POST   /jobs/<id>/pause, /jobs/<id>/resume
+    #                       stop a job keeping its partial files, continue it
+    #   GET    /events      server-sent events: job state changes + progress
+    #   GET    /stats       engine metrics
+    #
+    # Polls of /jobs are answered from per-job JSON kept up to date every
+    # SNAPSHOT_INTERVAL: only jobs that had an event or are downloading are
+    # re-read from the engine, and the list is joined again only after one
+    # of them changed. Worker threads only hand events to the event loop;
+    # they never wait on a client.
+
+    def __init__(self, engine, port=DEFAULT_PORT):
+        self.engine = engine
+        self.port = port
+        self.loop = None
+        self.server = None
+        self.subscribers = set()
+        self.jobs = {}    # job id -> its status as JSON
+        self.states = {}  # job id -> state, for ?state=
+        self.dirty = set()
+        self.snapshot = b'[]'
+        self.pending_playlists = set()
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.engine.add_listener(self.on_engine_event)
+        with self.engine.lock:
+            self.dirty.update(self.engine.jobs)  # restored before we listened
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', self.port)
+        refresher = asyncio.create_task(self.refresh())
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            refresher.cancel()
+
+    async def refresh(self):
+        last_progress = 0.0
+        while True:
+            self.engine.evict_finished()
+            self.update_jobs()
+            now = time.monotonic()
+            if self.subscribers and now - last_progress >= PROGRESS_INTERVAL:
+                last_progress = now
+                snapshot = self.engine.progress.snapshot()
+                snapshot['queued'] = self.engine.download_queue.qsize()
+                self.broadcast('progress', snapshot)
+            await asyncio.sleep(SNAPSHOT_INTERVAL)
+
+    def update_jobs(self):
+        # Re-reads the jobs that changed since the last tick, plus the ones
+        # whose progress moves without events
+        changed = self.dirty | set(self.engine.progress.active)
+        self.dirty.clear()
+        for job_id in changed:
+            status = self.engine.status(job_id)
+            if status is None:  # evicted
+                self.jobs.pop(job_id, None)
+                self.states.pop(job_id, None)
+            else:
+                self.jobs[job_id] = json.dumps(status).encode()
+                self.states[job_id] = status['state']
+        if changed:
+            self.snapshot = None
+
+    def job_list(self, states=None):
+        if states is not None:
+            return b'[' + b','.join(data for job_id, data in self.jobs.items()
+                                    if self.states[job_id] in states) + b']'
+        if self.snapshot is None:
+            self.snapshot = b'[' + b','.join(self.jobs.values()) + b']'
+        return self.snapshot
+
+    def on_engine_event(self, event, job):
+        # Engine worker thread
+        if self.loop is None:
+            return
+        self.loop.call_soon_threadsafe(self.dirty.add, job['id'])
+        if self.subscribers:
+            self.loop.call_soon_threadsafe(self.broadcast, event, public_job(job))
+
+    def broadcast(self, event, data):
+        message = f'event: {event}\ndata: {json.dumps(data)}\n\n'.encode()
+        for queue in list(self.subscribers):
+            # A client that stopped reading loses events instead of holding
+            # memory or the loop
+            if not queue.full():
+                queue.put_nowait(message)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self.read_request(reader)
+                except HTTPError as e:
+                    self.write_response(writer, e.status, {'error': str(e)}, keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, path, query, headers, body = request
+                if method == 'GET' and path == '/events':
+                    await self.stream_events(writer)
+                    break
+                try:
+                    status, payload = await self.route(method, path, query, body)
+                except HTTPError as e:
+                    status, payload = e.status, {'error': str(e)}
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                self.write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            raise HTTPError(400, 'Malformed request line')
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        body = None
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise HTTPError(400, 'Invalid Content-Length')
+        if length > MAX_BODY:
+            raise HTTPError(413, 'Request body too large')
+        if length:
+            try:
+                body = json.loads(await reader.readexactly(length))
+            except ValueError:
+                raise HTTPError(400, 'Body is not valid JSON')
+        parts = urlsplit(target)
+        return method.upper(), parts.path.rstrip('/') or '/', parse_qs(parts.query), headers, body
+
+    async def route(self, method, path, query, body):
+        if path == '/jobs':
+            if method == 'GET':
+                return 200, self.job_list(set(query['state']) if 'state' in query else None)
+            if method == 'POST':
+                return self.submit(body)
+            raise HTTPError(405, 'Use GET or POST')
+
+        if path.startswith('/jobs/'):
+            job_id, _, action = path[len('/jobs/'):].partition('/')
+            try:
+                job_id = int(job_id)
+            except ValueError:
+                raise HTTPError(404, 'No such job')
+            if self.engine.status(job_id) is None:
+                raise HTTPError(404, 'No such job')
+            if action:
+                if action not in ('pause', 'resume'):
+                    raise HTTPError(404, 'Not found')
+                if method != 'POST':
+                    raise HTTPError(405, 'Use POST')
+                if not getattr(self.engine, action)(job_id):
+                    raise HTTPError(409, f"Job can't be {action}d in its current state")
+                return 200, self.engine.status(job_id)
+            if method == 'GET':
+                return 200, self.engine.status(job_id)
+            if method == 'DELETE':
+                if not self.engine.cancel(job_id):
+                    raise HTTPError(409, 'Job has already finished')
+                return 200, self.engine.status(job_id)
+            raise HTTPError(405, 'Use GET or DELETE')
+
+        if path == '/stats' and method == 'GET':
+            return 200, self.engine.stats()
+        raise HTTPError(404, 'Not found')
+
+    def submit(self, body):
+        urls, options, mode = job_request(body)
+        job_ids = []
+        playlists = []
+        for url in urls:
+            if is_playlist_url(url):
+                playlists.append(url)
+                # Listing a playlist is network-bound; entries show up in
+                # /jobs and /events as they are queued
+                task = self.loop.run_in_executor(None, self.submit_playlist, url, mode, options)
+                self.pending_playlists.add(task)
+                task.add_done_callback(self.pending_playlists.discard)
+            else:
+                job_ids.append(self.engine.submit(url, **options))
+        return (202 if playlists else 200), {'job_ids': job_ids, 'playlists': playlists}
+
+    def submit_playlist(self, url, mode, options):
+        try:
+            self.engine.submit_playlist(url, mode=mode, **options)
+        except Exception as e:
+            self.loop.call_soon_threadsafe(self.broadcast, 'playlist_error',
+                                           {'url': url, 'error': str(e)})
+
+    async def stream_events(self, writer):
+        queue = asyncio.Queue(maxsize=1000)
+        writer.write(b'HTTP/1.1 200 OK\r\n'
+                     b'Content-Type: text/event-stream\r\n'
+                     b'Cache-Control: no-cache\r\n'
+                     b'Connection: keep-alive\r\n\r\n')
+        self.subscribers.add(queue)
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    message = b': keep-alive\n\n'
+                writer.write(message)
+                await writer.drain()
+        finally:
+            self.subscribers.discard(queue)
+
+    def write_response(self, writer, status, payload, keep_alive=True):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        writer.write(
+            f'HTTP/1.1 {status} {REASONS.get(status, "")}\r\n'
+            f'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode('latin-1') + body
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m download_daemon',
+        description='Run the download engine as a long-lived service with a localhost JSON API.'
+    )
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='port on 127.0.0.1')
+    parser.add_argument('--workers', type=int, default=3, help='initial simultaneous downloads')
+    parser.add_argument('--max-workers', type=int, default=8, help='upper bound for adaptive concurrency')
+    parser.add_argument('-o', '--output', default=os.getcwd(), help='default download folder')
+    parser.add_argument('--rate-limit', type=parse_rate, default=None,
+                        help='total bandwidth cap, e.g. 5M or 800K (bytes/s)')
+    parser.add_argument('--no-journal', action='store_true', help='keep the queue in memory only')
+    parser.add_argument('--no-archive', action='store_true', help='download even if already archived')
+    parser.add_argument('--metrics-log', default=None, help='append one JSON line per finished job here')
+    parser.add_argument('--staging-dir', default=None,
+                        help='download into this (fast, local) folder and move finished files out')
+    parser.add_argument('--min-free', type=parse_size, default=DEFAULT_MIN_FREE,
+                        help='free space to leave on each disk; jobs wait while they would not fit')
+    parser.add_argument('--max-retries', type=int, default=5,
+                        help='retries for network and throttling failures (with backoff)')
+    parser.add_argument('--retention', type=float, default=DEFAULT_RETENTION,
+                        help='seconds finished jobs stay listed in /jobs')
+    args = parser.parse_args(argv)
+
+    engine = DownloadEngine(
+        download_folder=args.output,
+        workers=max(1, args.workers),
+        max_workers=args.max_workers,
+        metadata_cache=MetadataCache(),
+        rate_limit=args.rate_limit,
+        journal=None if args.no_journal else JobJournal(),
+        archive=None if args.no_archive else DownloadArchive(),
+        metrics_log=args.metrics_log,
+        staging_dir=args.staging_dir,
+        min_free=args.min_free,
+        max_retries=args.max_retries,
+        retention=args.retention
+    )
+    engine.start()
+    restored = engine.restore()
+    if restored:
+        print(f'Resumed {len(restored)} unfinished job(s)', flush=True)
+
+    daemon = DownloadDaemon(engine, args.port)
+    print(f'Listening on http://127.0.0.1:{args.port}', flush=True)
+    try:
+        asyncio.run(daemon.serve())
+    except KeyboardInterrupt:
+        # Unfinished jobs are in the journal and resume on the next start
+        pass
+    finally:
+        engine.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1163 @@
+import argparse
+import copy
+import itertools
+import os
+import sys
+import time
+from collections import deque
+from threading import Thread, Lock, Condition
+
+from concurrency import ConcurrencyController
+from format_planner import plan_formats
+from archive import DownloadArchive, archive_id_from_url, format_key
+from journal import JobJournal
+from leased_queue import PLAYLIST as SHARED_PLAYLIST, VIDEO as SHARED_VIDEO, ClusterWorker, LeasedJobQueue
+from metadata_cache import MetadataCache, cache_key
+from metrics import Metrics, MetricsServer, error_class
+from postprocess import PostProcessingStage, info_metadata, merged_filename, part_template
+from progress import ProgressTracker, format_bytes
+from retry import FATAL, POSTPROCESS, UNAVAILABLE, CircuitBreaker, RetryPolicy, RetryScheduler, classify, \
+    host_key, retry_after
+from storage import DEFAULT_MIN_FREE, InsufficientSpace, StorageManager, parse_size
+from scheduler import PRIORITIES, BandwidthScheduler, PriorityJobQueue, parse_rate
+from url_ingest import extract_links
+from ydl_pool import YoutubeDLPool
+
+# Audio-only "qualities" -> container the audio stream is copied into (None
+# keeps whatever the site serves). No video stream is fetched for these.
+AUDIO_ONLY = {'Audio Only': None, 'Audio Only (M4A)': 'm4a', 'Audio Only (Opus)': 'opus'}
+VIDEO_QUALITIES = ('1440p', '2160p (4K)', '1080p', '720p', '480p', '360p', 'Best Available') + tuple(AUDIO_ONLY)
+AUDIO_QUALITIES = ('320kbps', '256kbps', '192kbps', '128kbps', 'Best Available')
+FILENAME_FORMATS = ('Title Only', 'Title + Quality', 'ID + Title', 'Custom')
+
+# Job states
+QUEUED = 'queued'
+DOWNLOADING = 'downloading'
+PROCESSING = 'processing'
+PAUSED = 'paused'
+FINISHED = 'finished'
+FAILED = 'error'
+SKIPPED = 'skipped'
+CANCELLED = 'cancelled'
+DONE_STATES = (FINISHED, FAILED, SKIPPED, CANCELLED)
+SHUTDOWN = 'shutdown'  # stop reason for transfers still running at stop()
+DEFAULT_RETENTION = 3600  # seconds a finished job stays in status()
+
+# Seconds between free-space checks for a job waiting on disk space, in
+# case space is freed by something other than a finishing job
+SPACE_RECHECK = 5.0
+
+
+class JobInterrupted(Exception):
+    # Raised inside a running transfer to unwind it after pause() or cancel()
+
+    def __init__(self, reason):
+        super().__init__(f'Job {reason}')
+        self.reason = reason
+
+
+def interruption(error):
+    # The JobInterrupted behind error, also when yt-dlp wrapped it
+    cause = getattr(error, 'exc_info', None)
+    if cause and isinstance(cause[1], JobInterrupted):
+        return cause[1]
+    return error if isinstance(error, JobInterrupted) else None
+
+
+def get_format_string(video_quality, audio_quality):
+    # Map quality names to format specifications
+    video_map = {
+        '2160p (4K)': 'bestvideo[height<=2160][ext=mp4]',
+        '1440p': 'bestvideo[height<=1440][ext=mp4]',
+        '1080p': 'bestvideo[height<=1080][ext=mp4]',
+        '720p': 'bestvideo[height<=720][ext=mp4]',
+        '480p': 'bestvideo[height<=480][ext=mp4]',
+        '360p': 'bestvideo[height<=360][ext=mp4]',
+        'Best Available': 'bestvideo[ext=mp4]'
+    }
+
+    audio_map = {
+        '320kbps': 'bestaudio[abr>=320]',
+        '256kbps': 'bestaudio[abr>=256]',
+        '192kbps': 'bestaudio[abr>=192]',
+        '128kbps': 'bestaudio[abr>=128]',
+        'Best Available': 'bestaudio'
+    }
+
+    video_fmt = video_map.get(video_quality, 'bestvideo[ext=mp4]')
+    audio_fmt = audio_map.get(audio_quality, 'bestaudio')
+
+    if video_quality in AUDIO_ONLY:
+        return f'{audio_fmt}/bestaudio'
+    return f'{video_fmt}+{audio_fmt}/best'
+
+
+def get_filename_template(format_option):
+    templates = {
+        'Title Only': '%(title)s.%(ext)s',
+        'Title + Quality': '%(title)s [%(resolution)s].%(ext)s',
+        'ID + Title': '%(id)s - %(title)s.%(ext)s',
+        'Custom': '%(title)s.%(ext)s'  # Default if custom not implemented
+    }
+    return templates.get(format_option, '%(title)s.%(ext)s')
+
+
+def format_duration(duration):
+    minutes, seconds = divmod(int(duration or 0), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours > 0:
+        return f'{hours}:{minutes:02d}:{seconds:02d}'
+    return f'{minutes}:{seconds:02d}'
+
+
+def summarize_info(info, plan=None):
+    # Condense an extract_info result into the fields shown in the preview
+    formats = info.get('formats') or []
+    resolutions = set()
+    audio_qualities = set()
+
+    for f in formats:
+        if f.get('vcodec') != 'none':  # Video format
+            res = f.get('format_note', '')
+            if res:
+                resolutions.add(res)
+        elif f.get('acodec') != 'none':  # Audio format
+            abr = f.get('abr', 0)
+            if abr:
+                audio_qualities.add(f'{int(abr)}kbps')
+
+    # Sort and format resolutions
+    resolution_order = ['2160p', '1440p', '1080p', '720p', '480p', '360p', '240p', '144p']
+    sorted_res = sorted(resolutions, key=lambda x: resolution_order.index(x) if x in resolution_order else 100)
+
+    # Sort audio qualities
+    sorted_audio = sorted(audio_qualities, key=lambda x: int(x.replace('kbps', '')), reverse=True)
+
+    # The smallest variant that fills the preview rather than 'thumbnail',
+    # which is the largest one; unprocessed results only carry the list
+    thumbnail = pick_thumbnail(info.get('thumbnails') or []) or info.get('thumbnail')
+
+    return {
+        'title': info.get('title', 'N/A'),
+        'duration': format_duration(info.get('duration')),
+        'resolutions': ', '.join(sorted_res) if sorted_res else 'N/A',
+        'audio': ', '.join(sorted_audio) if sorted_audio else 'N/A',
+        'thumbnail': thumbnail or '',
+        'size': format_bytes(plan['estimated_bytes']) if plan and plan['estimated_bytes'] else 'N/A',
+    }
+
+
+CHANNEL_MARKERS = ('/@', '/channel/', '/c/', '/user/')
+
+
+def is_channel_url(url):
+    return any(marker in url for marker in CHANNEL_MARKERS)
+
+
+def pick_thumbnail(thumbnails, min_width=320):
+    # Smallest variant that still fills the preview; the largest ones
+    # (maxresdefault) are several hundred KB and not always present
+    sized = [t for t in thumbnails if t.get('url') and (t.get('width') or 0) >= min_width]
+    if sized:
+        return min(sized, key=lambda t: t['width'])['url']
+    return thumbnails[-1].get('url') if thumbnails else None
+
+
+def is_playlist_url(url):
+    return 'playlist?list=' in url or is_channel_url(url)
+
+
+class DownloadEngine:
+    # Headless queue + worker pool. The Kivy UI and the CLI are both thin
+    # clients of this class; listeners receive (event, job) tuples from the
+    # worker threads and must do their own thread marshalling.
+    #
+    # Jobs pass through two stages: a small pool of resolver threads runs
+    # extract_info once per URL, then the download workers hand the resolved
+    # info dict straight to process_ie_result instead of extracting again.
+
+    def __init__(self, download_folder=None, workers=3, min_workers=1, max_workers=8,
+                 adaptive=True, metadata_cache=None, max_resolvers=2, rate_limit=None, journal=None,
+                 archive=None, postprocessors=None, metrics_log=None, staging_dir=None,
+                 min_free=DEFAULT_MIN_FREE, max_retries=5, retention=DEFAULT_RETENTION):
+        self.download_folder = download_folder or os.getcwd()
+        self.max_workers = max(workers, max_workers) if adaptive else workers
+        self.max_resolvers = max_resolvers
+        self.metadata_cache = metadata_cache
+        self.journal = journal
+        self.archive = archive
+
+        # Threads are started up to the ceiling; the controller decides how
+        # many of them may download at once
+        self.concurrency = ConcurrencyController(
+            min_workers=min_workers,
+            max_workers=self.max_workers,
+            initial=workers,
+            adaptive=adaptive
+        )
+
+        self.resolve_queue = PriorityJobQueue()
+        self.resolve_threads = []
+        self.resolving = {}  # cache key -> jobs waiting on that resolution
+        self.syncs = {}  # channel -> cursor to store once its jobs complete
+        self.download_queue = PriorityJobQueue()
+        self.download_threads = []
+        self.bandwidth = BandwidthScheduler(rate=rate_limit)
+        self.jobs = {}
+        # Journaled jobs get their ids from the journal instead
+        self.job_ids = itertools.count(1)
+        # Finished jobs stay listed for `retention` seconds (None: forever),
+        # oldest first here, so a long-running engine doesn't grow without bound
+        self.retention = retention
+        self.finished = deque()
+        self.lock = Lock()
+        self.idle = Condition(self.lock)
+        self.listeners = []
+        self.progress = ProgressTracker()
+        self.postprocessing = PostProcessingStage(workers=postprocessors)
+        self.storage = StorageManager(staging_dir=staging_dir, min_free=min_free)
+        self.retry_policy = RetryPolicy(max_retries=max_retries)
+        self.retries = RetryScheduler()
+        self.breaker = CircuitBreaker()
+        self.metrics = Metrics(log_path=metrics_log)
+        self.metrics_server = None
+
+        # Long-lived YoutubeDL instances, one per busy thread
+        self.info_pool = YoutubeDLPool({
+            'quiet': True,
+            'ignoreerrors': True,
+            'noplaylist': True,
+        })
+        self.download_pool = YoutubeDLPool({
+            'restrictfilenames': True,
+            'merge_output_format': 'mp4',
+            'noplaylist': True,
+            'quiet': True,
+            'noprogress': True,
+        })
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def emit(self, event, job):
+        for callback in list(self.listeners):
+            try:
+                callback(event, job)
+            except Exception as e:
+                print(f"Listener error: {str(e)}")
+
+    def start(self):
+        if self.download_threads:
+            return
+        for _ in range(self.max_resolvers):
+            thread = Thread(target=self.resolve_worker, daemon=True)
+            thread.start()
+            self.resolve_threads.append(thread)
+        for _ in range(self.max_workers):
+            thread = Thread(target=self.download_worker, daemon=True)
+            thread.start()
+            self.download_threads.append(thread)
+        self.retries.start()
+        self.concurrency.start(self.sample_throughput)
+
+    def stop(self):
+        # Running transfers are interrupted and left as they are: with a
+        # journal they resume from their partial files on the next start
+        self.retries.close()
+        with self.lock:
+            for job in self.jobs.values():
+                if job['state'] == DOWNLOADING:
+                    job['stop'] = SHUTDOWN
+        for _ in self.resolve_threads:
+            self.resolve_queue.put(None)
+        for _ in self.download_threads:
+            self.download_queue.put(None)
+        self.concurrency.close()
+        for thread in self.resolve_threads + self.download_threads:
+            thread.join()
+        self.resolve_threads = []
+        self.download_threads = []
+        self.info_pool.close()
+        self.download_pool.close()
+        # Let merges already handed off finish before returning
+        self.postprocessing.close()
+        if self.metrics_server:
+            self.metrics_server.close()
+            self.metrics_server = None
+        self.metrics.close()
+        for store in (self.journal, self.archive, self.metadata_cache):
+            if store is not None:
+                store.close()
+
+    def warm_up(self):
+        # Imports yt_dlp and creates the first pooled instances ahead of the
+        # first job; meant for a background thread once the UI is showing
+        started = time.monotonic()
+        self.info_pool.warm()
+        self.download_pool.warm()
+        return time.monotonic() - started
+
+    def serve_metrics(self, port=9464):
+        # Optional Prometheus/JSON endpoint on localhost
+        if self.metrics_server is None:
+            self.metrics_server = MetricsServer(self, port)
+        return self.metrics_server
+
+    def set_rate_limit(self, rate):
+        # Bytes per second shared by all workers; None removes the cap
+        self.bandwidth.set_rate(rate)
+
+    def submit(self, url, video_quality='1080p', audio_quality='192kbps',
+               filename_format='Title Only', download_folder=None, priority='normal', segments=1,
+               job_id=None):
+        if priority not in PRIORITIES:
+            raise ValueError(f'Unknown priority: {priority}')
+        # Known videos are dropped before any job bookkeeping or network work
+        if self.is_archived(url, video_quality, audio_quality):
+            return None
+        job = {
+            'id': job_id,
+            'url': url,
+            'host': host_key(url),
+            'video_quality': video_quality,
+            'audio_quality': audio_quality,
+            'filename_format': filename_format,
+            'download_folder': download_folder or self.download_folder,
+            'priority': priority,
+            'segments': max(1, int(segments)),
+            'state': QUEUED,
+            'message': f'Added to queue: {url[:50]}...',
+            'error': None,
+            'error_class': None,
+            'failure': None,
+        }
+        if self.journal:
+            job['id'] = self.journal.record(job)
+        elif job['id'] is None:
+            job['id'] = next(self.job_ids)
+        self.metrics.mark(job['id'], 'submitted')
+        self.progress.add(job['id'], url).message = job['message']
+        with self.lock:
+            self.jobs[job['id']] = job
+        # Announced before it can resolve: a URL that is already resolving
+        # fans its result out to this job straight away
+        self.emit('queued', job)
+        self.schedule(job)
+        return job['id']
+
+    def schedule(self, job):
+        # Into the resolve stage, collapsing duplicate in-flight URLs into a
+        # single resolution
+        key = cache_key(job['url'])
+        with self.lock:
+            waiting = self.resolving.get(key)
+            if waiting is None:
+                self.resolving[key] = [job]
+            else:
+                waiting.append(job)
+        if waiting is None:
+            self.resolve_queue.put((key, job['url']), job['priority'])
+
+    def cancel(self, job_id):
+        # Queued and paused jobs are cancelled at once; a running transfer
+        # stops at its next chunk (see check_stop). Returns whether the job
+        # is being cancelled.
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return False
+            if job['state'] == DOWNLOADING:
+                job['stop'] = CANCELLED
+                return True
+            if job['state'] not in (QUEUED, PAUSED):
+                return False
+            job['state'] = CANCELLED
+        job.pop('info', None)
+        self.storage.discard(job['id'], job['download_folder'], job.get('files', ()))
+        self.update_job(job, 'cancelled', state=CANCELLED, message=f'Cancelled: {job["url"][:50]}...')
+        return True
+
+    def pause(self, job_id):
+        # Like cancel, but partial files are kept for resume()
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return False
+            if job['state'] == DOWNLOADING:
+                job['stop'] = PAUSED
+                return True
+            if job['state'] != QUEUED:
+                return False
+            job['state'] = PAUSED
+        self.update_job(job, 'paused', state=PAUSED, message=f'Paused: {job["url"][:50]}...')
+        return True
+
+    def resume(self, job_id):
+        # A paused job goes back through the resolve stage, since the stream
+        # URLs it had may have expired, and continues from its partial files
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return False
+            if job['state'] == DOWNLOADING and job.get('stop') == PAUSED:
+                # Not unwound yet; download_video sees the request is gone
+                del job['stop']
+                return True
+            if job['state'] != PAUSED:
+                return False
+            job['state'] = QUEUED
+            # Still in a queue unless a worker already set it aside
+            parked = job.pop('parked', False)
+        self.progress.add(job['id'], job['url'])
+        self.update_job(job, 'resumed', state=QUEUED, message=f'Resumed: {job["url"][:50]}...')
+        if parked:
+            self.schedule(job)
+        return True
+
+    def park(self, job):
+        # For resolver and download workers, with self.lock held: whether to
+        # drop the job because it was cancelled or paused while queued
+        if job['state'] == PAUSED:
+            job['parked'] = True
+            job.pop('info', None)
+            job.pop('probe', None)
+            return True
+        return job['state'] == CANCELLED
+
+    def claim(self, job):
+        # Moves a queued job to downloading unless it was cancelled or paused first
+        with self.lock:
+            if self.park(job):
+                return False
+            job['state'] = DOWNLOADING
+            return True
+
+    def check_stop(self, job):
+        # Polled from the progress hook, which runs per chunk in yt-dlp's
+        # read loop and in every segment thread
+        reason = job.get('stop')
+        if reason:
+            raise JobInterrupted(reason)
+
+    def is_archived(self, url, video_quality, audio_quality):
+        if not self.archive:
+            return False
+        archive_id = archive_id_from_url(url)
+        return bool(archive_id) and self.archive.contains(*archive_id, format_key(video_quality, audio_quality))
+
+    def restore(self):
+        # Re-queue jobs the journal says were left unfinished by a run that
+        # has ended (not those of another running GUI, CLI or daemon);
+        # yt-dlp and SegmentedDownloader pick up their partial files
+        if not self.journal:
+            return []
+        restored = []
+        for row in self.journal.claim_pending():
+            job_id = self.submit(
+                row['url'],
+                video_quality=row['video_quality'],
+                audio_quality=row['audio_quality'],
+                filename_format=row['filename_format'],
+                download_folder=row['download_folder'],
+                priority=row['priority'] or 'normal',
+                segments=row['segments'] or 1,
+                job_id=row['id']
+            )
+            if job_id is None:
+                # Downloaded by another run since; its row is done, not pending
+                self.journal.update(row['id'], SKIPPED)
+                continue
+            if row['state'] == PAUSED:
+                self.pause(job_id)
+            restored.append(job_id)
+        return restored
+
+    def submit_playlist(self, url, mode='Download All', incremental=True, **options):
+        # Entries are queued as each page of the listing arrives, so the
+        # first download starts right away. Entries already in the archive
+        # are dropped by ID in submit(), wherever they now sit in the list.
+        # Channels list newest first, so with an archive the next sync stops
+        # at the newest entry of the last one; that cursor only moves once
+        # every job of this sync has completed, so failed or cancelled
+        # entries are offered again. Playlists are walked in full every
+        # time: entries can be added, removed or moved anywhere in them, so
+        # no point in the listing proves the rest is already archived.
+        playlist = cache_key(url, 'playlist')
+        newest_first = is_channel_url(url)
+        track = newest_first and mode == 'Download All' and self.archive is not None
+        cursor = self.archive.get_cursor(playlist) if track and incremental else None
+
+        job_ids = []
+        head_id = None
+        for entry in self.iter_playlist_entries(url):
+            if head_id is None:
+                head_id = entry['id']
+            if cursor and entry['id'] == cursor:
+                break
+            job_id = self.submit(entry['url'], **options)
+            if job_id is not None:
+                job_ids.append(job_id)
+            if mode == 'Download First':
+                return job_ids
+
+        if track and head_id is not None:
+            self.track_sync(playlist, head_id, job_ids)
+        return job_ids
+
+    def track_sync(self, playlist, head_id, job_ids):
+        with self.lock:
+            # An entry evicted already can't prove it finished
+            states = [self.jobs[job_id]['state'] if job_id in self.jobs else FAILED
+                      for job_id in job_ids]
+            if any(state in DONE_STATES and state not in (FINISHED, SKIPPED) for state in states):
+                return
+            pending = {job_id for job_id, state in zip(job_ids, states) if state not in DONE_STATES}
+            if pending:
+                self.syncs[playlist] = {'head_id': head_id, 'jobs': pending}
+                return
+        self.archive.set_cursor(playlist, head_id)
+
+    def sync_done(self, job):
+        # Stores a channel's cursor when the last job of its sync completes
+        completed = []
+        with self.lock:
+            for playlist, sync in list(self.syncs.items()):
+                if job['id'] not in sync['jobs']:
+                    continue
+                if job['state'] not in (FINISHED, SKIPPED):
+                    del self.syncs[playlist]  # the cursor stays where it was
+                    continue
+                sync['jobs'].discard(job['id'])
+                if not sync['jobs']:
+                    completed.append((playlist, self.syncs.pop(playlist)))
+        for playlist, sync in completed:
+            self.archive.set_cursor(playlist, sync['head_id'])
+
+    def status(self, job_id=None):
+        with self.lock:
+            if job_id is not None:
+                job = self.jobs.get(job_id)
+                return self.job_status(job) if job else None
+            return [self.job_status(job) for job in self.jobs.values()]
+
+    def job_status(self, job):
+        status = public_job(job)
+        record = self.progress.get(job['id'])
+        status.update(
+            progress=record.percent,
+            bytes_done=record.bytes_done,
+            total_bytes=record.total_bytes,
+            speed=record.speed,
+            eta=record.eta,
+        )
+        return status
+
+    def stats(self):
+        # Counters and per-stage latency summaries plus current queue state
+        stats = self.metrics.stats()
+        stats.update(self.gauges())
+        stats['progress'] = {k: v for k, v in self.progress.snapshot().items() if k != 'active'}
+        stats['circuits'] = self.breaker.open_hosts()
+        return stats
+
+    def gauges(self):
+        return {
+            'resolve_queue_depth': self.resolve_queue.qsize(),
+            'download_queue_depth': self.download_queue.depth_by_priority(),
+            'active_downloads': len(self.progress.active),
+            'worker_target': self.concurrency.target,
+            'postprocess_pending': self.postprocessing.stats()['pending'],
+            'reserved_bytes': self.storage.stats()['reserved_bytes'],
+            'retries_pending': self.retries.pending(),
+            'open_circuits': len(self.breaker.open_hosts()),
+        }
+
+    def pending_count(self):
+        with self.lock:
+            return sum(1 for job in self.jobs.values() if job['state'] not in DONE_STATES)
+
+    def wait(self, timeout=None):
+        # Block until every submitted job has finished, failed or been paused
+        with self.idle:
+            return self.idle.wait_for(
+                lambda: all(job['state'] in DONE_STATES or job['state'] == PAUSED
+                            for job in self.jobs.values()),
+                timeout=timeout
+            )
+
+    def update_job(self, job, event, **changes):
+        with self.lock:
+            job.update(changes)
+            if 'state' in changes and job['state'] != DOWNLOADING:
+                # A pause or cancel that arrived as the transfer ended
+                job.pop('stop', None)
+            self.progress.set_state(job['id'], job['state'], job['message'])
+            if job['state'] in DONE_STATES or job['state'] == PAUSED:
+                self.idle.notify_all()
+        if job['state'] in DONE_STATES and 'state' in changes:
+            self.storage.release(job['id'])
+            self.metrics.finish(job, self.progress.get(job['id']).bytes_done)
+            if self.syncs:
+                self.sync_done(job)
+        if self.journal and 'state' in changes:
+            self.journal.update(job['id'], job['state'],
+                                self.progress.get(job['id']).bytes_done, job['error'])
+        self.emit(event, job)
+        if job['state'] in DONE_STATES and 'state' in changes and self.retention is not None:
+            self.finished.append((time.monotonic(), job['id']))
+            self.evict_finished()
+
+    def evict_finished(self):
+        # Drops jobs that finished more than `retention` seconds ago from the
+        # job list and the progress tracker, announcing each as 'evicted'
+        if self.retention is None:
+            return []
+        cutoff = time.monotonic() - self.retention
+        evicted = []
+        with self.lock:
+            while self.finished and self.finished[0][0] <= cutoff:
+                _, job_id = self.finished.popleft()
+                job = self.jobs.get(job_id)
+                if job is not None and job['state'] in DONE_STATES:
+                    del self.jobs[job_id]
+                    evicted.append(job)
+        for job in evicted:
+            self.progress.remove(job['id'])
+            self.emit('evicted', job)
+        return evicted
+
+    def fetch_video_info(self, url):
+        if self.metadata_cache is None:
+            return self.extract_video_info(url)
+        return self.metadata_cache.get_or_fetch(
+            cache_key(url), lambda: self.extract_video_info(url)
+        )
+
+    def fetch_playlist_info(self, url):
+        if self.metadata_cache is None:
+            return self.extract_playlist_info(url)
+        return self.metadata_cache.get_or_fetch(
+            cache_key(url, 'playlist'), lambda: self.extract_playlist_info(url)
+        )
+
+    def extract_video_info(self, url):
+        # Unprocessed result: format selection happens at transfer time.
+        # Errors are raised rather than printed so they can be classified.
+        with self.info_pool.acquire({'ignoreerrors': False}) as ydl:
+            info = ydl.extract_info(url, download=False, process=False)
+        if not info:
+            return None
+        # Drop internal callables (e.g. __post_extractor) that can't be cached
+        return {k: v for k, v in info.items() if not k.startswith('__')}
+
+    def extract_playlist_info(self, url):
+        return list(self.iter_playlist_entries(url))
+
+    def iter_playlist_entries(self, url):
+        # Unprocessed extraction leaves 'entries' as the extractor's lazy
+        # generator, which fetches the next page only when it is reached
+        options = {'extract_flat': 'in_playlist', 'noplaylist': False, 'lazy_playlist': True}
+        with self.info_pool.acquire(options) as ydl:
+            info = ydl.extract_info(url, download=False, process=False)
+            # Channel pages redirect to their videos tab
+            for _ in range(3):
+                if not info or info.get('_type') not in ('url', 'url_transparent'):
+                    break
+                info = ydl.extract_info(info['url'], download=False, process=False,
+                                        ie_key=info.get('ie_key'))
+
+            if not info or 'entries' not in info:
+                raise ValueError('Could not fetch playlist info')
+
+            for entry in info['entries']:
+                if entry:
+                    yield {
+                        'url': entry.get('url') or entry.get('webpage_url', ''),
+                        'id': entry.get('id'),
+                        'title': entry.get('title', ''),
+                        'duration': entry.get('duration') or 0
+                    }
+
+    def resolve_worker(self):
+        while True:
+            item = self.resolve_queue.get()
+            if item is None:  # Exit signal
+                break
+            key, url = item
+            host = host_key(url)
+            wait, probe = self.breaker.check(host)
+            if wait:
+                # Host is throttling us; come back when its circuit half-opens
+                with self.lock:
+                    jobs = self.resolving.get(key) or [{'priority': 'normal'}]
+                self.retries.call_later(wait, lambda item=item, priority=jobs[0]['priority']:
+                                        self.resolve_queue.put(item, priority))
+                self.resolve_queue.task_done()
+                continue
+
+            started = time.monotonic()
+            try:
+                info = self.fetch_video_info(url)
+                error = None if info else 'Could not fetch video info'
+                failure, kind = (None, None) if info else ('NoVideoInfo', UNAVAILABLE)
+            except Exception as e:
+                info, error, failure, kind = None, str(e), error_class(e), classify(e)
+                self.breaker.failure(host, kind, retry_after(e))
+
+            with self.lock:
+                jobs = self.resolving.pop(key, [])
+            for job in jobs:
+                with self.lock:
+                    if self.park(job):
+                        continue
+                self.metrics.mark(job['id'], 'resolve_started', started)
+                self.metrics.mark(job['id'], 'resolved')
+                if error:
+                    self.fail(job, error, failure, kind)
+                elif self.archive and self.archive.contains(
+                        *info_archive_id(info), format_key(job['video_quality'], job['audio_quality'])):
+                    # Only identifiable after extraction (non-YouTube URLs)
+                    self.update_job(job, 'skipped', state=SKIPPED,
+                                    message=f'Already downloaded: {job["url"][:50]}...')
+                else:
+                    if probe:
+                        # Its download is the rest of the probe: not held again
+                        job['probe'] = True
+                    job['info'] = info
+                    job['plan'] = plan_formats(info, job['video_quality'], job['audio_quality'],
+                                               audio_only=job['video_quality'] in AUDIO_ONLY,
+                                               container=AUDIO_ONLY.get(job['video_quality']))
+                    self.download_queue.put(job, job['priority'])
+                    # A worker may already have taken the info off the job;
+                    # listeners get a snapshot that still carries it
+                    self.emit('resolved', dict(job, info=info))
+            self.resolve_queue.task_done()
+
+    def sample_throughput(self):
+        return self.progress.snapshot()['speed'], self.download_queue.qsize()
+
+    def download_worker(self):
+        while self.concurrency.acquire():
+            job = self.download_queue.get()
+            if job is None:  # Exit signal
+                self.concurrency.release()
+                break
+            waiting = False
+            try:
+                if job['state'] == QUEUED and self.hold_for_host(job):
+                    pass
+                elif job['state'] == QUEUED and not self.admit(job):
+                    waiting = job['state'] == QUEUED
+                elif self.claim(job):
+                    self.download_video(job)
+                else:
+                    self.storage.release(job['id'])
+            finally:
+                self.concurrency.release()
+            self.download_queue.task_done()
+            if waiting:
+                # Slot is free for jobs that do fit; try again when space is released
+                self.storage.wait(SPACE_RECHECK)
+
+    def hold_for_host(self, job):
+        # Parks the job on the retry timer while its host's circuit is open
+        if job.get('probe'):
+            return False
+        wait = self.breaker.blocked(job['host'])
+        if not wait:
+            return False
+        message = f'Waiting for {job["host"]}: throttled, retrying in {wait:.0f}s'
+        self.update_job(job, 'waiting', message=message)
+        self.retries.call_later(wait, lambda: self.download_queue.put(job, job['priority']))
+        return True
+
+    def admit(self, job):
+        # Reserves the planned size on disk, or puts the job back in the
+        # queue while it wouldn't fit next to the downloads already running.
+        # A job too big for the disk on its own fails instead.
+        plan = job.get('plan')
+        try:
+            shortfall = self.storage.admit(
+                job['id'], job['download_folder'], plan['estimated_bytes'] if plan else 0,
+                merge=bool(plan and (plan['needs_merge'] or plan['remux']) and self.postprocessing.available)
+            )
+        except InsufficientSpace as e:
+            self.fail(job, f'Insufficient disk space: {format_bytes(e.shortfall)} more needed on {e.filename}',
+                      'InsufficientSpace', FATAL)
+            return False
+        if not shortfall:
+            return True
+        message = f'Waiting for disk space: {format_bytes(shortfall)} more needed'
+        if job['message'] != message:
+            self.update_job(job, 'waiting', message=message)
+        self.download_queue.put(job, job['priority'])
+        return False
+
+    def download_video(self, job):
+        url = job['url']
+        download_folder = job['download_folder']
+        # Partial files live here; finished ones end up in download_folder
+        work_folder = self.storage.job_folder(job['id'], download_folder)
+        # Collapsed duplicates share one info dict; processing mutates it
+        info = copy.deepcopy(job.pop('info'))
+        archive_id = info_archive_id(info)
+        job.pop('probe', None)
+
+        try:
+            # Create the download directory if it doesn't exist
+            os.makedirs(download_folder, exist_ok=True)
+            os.makedirs(work_folder, exist_ok=True)
+
+            # Per-job options applied on top of the pooled instance. Planned
+            # format IDs skip yt-dlp's selector; the quality string is the
+            # fallback for extractors that don't list formats up front
+            plan = job.get('plan')
+            ydl_opts = {
+                'format': plan['format'] if plan else get_format_string(job['video_quality'],
+                                                                        job['audio_quality']),
+                'outtmpl': os.path.join(work_folder, get_filename_template(job['filename_format'])),
+                'progress_hooks': [lambda d: self.progress_hook(job, d)],
+            }
+            if job['segments'] > 1:
+                # DASH/HLS fragments go through yt-dlp; plain files are range-split
+                from segmented_pp import SegmentedPrefetchPP
+                ydl_opts['concurrent_fragment_downloads'] = job['segments']
+                ydl_opts['add_postprocessors'] = [(
+                    # Its hook raises in each segment thread on pause/cancel
+                    SegmentedPrefetchPP(segments=job['segments'],
+                                        progress_hook=lambda d: self.progress_hook(job, d)),
+                    'before_dl'
+                )]
+
+            self.metrics.mark(job['id'], 'download_started')
+            self.update_job(job, 'started', state=DOWNLOADING,
+                            message=f'Starting download: {url[:50]}...')
+
+            if plan and plan['needs_merge'] and self.postprocessing.available:
+                self.download_parts(job, info, plan, ydl_opts, archive_id)
+            else:
+                self.bandwidth.start_transfer(job['priority'])
+                try:
+                    with self.download_pool.acquire(ydl_opts) as ydl:
+                        result = ydl.process_ie_result(info, download=True)
+                finally:
+                    self.bandwidth.end_transfer(job['priority'])
+                self.metrics.mark(job['id'], 'transfer_done')
+                self.breaker.success(job['host'])
+                filename = downloaded_path(result)
+                if plan and plan['remux'] and filename and self.postprocessing.available:
+                    # Audio-only: copy the stream into the requested container
+                    output = os.path.join(download_folder, os.path.splitext(
+                        os.path.basename(filename))[0] + '.' + plan['remux'])
+                    self.postprocess(job, [filename], output, info, archive_id, 'Remuxing',
+                                     audio_only=plan['strip_video'])
+                else:
+                    self.finish_job(job, archive_id, filename)
+
+        except Exception as e:
+            if interruption(e) or job.get('stop'):
+                # Straight back to the worker loop: the slot is free now
+                self.interrupted(job)
+                return
+            kind = classify(e)
+            self.breaker.failure(job['host'], kind, retry_after(e))
+            self.fail(job, str(e), error_class(e), kind)
+
+    def fail(self, job, error, failure, kind):
+        # Puts the job back through the resolve stage after a backoff when
+        # the retry policy allows it; a timer re-queues it, so no worker
+        # waits. Otherwise the job has failed for good.
+        delay = self.retry_policy.delay(kind, job.get('retries', 0))
+        if delay is None:
+            self.update_job(job, 'error', state=FAILED, error=error, error_class=failure, failure=kind,
+                            message=f'Error: {error}')
+            return
+        self.metrics.retry(job, kind)
+        self.storage.release(job['id'])
+        if self.metadata_cache is not None:
+            # The cached stream URLs may be what failed
+            self.metadata_cache.delete(cache_key(job['url']))
+        self.update_job(job, 'retrying', state=QUEUED, error=error, error_class=failure, failure=kind,
+                        message=f'Retrying in {delay:.0f}s ({kind}): {error}')
+        self.retries.call_later(delay, lambda: self.schedule(job))
+
+    def interrupted(self, job):
+        # The transfer unwound after pause() or cancel(); partial files stay
+        # where they are unless the job was cancelled
+        with self.lock:
+            requested = job.pop('stop', None)
+        self.storage.release(job['id'])
+        if requested == CANCELLED:
+            self.storage.discard(job['id'], job['download_folder'], job.get('files', ()))
+            self.update_job(job, 'cancelled', state=CANCELLED,
+                            message=f'Cancelled: {job["url"][:50]}...')
+        elif requested == PAUSED:
+            self.update_job(job, 'paused', state=PAUSED, parked=True,
+                            message=f'Paused: {job["url"][:50]}...')
+        elif requested == SHUTDOWN:
+            pass
+        else:
+            # resume() came in while the transfer was unwinding
+            self.progress.add(job['id'], job['url'])
+            self.update_job(job, 'resumed', state=QUEUED, message=f'Resumed: {job["url"][:50]}...')
+            self.schedule(job)
+
+    def download_parts(self, job, info, plan, ydl_opts, archive_id):
+        # Fetch each planned stream on its own, then queue the merge on the
+        # post-processing stage; the worker slot is free as soon as the
+        # last part is on disk
+        parts = []
+        self.bandwidth.start_transfer(job['priority'])
+        try:
+            for format_id in plan['format'].split('+'):
+                self.check_stop(job)
+                part_opts = dict(ydl_opts, format=format_id,
+                                 outtmpl=part_template(ydl_opts['outtmpl']))
+                with self.download_pool.acquire(part_opts) as ydl:
+                    result = ydl.process_ie_result(copy.deepcopy(info), download=True)
+                parts.append(downloaded_path(result))
+        finally:
+            self.bandwidth.end_transfer(job['priority'])
+        self.metrics.mark(job['id'], 'transfer_done')
+        self.breaker.success(job['host'])
+
+        if not all(parts):
+            raise RuntimeError('Downloaded stream not found on disk')
+
+        # Merged straight into the final folder: ffmpeg's output is the one
+        # copy out of staging
+        output = os.path.join(job['download_folder'], os.path.basename(merged_filename(parts[0])))
+        self.postprocess(job, parts, output, info, archive_id, 'Merging')
+
+    def postprocess(self, job, parts, output, info, archive_id, action, audio_only=False):
+        # Queues the ffmpeg step; the job finishes from its callback
+        def merged(output, error):
+            if error is not None:
+                # Parts stay on disk until a merge succeeds, so a retry only re-merges
+                self.fail(job, str(error), error_class(error), POSTPROCESS)
+            else:
+                self.finish_job(job, archive_id, output)
+
+        self.update_job(job, 'processing', state=PROCESSING,
+                        message=f'{action}: {job["url"][:50]}...')
+        self.postprocessing.submit(parts, output, info_metadata(info), merged, audio_only=audio_only)
+
+    def finish_job(self, job, archive_id, filename):
+        filename = self.storage.commit(job['id'], filename, job['download_folder'])
+        if self.archive:
+            self.archive.add(*archive_id, format_key(job['video_quality'], job['audio_quality']),
+                             filename=filename)
+        self.update_job(job, 'finished', state=FINISHED, error=None, error_class=None, failure=None,
+                        message=f'Download completed: {job["url"][:50]}...')
+
+    def progress_hook(self, job, d):
+        # Runs for every chunk: only touch the job's progress record and let
+        # consumers sample it (see ProgressTracker.snapshot)
+        self.check_stop(job)
+        if d.get('filename'):
+            # Whatever cancel() has to clean up when there is no staging folder
+            job.setdefault('files', set()).add(d['filename'])
+        record = self.progress.get(job['id'])
+        received = 0
+        if d['status'] == 'downloading':
+            received = (d.get('downloaded_bytes') or 0) - record.downloaded_bytes
+        record.update(d)
+        if received and d.get('tmpfilename') and d.get('total_bytes'):
+            # Once per file: the writer has created it by its first chunk
+            self.storage.preallocate(job['id'], d['tmpfilename'], d['total_bytes'])
+        if d['status'] == 'finished':
+            record.message = 'Finalizing MP4 file...'
+        if self.journal and record.updated - job.get('checkpointed', 0) >= self.journal.checkpoint_interval:
+            job['checkpointed'] = record.updated
+            self.journal.checkpoint(job['id'], record.bytes_done)
+        # Sleeping here stalls this worker's read loop until it is back
+        # under its share of the global rate limit
+        self.bandwidth.throttle(job['priority'], received, lambda: self.check_stop(job))
+
+
+def info_archive_id(info):
+    # Same (extractor, id) pair yt-dlp uses for its own download archive
+    return (info.get('extractor_key') or info.get('ie_key') or 'generic').lower(), str(info.get('id'))
+
+
+INTERNAL_FIELDS = ('info', 'checkpointed', 'parked', 'files', 'probe')
+
+
+def downloaded_path(result):
+    # Final file of a process_ie_result call, wherever yt-dlp recorded it
+    result = result or {}
+    downloads = result.get('requested_downloads') or [{}]
+    return downloads[-1].get('filepath') or result.get('filepath') or result.get('_filename')
+
+
+def public_job(job):
+    # Job fields safe to hand out; the resolved info dict stays internal
+    return {k: v for k, v in job.items() if k not in INTERNAL_FIELDS}
+
+
+def read_url_file(path):
+    # YouTube links are canonicalised and deduplicated; any other http(s)
+    # line is passed through for yt-dlp's other extractors
+    stream = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        lines = [line for line in stream if not line.lstrip().startswith('#')]
+        return extract_links(''.join(lines))
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def print_event(event, job):
+    if event in ('started', 'waiting', 'retrying', 'processing', 'finished', 'error', 'skipped',
+                 'cancelled', 'paused', 'resumed'):
+        print(f"[{job['id']}] {job['message']}", flush=True)
+
+
+def print_decision(decision):
+    print(f"Workers -> {decision['target']} ({decision['action']}: {decision['reason']}, "
+          f"{decision['throughput'] / 1024:.0f} KB/s)", flush=True)
+
+
+def print_stages(stats):
+    for stage, summary in stats['stages'].items():
+        if summary['count']:
+            print(f"{stage:>14}: avg {summary['avg']:.3f}s, max {summary['max']:.3f}s "
+                  f"over {summary['count']} job(s)", flush=True)
+
+
+def run_shared(engine, args, options):
+    # This process is one of possibly many workers on the shared backlog
+    queue = LeasedJobQueue(args.shared_queue, lease_seconds=args.lease)
+    for url in read_url_file(args.url_file) if args.url_file else []:
+        if is_playlist_url(url):
+            queue.put(SHARED_PLAYLIST, url, options, args.playlist_priority)
+        else:
+            queue.put(SHARED_VIDEO, url, options, args.priority)
+
+    worker = ClusterWorker(engine, queue)
+    worker.start()
+    worker.wait()
+    worker.stop()
+    engine.wait()
+    engine.stop()
+    print(f'Recorded {worker.recorded} result(s) as {queue.worker_id}; shared queue: '
+          f'{queue.counts()}', flush=True)
+    queue.close()
+    # Counted by the tracker: failed jobs may have been evicted already
+    return 1 if engine.progress.failed_jobs else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m download_engine',
+        description='Download YouTube videos without starting the GUI.'
+    )
+    parser.add_argument('url_file', nargs='?',
+                        help="text file with one URL per line ('-' for stdin)")
+    parser.add_argument('--workers', type=int, default=3, help='initial simultaneous downloads')
+    parser.add_argument('--min-workers', type=int, default=1, help='lower bound for adaptive concurrency')
+    parser.add_argument('--max-workers', type=int, default=8, help='upper bound for adaptive concurrency')
+    parser.add_argument('--fixed-workers', action='store_true', help='always run exactly --workers downloads')
+    parser.add_argument('-v', '--verbose', action='store_true', help='report concurrency decisions')
+    parser.add_argument('--quality', default='1080p', choices=VIDEO_QUALITIES,
+                        help="video quality; 'Audio Only' variants skip the video stream")
+    parser.add_argument('--audio-quality', default='192kbps', choices=AUDIO_QUALITIES, help='audio quality')
+    parser.add_argument('--filename-format', default='Title Only', choices=FILENAME_FORMATS)
+    parser.add_argument('-o', '--output', default=os.getcwd(), help='download folder')
+    parser.add_argument('--segments', type=int, default=1,
+                        help='parallel connections per file (byte ranges or fragments)')
+    parser.add_argument('--priority', default='normal', choices=list(PRIORITIES), help='priority for single URLs')
+    parser.add_argument('--playlist-priority', default='low', choices=list(PRIORITIES),
+                        help='priority for playlist entries')
+    parser.add_argument('--rate-limit', type=parse_rate, default=None,
+                        help='total bandwidth cap, e.g. 500K or 4M (bytes/s)')
+    parser.add_argument('--cache-ttl', type=float, default=3600, help='metadata cache TTL in seconds')
+    parser.add_argument('--no-cache', action='store_true', help='disable the metadata cache')
+    parser.add_argument('--journal', default=None, help='job journal path (default: in the cache folder)')
+    parser.add_argument('--no-journal', action='store_true', help='keep the queue in memory only')
+    parser.add_argument('--archive', default=None, help='download archive path (default: in the cache folder)')
+    parser.add_argument('--no-archive', action='store_true', help='download even if already archived')
+    parser.add_argument('--full-sync', action='store_true',
+                        help='walk whole channels instead of only videos added since the last sync '
+                             '(playlists are always walked in full)')
+    parser.add_argument('--resume', action='store_true', help='re-queue unfinished jobs from the journal')
+    parser.add_argument('--postprocessors', type=int, default=None,
+                        help='parallel ffmpeg merges (default: one per CPU core)')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='serve /metrics (Prometheus) and /stats (JSON) on this localhost port')
+    parser.add_argument('--metrics-log', default=None, help='append one JSON line per finished job here')
+    parser.add_argument('--shared-queue', default=None,
+                        help='SQLite file on a shared path: add the URLs to it and help drain it '
+                             'together with other machines (replaces the local journal)')
+    parser.add_argument('--lease', type=float, default=60, help='shared queue lease length in seconds')
+    parser.add_argument('--staging-dir', default=None,
+                        help='download into this (fast, local) folder and move finished files to -o')
+    parser.add_argument('--min-free', type=parse_size, default=DEFAULT_MIN_FREE,
+                        help='free space to leave on each disk, e.g. 2G; jobs wait in the queue '
+                             'while they would not fit')
+    parser.add_argument('--max-retries', type=int, default=5,
+                        help='retries for network and throttling failures (with backoff)')
+    args = parser.parse_args(argv)
+    if not args.url_file and not args.resume and not args.shared_queue:
+        parser.error('a URL file is required unless --resume or --shared-queue is given')
+
+    metadata_cache = None if args.no_cache else MetadataCache(ttl=args.cache_ttl)
+    engine = DownloadEngine(
+        download_folder=args.output,
+        workers=max(1, args.workers),
+        min_workers=args.min_workers,
+        max_workers=args.max_workers,
+        adaptive=not args.fixed_workers,
+        metadata_cache=metadata_cache,
+        rate_limit=args.rate_limit,
+        journal=None if args.no_journal or args.shared_queue else JobJournal(args.journal),
+        archive=None if args.no_archive else DownloadArchive(args.archive),
+        postprocessors=args.postprocessors,
+        metrics_log=args.metrics_log,
+        staging_dir=args.staging_dir,
+        min_free=args.min_free,
+        max_retries=args.max_retries
+    )
+    engine.add_listener(print_event)
+    if args.verbose:
+        engine.concurrency.on_change = print_decision
+    if args.metrics_port:
+        engine.serve_metrics(args.metrics_port)
+    engine.start()
+
+    options = {
+        'video_quality': args.quality,
+        'audio_quality': args.audio_quality,
+        'filename_format': args.filename_format,
+        'segments': args.segments,
+    }
+    if args.shared_queue:
+        return run_shared(engine, args, options)
+
+    if args.resume:
+        restored = engine.restore()
+        print(f'Resumed {len(restored)} unfinished job(s)', flush=True)
+
+    for url in read_url_file(args.url_file) if args.url_file else []:
+        if is_playlist_url(url):
+            try:
+                engine.submit_playlist(url, incremental=not args.full_sync,
+                                       priority=args.playlist_priority, **options)
+            except Exception as e:
+                print(f'Error: {url}: {str(e)}', file=sys.stderr)
+        else:
+            engine.submit(url, priority=args.priority, **options)
+
+    engine.wait()
+    if args.verbose:
+        print_stages(engine.metrics.stats())
+    engine.stop()
+    if engine.archive and engine.archive.hits:
+        print(f'Skipped {engine.archive.hits} already downloaded video(s)', flush=True)
+
+    # Counted by the tracker: failed jobs may have been evicted already
+    return 1 if engine.progress.failed_jobs else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,196 @@
+import re
+
+# Containers that merge into MP4 with a plain stream copy
+MP4_VIDEO_EXTS = ('mp4',)
+MP4_AUDIO_EXTS = ('m4a', 'mp4')
+# Audio containers a stream can be copied into -> codecs they hold
+AUDIO_CONTAINERS = {
+    'm4a': ('mp4a', 'opus'),
+    'opus': ('opus',),
+}
+
+
+def target_height(video_quality):
+    match = re.match(r'(\d+)p', video_quality or '')
+    return int(match.group(1)) if match else None
+
+
+def target_abr(audio_quality):
+    match = re.match(r'(\d+)kbps', audio_quality or '')
+    return int(match.group(1)) if match else None
+
+
+def estimate_size(f, duration):
+    size = f.get('filesize') or f.get('filesize_approx')
+    if size:
+        return int(size)
+    bitrate = f.get('tbr') or ((f.get('vbr') or 0) + (f.get('abr') or 0))
+    if bitrate and duration:
+        return int(bitrate * 1000 / 8 * duration)
+    return None
+
+
+def is_usable(f):
+    # Storyboards and DRM streams are listed as formats but aren't media
+    return bool(f.get('url') or f.get('fragments') or f.get('manifest_url')) \
+        and f.get('protocol') != 'mhtml' and not f.get('has_drm') and f.get('format_id') is not None
+
+
+def has_video(f):
+    return f.get('vcodec') not in (None, 'none') or (f.get('vcodec') is None and f.get('height'))
+
+
+def has_audio(f):
+    return f.get('acodec') not in (None, 'none')
+
+
+def pick_video(formats, height, duration):
+    # Highest resolution not above the target (or the lowest there is if
+    # everything is above it); among those, MP4 first and then the smallest
+    # estimated size
+    sized = [f for f in formats if f.get('height')]
+    if not sized:
+        return None
+    candidates = [f for f in sized if height is None or f['height'] <= height]
+    if candidates:
+        best_height = max(f['height'] for f in candidates)
+    else:
+        candidates = sized
+        best_height = min(f['height'] for f in sized)
+    candidates = [f for f in candidates if f['height'] == best_height]
+    return min(candidates, key=lambda f: (
+        f.get('ext') not in MP4_VIDEO_EXTS,
+        estimate_size(f, duration) or float('inf'),
+    ))
+
+
+def codec_of(f):
+    return (f.get('acodec') or '').split('.')[0].lower()
+
+
+def pick_audio(formats, abr, duration, container=None):
+    # Cheapest stream at or above the requested bitrate, else the best there
+    # is; streams that fit the target container (MP4 by default) come first
+    def fits(f):
+        if container:
+            return codec_of(f) in AUDIO_CONTAINERS[container]
+        return f.get('ext') in MP4_AUDIO_EXTS
+
+    candidates = [f for f in formats if f.get('abr')]
+    if not candidates:
+        return formats[0] if formats else None
+    if abr is not None:
+        meeting = [f for f in candidates if f['abr'] >= abr * 0.95]
+        if meeting:
+            return min(meeting, key=lambda f: (
+                not fits(f),
+                f['abr'],
+                estimate_size(f, duration) or float('inf'),
+            ))
+    return max(candidates, key=lambda f: (f['abr'], fits(f)))
+
+
+def meets_quality(single, video, audio, height, abr):
+    # A muxed format is only worth taking if it is as good as the separate
+    # streams we would otherwise merge (unless those overshoot the target)
+    if video and single['height'] < video['height'] and (height is None or video['height'] <= height):
+        return False
+    if not audio:
+        return True
+    single_abr = single.get('abr') or 0
+    if abr is None:
+        return single_abr >= (audio.get('abr') or 0)
+    return single_abr >= abr * 0.95
+
+
+def remux_target(f, container):
+    # Container to copy an audio-only download into, or None to keep it as is
+    if not container or f.get('ext') == container or codec_of(f) not in AUDIO_CONTAINERS[container]:
+        return None
+    return container
+
+
+def plan_audio(formats, abr, duration, container=None):
+    # Audio-only download: one audio stream, no video fetched and no merge.
+    # Only where a site lists nothing but muxed formats is the smallest one
+    # fetched and its audio copied out.
+    audio_streams = [f for f in formats if has_audio(f) and not has_video(f)]
+    audio = pick_audio(audio_streams, abr, duration, container)
+    if audio is not None:
+        plan = make_plan([audio], duration)
+        plan['remux'] = remux_target(audio, container)
+        plan['strip_video'] = False
+        return plan
+
+    progressive = [f for f in formats if has_audio(f)]
+    if not progressive:
+        return None
+    single = min(progressive, key=lambda f: estimate_size(f, duration) or float('inf'))
+    plan = make_plan([single], duration)
+    fallback = 'm4a' if codec_of(single) in AUDIO_CONTAINERS['m4a'] else 'mka'
+    plan['remux'] = container if codec_of(single) in AUDIO_CONTAINERS.get(container, ()) else fallback
+    plan['strip_video'] = True
+    return plan
+
+
+def plan_formats(info, video_quality, audio_quality, audio_only=False, container=None):
+    # Chooses concrete format IDs from the formats extract_info already
+    # returned, so yt-dlp never falls through to '/best' and the preview can
+    # show the expected download size. Returns None when the info has no
+    # format list (the caller then falls back to a selector string).
+    # container ('m4a' or 'opus') only applies to audio-only plans.
+    formats = [f for f in info.get('formats') or [] if is_usable(f)]
+    if not formats:
+        return None
+    duration = info.get('duration')
+    height = target_height(video_quality)
+    abr = target_abr(audio_quality)
+    if audio_only:
+        return plan_audio(formats, abr, duration, container)
+
+    video_only = [f for f in formats if has_video(f) and not has_audio(f)]
+    audio_streams = [f for f in formats if has_audio(f) and not has_video(f)]
+    progressive = [f for f in formats if has_video(f) and has_audio(f)]
+
+    video = pick_video(video_only, height, duration)
+    audio = pick_audio(audio_streams, abr, duration)
+    single = pick_video(progressive, height, duration)
+
+    plans = []
+    if video and audio:
+        plans.append(make_plan([video, audio], duration))
+    if single and meets_quality(single, video, audio, height, abr):
+        # One muxed file: no second stream, no merge step at all
+        plans.append(make_plan([single], duration))
+    if not plans:
+        fallback = single or video or audio
+        if fallback is None:
+            return None
+        plans.append(make_plan([fallback], duration))
+
+    # Fewest post-processing steps first, then fewest bytes
+    return min(plans, key=lambda plan: (
+        plan['needs_merge'] and not plan['copy_merge'],
+        plan['needs_merge'],
+        plan['estimated_bytes'] or float('inf'),
+    ))
+
+
+def make_plan(chosen, duration):
+    sizes = [estimate_size(f, duration) for f in chosen]
+    video = next((f for f in chosen if has_video(f)), None)
+    audio = next((f for f in chosen if has_audio(f)), None)
+    needs_merge = len(chosen) > 1
+    return {
+        'format': '+'.join(str(f['format_id']) for f in chosen),
+        'estimated_bytes': sum(sizes) if all(sizes) else None,
+        'needs_merge': needs_merge,
+        # Merging MP4 video with M4A audio is a stream copy, no re-encode
+        'copy_merge': not needs_merge or (
+            video.get('ext') in MP4_VIDEO_EXTS and audio.get('ext') in MP4_AUDIO_EXTS),
+        'height': video.get('height') if video else None,
+        'abr': audio.get('abr') if audio else None,
+        'exts': [f.get('ext') for f in chosen],
+        'remux': None,
+        'strip_video': False,
+    }
@@ -0,0 +1,255 @@
+from itertools import compress
+import os
+
+from kivy.clock import Clock
+from kivy.metrics import dp
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.button import Button
+from kivy.uix.checkbox import CheckBox
+from kivy.uix.filechooser import FileChooserListView
+from kivy.uix.gridlayout import GridLayout
+from kivy.uix.label import Label
+from kivy.uix.popup import Popup
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.spinner import Spinner
+from kivy.uix.textinput import TextInput
+
+from download_engine import format_duration
+from gui_theme import COLORS
+
+# Dialogs opened on demand. The main window imports this module the first
+# time one is needed, so the file chooser and RecycleView widgets are not
+# loaded before the window appears.
+
+
+class FolderChooserPopup(Popup):
+    def __init__(self, callback, **kwargs):
+        super().__init__(**kwargs)
+        self.title = "Select Download Folder"
+        self.size_hint = (0.9, 0.7)
+        self.callback = callback
+
+        layout = BoxLayout(orientation='vertical', spacing=dp(10))
+        
+        self.file_chooser = FileChooserListView(
+            path=os.getcwd(),
+            size_hint=(1, 0.85),
+            dirselect=True
+        )
+        layout.add_widget(self.file_chooser)
+        
+        btn_layout = BoxLayout(size_hint=(1, 0.15), spacing=dp(10))
+        cancel_btn = Button(
+            text="Cancel", 
+            background_color=COLORS['danger'],
+            background_normal='',
+            size_hint=(0.4, 1)
+        )
+        cancel_btn.bind(on_press=self.dismiss)
+        
+        select_btn = Button(
+            text="Select", 
+            background_color=COLORS['success'],
+            background_normal='',
+            size_hint=(0.6, 1)
+        )
+        select_btn.bind(on_press=self.select_folder)
+        
+        btn_layout.add_widget(cancel_btn)
+        btn_layout.add_widget(select_btn)
+        layout.add_widget(btn_layout)
+        
+        self.content = layout
+
+    def select_folder(self, instance):
+        if self.file_chooser.path:
+            self.callback(self.file_chooser.path)
+        self.dismiss()
+
+# Duration filters offered in the playlist selector: (label, min seconds, max seconds)
+DURATION_FILTERS = (
+    ('Any Length', 0, None),
+    ('Under 4 min', 0, 240),
+    ('4-20 min', 240, 1200),
+    ('Over 20 min', 1200, None),
+)
+
+
+class VideoRow(RecycleDataViewBehavior, BoxLayout):
+    # One recycled row of the playlist selector. Rows hold no state of their
+    # own: refresh_view_attrs points them at an entry of the popup's model.
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.size_hint_y = None
+        self.height = dp(40)
+        self.video_index = 0
+        self.popup = None
+
+        self.checkbox = CheckBox(size_hint=(0.1, 1))
+        self.checkbox.bind(on_release=self.on_checkbox)
+        self.title_label = Label(size_hint=(0.7, 1), halign='left', shorten=True)
+        self.title_label.bind(size=self.title_label.setter('text_size'))
+        self.duration_label = Label(size_hint=(0.2, 1))
+        self.add_widget(self.checkbox)
+        self.add_widget(self.title_label)
+        self.add_widget(self.duration_label)
+
+    def refresh_view_attrs(self, rv, index, data):
+        self.popup = rv.popup
+        self.video_index = data['index']
+        self.title_label.text = self.popup.titles[self.video_index]
+        self.duration_label.text = format_duration(self.popup.durations[self.video_index])
+        self.checkbox.active = bool(self.popup.selection[self.video_index])
+        return super().refresh_view_attrs(rv, index, data)
+
+    def on_checkbox(self, instance):
+        self.popup.toggle_video(self.video_index, instance.active)
+
+
+class VideoInfoPopup(Popup):
+    # Playlist selector that stays responsive for thousands of entries: rows
+    # are recycled by a RecycleView, the model is a few flat lists, and the
+    # selection is a bytearray bitmap indexed by playlist position.
+    def __init__(self, videos, callback, **kwargs):
+        super().__init__(**kwargs)
+        self.title = "Select Videos to Download"
+        self.size_hint = (0.9, 0.8)
+        self.callback = callback
+
+        self.titles = [video.get('title') or f'Video {idx+1}' for idx, video in enumerate(videos)]
+        self.search_titles = [title.lower() for title in self.titles]
+        self.durations = [int(video.get('duration') or 0) for video in videos]
+        self.selection = bytearray(b'\x01') * len(videos)
+        self.selected_count = len(videos)
+        self.visible = None  # indices matching the filter; None means all
+        self.last_query = ''
+        self.last_duration_filter = DURATION_FILTERS[0][0]
+        self.filter_event = None
+
+        layout = BoxLayout(orientation='vertical', spacing=dp(10))
+        
+        # Filters
+        filter_layout = BoxLayout(size_hint=(1, None), height=dp(40), spacing=dp(10))
+        self.search_input = TextInput(
+            hint_text='Filter by title',
+            multiline=False,
+            size_hint=(0.5, 1)
+        )
+        self.search_input.bind(text=self.schedule_filter)
+        filter_layout.add_widget(self.search_input)
+        self.duration_filter = Spinner(
+            text=DURATION_FILTERS[0][0],
+            values=[label for label, _, _ in DURATION_FILTERS],
+            size_hint=(0.25, 1)
+        )
+        self.duration_filter.bind(text=self.schedule_filter)
+        filter_layout.add_widget(self.duration_filter)
+        self.count_label = Label(size_hint=(0.25, 1))
+        filter_layout.add_widget(self.count_label)
+        layout.add_widget(filter_layout)
+        
+        # Header
+        header = GridLayout(cols=3, size_hint=(1, None), height=dp(40))
+        header.add_widget(Label(text='', size_hint=(0.1, 1)))
+        header.add_widget(Label(text='Video Title', bold=True, size_hint=(0.7, 1)))
+        header.add_widget(Label(text='Duration', bold=True, size_hint=(0.2, 1)))
+        layout.add_widget(header)
+        
+        # Recycled list: only the rows on screen exist as widgets
+        self.list_view = RecycleView(size_hint=(1, 0.8))
+        self.list_view.popup = self
+        self.list_view.viewclass = VideoRow
+        list_layout = RecycleBoxLayout(
+            orientation='vertical',
+            default_size=(None, dp(40)),
+            default_size_hint=(1, None),
+            size_hint_y=None,
+            spacing=dp(5)
+        )
+        list_layout.bind(minimum_height=list_layout.setter('height'))
+        self.list_view.add_widget(list_layout)
+        layout.add_widget(self.list_view)
+        
+        # Buttons
+        btn_layout = BoxLayout(size_hint=(1, 0.1), spacing=dp(10))
+        select_all = Button(text='Select All', size_hint=(0.3, 1))
+        select_all.bind(on_press=lambda x: self.toggle_all(True))
+        select_none = Button(text='Select None', size_hint=(0.3, 1))
+        select_none.bind(on_press=lambda x: self.toggle_all(False))
+        download_btn = Button(text='Download Selected', size_hint=(0.4, 1), 
+                             background_color=COLORS['success'])
+        download_btn.bind(on_press=self.confirm_selection)
+        
+        btn_layout.add_widget(select_all)
+        btn_layout.add_widget(select_none)
+        btn_layout.add_widget(download_btn)
+        layout.add_widget(btn_layout)
+        
+        self.content = layout
+        self.show_rows()
+
+    def show_rows(self):
+        indices = range(len(self.titles)) if self.visible is None else self.visible
+        self.list_view.data = [{'index': idx} for idx in indices]
+        self.update_count()
+
+    def update_count(self):
+        shown = len(self.titles) if self.visible is None else len(self.visible)
+        self.count_label.text = f'{self.selected_count} selected / {shown} shown'
+
+    def schedule_filter(self, *args):
+        # Coalesce keystrokes into one filter pass
+        if self.filter_event:
+            self.filter_event.cancel()
+        self.filter_event = Clock.schedule_once(self.apply_filter, 0.15)
+
+    def apply_filter(self, dt):
+        query = self.search_input.text.strip().lower()
+        _, low, high = next(f for f in DURATION_FILTERS if f[0] == self.duration_filter.text)
+        
+        # A longer query can only narrow the previous matches
+        if self.visible is not None and self.last_query and query.startswith(self.last_query) \
+                and self.duration_filter.text == self.last_duration_filter:
+            candidates = self.visible
+        else:
+            candidates = range(len(self.titles))
+        self.last_query = query
+        self.last_duration_filter = self.duration_filter.text
+        
+        if not query and low == 0 and high is None:
+            self.visible = None
+        else:
+            self.visible = [
+                idx for idx in candidates
+                if query in self.search_titles[idx]
+                and self.durations[idx] >= low
+                and (high is None or self.durations[idx] < high)
+            ]
+        self.show_rows()
+    
+    def toggle_video(self, idx, active):
+        value = 1 if active else 0
+        if self.selection[idx] != value:
+            self.selection[idx] = value
+            self.selected_count += 1 if active else -1
+            self.update_count()
+    
+    def toggle_all(self, select):
+        # Applies to the rows matching the current filter
+        value = 1 if select else 0
+        if self.visible is None:
+            self.selection = bytearray([value]) * len(self.titles)
+            self.selected_count = len(self.titles) if select else 0
+        else:
+            for idx in self.visible:
+                if self.selection[idx] != value:
+                    self.selection[idx] = value
+                    self.selected_count += 1 if select else -1
+        self.list_view.refresh_from_data()
+        self.update_count()
+    
+    def confirm_selection(self, instance):
+        self.callback(list(compress(range(len(self.selection)), self.selection)))
+        self.dismiss()
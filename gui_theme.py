@@ -0,0 +1,13 @@
+# Colors for UI
+COLORS = {
+    'background': (0.95, 0.95, 0.95, 1),
+    'primary': (0.2, 0.6, 1, 1),
+    'secondary': (0.3, 0.3, 0.3, 1),
+    'success': (0.1, 0.8, 0.3, 1),
+    'warning': (1, 0.6, 0, 1),
+    'danger': (1, 0.3, 0.3, 1),
+    'text': (0.1, 0.1, 0.1, 1),
+    'input_bg': (1, 1, 1, 1),
+    'card_bg': (1, 1, 1, 1),
+    'header_bg': (0.85, 0.85, 0.85, 1),
+}
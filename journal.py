@@ -0,0 +1,167 @@
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from threading import Event, Lock, Thread
+
+from metadata_cache import CACHE_DIR
+
+# Jobs in these states had not finished when the journal was last written
+RESUMABLE_STATES = ('queued', 'downloading', 'processing', 'paused')
+JOB_FIELDS = ('url', 'video_quality', 'audio_quality', 'filename_format',
+              'download_folder', 'priority', 'segments')
+COLUMNS = ('id',) + JOB_FIELDS + ('state', 'bytes_done', 'error', 'created', 'updated')
+
+
+class JobJournal:
+    # Durable record of every submitted job and its last known state, kept in
+    # a WAL-mode SQLite file so a crash or reboot never loses the queue.
+    # Rows are written on submission and on each state change; byte counts
+    # are checkpointed at most every checkpoint_interval seconds per job.
+    #
+    # The GUI, the CLI and the daemon may all have the same file open. Job
+    # ids are allocated by SQLite on insert, and every row belongs to the
+    # journal instance that wrote it. Each instance heartbeats while it is
+    # open, and claim_pending() only hands out rows whose owner has stopped
+    # heartbeating for lease_seconds, never a running process's jobs.
+
+    def __init__(self, path=None, checkpoint_interval=5.0, keep_days=7, lease_seconds=30.0):
+        self.path = path or os.path.join(CACHE_DIR, 'jobs.sqlite3')
+        self.checkpoint_interval = checkpoint_interval
+        self.lease_seconds = lease_seconds
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.lock = Lock()
+        self.stopped = Event()
+
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('BEGIN IMMEDIATE')
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(jobs)')]
+        upgrade = bool(columns) and 'owner' not in columns
+        if upgrade:
+            # Journal from before ids came from AUTOINCREMENT and rows had owners
+            self.conn.execute('ALTER TABLE jobs RENAME TO jobs_old')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' url TEXT NOT NULL,'
+            ' video_quality TEXT,'
+            ' audio_quality TEXT,'
+            ' filename_format TEXT,'
+            ' download_folder TEXT,'
+            ' priority TEXT,'
+            ' segments INTEGER,'
+            ' state TEXT NOT NULL,'
+            ' bytes_done INTEGER DEFAULT 0,'
+            ' error TEXT,'
+            ' created REAL NOT NULL,'
+            ' updated REAL NOT NULL,'
+            ' owner TEXT)'
+        )
+        if upgrade:
+            columns = ', '.join(COLUMNS)
+            self.conn.execute(f'INSERT INTO jobs ({columns}) SELECT {columns} FROM jobs_old')
+            self.conn.execute('DROP TABLE jobs_old')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state)')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS owners ('
+            ' owner TEXT PRIMARY KEY,'
+            ' heartbeat REAL NOT NULL)'
+        )
+        self.conn.commit()
+        self.prune(keep_days * 86400)
+
+        self.beat()
+        self.heartbeat_thread = Thread(target=self.keep_alive, daemon=True)
+        self.heartbeat_thread.start()
+
+    def beat(self):
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO owners (owner, heartbeat) VALUES (?, ?)',
+                              (self.owner, time.time()))
+            self.conn.commit()
+
+    def keep_alive(self):
+        while not self.stopped.wait(self.lease_seconds / 3):
+            try:
+                self.beat()
+            except sqlite3.Error as e:
+                print(f"Journal heartbeat error: {str(e)}")
+
+    def record(self, job):
+        # Returns the job's id: a new one from SQLite unless job['id'] is set
+        # (a restored job keeps its row)
+        now = time.time()
+        with self.lock:
+            cursor = self.conn.execute(
+                'INSERT OR REPLACE INTO jobs (id, url, video_quality, audio_quality, filename_format,'
+                ' download_folder, priority, segments, state, bytes_done, created, updated, owner)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?, ?)',
+                (job['id'],) + tuple(job[field] for field in JOB_FIELDS) + (job['state'], now, now, self.owner)
+            )
+            self.conn.commit()
+        return cursor.lastrowid
+
+    def update(self, job_id, state, bytes_done=None, error=None):
+        with self.lock:
+            self.conn.execute(
+                'UPDATE jobs SET state = ?, bytes_done = COALESCE(?, bytes_done), error = ?,'
+                ' updated = ? WHERE id = ? AND owner = ?',
+                (state, bytes_done, error, time.time(), job_id, self.owner)
+            )
+            self.conn.commit()
+
+    def checkpoint(self, job_id, bytes_done):
+        with self.lock:
+            self.conn.execute(
+                'UPDATE jobs SET bytes_done = ?, updated = ? WHERE id = ? AND owner = ?',
+                (bytes_done, time.time(), job_id, self.owner)
+            )
+            self.conn.commit()
+
+    def claim_pending(self):
+        # Unfinished jobs in submission order whose owner is gone (closed,
+        # crashed, or not heartbeating); they belong to this journal from now on
+        placeholders = ', '.join('?' for _ in RESUMABLE_STATES)
+        stale = time.time() - self.lease_seconds
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                cursor = self.conn.execute(
+                    f'SELECT id, {", ".join(JOB_FIELDS)}, state, bytes_done FROM jobs'
+                    f' WHERE state IN ({placeholders}) AND (owner IS NULL OR owner = ? OR owner NOT IN'
+                    ' (SELECT owner FROM owners WHERE heartbeat >= ?)) ORDER BY id',
+                    RESUMABLE_STATES + (self.owner, stale)
+                )
+                columns = [column[0] for column in cursor.description]
+                rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+                self.conn.executemany('UPDATE jobs SET owner = ? WHERE id = ?',
+                                      [(self.owner, row['id']) for row in rows])
+                self.conn.execute('DELETE FROM owners WHERE heartbeat < ?', (stale,))
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+        return rows
+
+    def prune(self, max_age):
+        placeholders = ', '.join('?' for _ in RESUMABLE_STATES)
+        with self.lock:
+            self.conn.execute(
+                f'DELETE FROM jobs WHERE state NOT IN ({placeholders}) AND updated < ?',
+                RESUMABLE_STATES + (time.time() - max_age,)
+            )
+            self.conn.commit()
+
+    def close(self):
+        # This instance's unfinished jobs can be claimed right away
+        self.stopped.set()
+        self.heartbeat_thread.join()
+        with self.lock:
+            self.conn.execute('DELETE FROM owners WHERE owner = ?', (self.owner,))
+            self.conn.commit()
+            self.conn.close()
@@ -0,0 +1,261 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from threading import Event, Lock, Thread
+
+from scheduler import PRIORITIES
+
+# Engine job states that end a job (see download_engine.DONE_STATES)
+FINAL_STATES = ('finished', 'error', 'skipped', 'cancelled')
+VIDEO = 'video'
+PLAYLIST = 'playlist'
+
+
+class LeasedJobQueue:
+    # Job backlog shared by several machines (or processes) through one
+    # SQLite file on a shared path. A worker claims items with a lease that
+    # it renews by heartbeat; an item whose lease ran out (its worker died or
+    # hung) is handed to the next claimer. Completion is recorded only by
+    # the current lease holder, so each item gets exactly one result even if
+    # two workers ended up running it.
+    #
+    # Uses SQLite's rollback journal rather than WAL: WAL needs shared
+    # memory and is not safe on network filesystems.
+
+    def __init__(self, path, lease_seconds=60, max_attempts=5, worker_id=None):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+        self.lock = Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Autocommit; claims take the write lock explicitly
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA busy_timeout = 30000')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS items ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' kind TEXT NOT NULL,'
+            ' url TEXT NOT NULL,'
+            ' options TEXT NOT NULL,'
+            ' priority INTEGER NOT NULL,'
+            " state TEXT NOT NULL DEFAULT 'pending',"
+            ' owner TEXT,'
+            ' token TEXT,'
+            ' lease_expires REAL,'
+            ' attempts INTEGER NOT NULL DEFAULT 0,'
+            ' result TEXT,'
+            ' created REAL NOT NULL,'
+            ' finished REAL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS items_ready ON items (state, priority, id)')
+
+    def put(self, kind, url, options, priority='normal'):
+        with self.lock:
+            cursor = self.conn.execute(
+                'INSERT INTO items (kind, url, options, priority, created) VALUES (?, ?, ?, ?, ?)',
+                (kind, url, json.dumps(options), PRIORITIES[priority], time.time())
+            )
+        return cursor.lastrowid
+
+    def claim(self, limit=1):
+        # Up to limit items, highest priority first; each comes with the
+        # lease token needed to heartbeat or complete it
+        now = time.time()
+        claimed = []
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self.conn.execute(
+                    'SELECT id, kind, url, options, priority, attempts FROM items'
+                    " WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ?)"
+                    ' ORDER BY priority, id LIMIT ?',
+                    (now, limit)
+                ).fetchall()
+                for item_id, kind, url, options, priority, attempts in rows:
+                    if attempts >= self.max_attempts:
+                        # Every earlier holder lost its lease; stop handing it out
+                        self.conn.execute(
+                            "UPDATE items SET state = 'error', owner = NULL, token = NULL,"
+                            ' lease_expires = NULL, result = ?, finished = ? WHERE id = ?',
+                            (json.dumps({'error': f'Lease expired {attempts} times'}), now, item_id)
+                        )
+                        continue
+                    token = uuid.uuid4().hex
+                    self.conn.execute(
+                        "UPDATE items SET state = 'leased', owner = ?, token = ?, lease_expires = ?,"
+                        ' attempts = attempts + 1 WHERE id = ?',
+                        (self.worker_id, token, now + self.lease_seconds, item_id)
+                    )
+                    claimed.append({
+                        'id': item_id,
+                        'token': token,
+                        'kind': kind,
+                        'url': url,
+                        'options': json.loads(options),
+                        'priority': next(name for name, rank in PRIORITIES.items() if rank == priority),
+                    })
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+        return claimed
+
+    def heartbeat(self, tokens):
+        # Extends the given leases; returns the tokens this worker still holds
+        if not tokens:
+            return set()
+        tokens = list(tokens)
+        marks = ','.join('?' * len(tokens))
+        with self.lock:
+            self.conn.execute(
+                f"UPDATE items SET lease_expires = ? WHERE state = 'leased' AND token IN ({marks})",
+                [time.time() + self.lease_seconds] + tokens
+            )
+            rows = self.conn.execute(
+                f"SELECT token FROM items WHERE state = 'leased' AND token IN ({marks})", tokens
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def complete(self, item_id, token, state, result=None):
+        # True if this call recorded the result; False if the lease had been
+        # lost and another worker owns (or already finished) the item
+        with self.lock:
+            cursor = self.conn.execute(
+                'UPDATE items SET state = ?, result = ?, finished = ?, owner = NULL, token = NULL,'
+                " lease_expires = NULL WHERE id = ? AND token = ? AND state = 'leased'",
+                (state, json.dumps(result) if result is not None else None, time.time(), item_id, token)
+            )
+        return cursor.rowcount == 1
+
+    def release(self, item_id, token):
+        # Hand an unstarted item back without waiting for its lease to expire
+        with self.lock:
+            self.conn.execute(
+                "UPDATE items SET state = 'pending', owner = NULL, token = NULL, lease_expires = NULL,"
+                " attempts = attempts - 1 WHERE id = ? AND token = ? AND state = 'leased'",
+                (item_id, token)
+            )
+
+    def counts(self):
+        with self.lock:
+            rows = self.conn.execute('SELECT state, COUNT(*) FROM items GROUP BY state').fetchall()
+        return dict(rows)
+
+    def drained(self):
+        counts = self.counts()
+        return not counts.get('pending') and not counts.get('leased')
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class ClusterWorker:
+    # Feeds a local DownloadEngine from a LeasedJobQueue. Items are claimed
+    # only while the engine has room (prefetch jobs per allowed download),
+    # so the rest of the backlog stays available to other machines.
+    # Playlist items are expanded into video items on the shared queue.
+
+    def __init__(self, engine, queue, prefetch=2, poll_interval=1.0):
+        self.engine = engine
+        self.queue = queue
+        self.prefetch = prefetch
+        self.poll_interval = poll_interval
+        self.held = {}  # local job id (or playlist key) -> claimed item
+        self.lock = Lock()
+        self.stopped = Event()
+        self.threads = []
+        self.recorded = 0
+        self.lost = 0
+
+    def start(self):
+        self.engine.add_listener(self.on_engine_event)
+        for target in (self.feed, self.heartbeat):
+            thread = Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def wait(self, timeout=None):
+        # Block until the shared backlog is empty and our own jobs are done
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while deadline is None or time.monotonic() < deadline:
+            with self.lock:
+                busy = bool(self.held)
+            if not busy and self.queue.drained():
+                return True
+            time.sleep(self.poll_interval)
+        return False
+
+    def feed(self):
+        while not self.stopped.is_set():
+            with self.lock:
+                room = self.engine.concurrency.target * self.prefetch - len(self.held)
+            items = self.queue.claim(room) if room > 0 else []
+            for item in items:
+                self.run(item)
+            if not items:
+                self.stopped.wait(self.poll_interval)
+
+    def run(self, item):
+        try:
+            if item['kind'] == PLAYLIST:
+                # Held like a job while it expands, so heartbeat() keeps the
+                # lease for a listing that takes longer than one lease
+                key = (PLAYLIST, item['id'])
+                with self.lock:
+                    self.held[key] = item
+                try:
+                    count = 0
+                    for entry in self.engine.iter_playlist_entries(item['url']):
+                        self.queue.put(VIDEO, entry['url'], item['options'], item['priority'])
+                        count += 1
+                finally:
+                    with self.lock:
+                        self.held.pop(key, None)
+                self.record(item, 'finished', {'entries': count})
+                return
+            with self.lock:
+                job_id = self.engine.submit(item['url'], priority=item['priority'], **item['options'])
+                if job_id is not None:
+                    self.held[job_id] = item
+            if job_id is None:
+                self.record(item, 'skipped', {'reason': 'archived'})
+        except Exception as e:
+            self.record(item, 'error', {'error': str(e)})
+
+    def on_engine_event(self, event, job):
+        if job['state'] not in FINAL_STATES:
+            return
+        with self.lock:
+            item = self.held.pop(job['id'], None)
+        if item is not None:
+            self.record(item, job['state'], {'error': job.get('error'), 'worker': self.queue.worker_id})
+
+    def record(self, item, state, result):
+        if self.queue.complete(item['id'], item['token'], state, result):
+            self.recorded += 1
+        else:
+            self.lost += 1
+
+    def heartbeat(self):
+        interval = self.queue.lease_seconds / 3
+        while not self.stopped.wait(interval):
+            with self.lock:
+                tokens = [item['token'] for item in self.held.values()]
+            held = self.queue.heartbeat(tokens)
+            lost = len(tokens) - len(held)
+            if lost:
+                # Reclaimed by another worker after we missed heartbeats; our
+                # copies still run but their results won't be recorded
+                print(f'Lost {lost} lease(s) to other workers', flush=True)
@@ -0,0 +1,156 @@
+import json
+import os
+import sqlite3
+import time
+from threading import Lock
+
+from url_ingest import CHANNEL, PLAYLIST, VIDEO, parse_url
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'youtube_downloader')
+JSON_TYPES = (str, int, float, bool, type(None))
+SKIP = object()
+
+
+def cache_key(url, kind='video'):
+    # Key by the canonical video/playlist ID so that different spellings of
+    # the same URL share one entry
+    parsed = parse_url(url)
+    if parsed:
+        link_kind, ident = parsed
+        if (kind == 'video' and link_kind == VIDEO) or \
+                (kind == 'playlist' and link_kind in (PLAYLIST, CHANNEL)):
+            return f'{kind}:{ident}'
+    return f'{kind}:url:{url}'
+
+
+def json_safe(value):
+    # Copy of an extract_info result without what JSON can't store (lazy
+    # entry generators, postprocessor objects); SKIP if value itself is such
+    if isinstance(value, JSON_TYPES):
+        return value
+    if isinstance(value, dict):
+        items = ((key, json_safe(item)) for key, item in value.items() if isinstance(key, str))
+        return {key: item for key, item in items if item is not SKIP}
+    if isinstance(value, (list, tuple)):
+        return [item for item in map(json_safe, value) if item is not SKIP]
+    return SKIP
+
+
+class MetadataCache:
+    # On-disk cache of extract_info results. Entries older than ttl seconds
+    # are treated as misses; once more than max_entries are stored, the least
+    # recently used ones are evicted. Hits only note their access time in
+    # memory; those are written with the next put (which is when eviction
+    # needs them) or on close, so a hit costs one SELECT and no commit.
+
+    def __init__(self, path=None, ttl=3600, max_entries=5000):
+        self.path = path or os.path.join(CACHE_DIR, 'metadata.sqlite3')
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.touched = {}  # key -> access time not written yet
+        self.lock = Lock()
+
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS metadata ('
+            ' key TEXT PRIMARY KEY,'
+            ' data TEXT NOT NULL,'
+            ' created REAL NOT NULL,'
+            ' accessed REAL NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS metadata_accessed ON metadata (accessed)')
+        self.conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT data, created FROM metadata WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self.conn.execute('DELETE FROM metadata WHERE key = ?', (key,))
+                    self.conn.commit()
+                    self.touched.pop(key, None)
+                self.misses += 1
+                return None
+            self.touched[key] = now
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        value = json_safe(value)
+        if value is SKIP:
+            return
+        now = time.time()
+        data = json.dumps(value)
+        with self.lock:
+            self.touched.pop(key, None)
+            self.flush()
+            self.conn.execute(
+                'INSERT OR REPLACE INTO metadata (key, data, created, accessed) VALUES (?, ?, ?, ?)',
+                (key, data, now, now)
+            )
+            self.evict()
+            self.conn.commit()
+
+    def flush(self):
+        # Writes the access times of hits since the last put, with self.lock held
+        if self.touched:
+            self.conn.executemany('UPDATE metadata SET accessed = ? WHERE key = ?',
+                                  [(accessed, key) for key, accessed in self.touched.items()])
+            self.touched.clear()
+
+    def delete(self, key):
+        with self.lock:
+            self.touched.pop(key, None)
+            self.conn.execute('DELETE FROM metadata WHERE key = ?', (key,))
+            self.conn.commit()
+
+    def evict(self):
+        count = self.conn.execute('SELECT COUNT(*) FROM metadata').fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                'DELETE FROM metadata WHERE key IN '
+                '(SELECT key FROM metadata ORDER BY accessed LIMIT ?)',
+                (excess,)
+            )
+            self.evictions += excess
+
+    def get_or_fetch(self, key, fetch):
+        value = self.get(key)
+        if value is None:
+            value = fetch()
+            if value:
+                self.put(key, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.touched.clear()
+            self.conn.execute('DELETE FROM metadata')
+            self.conn.commit()
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute('SELECT COUNT(*) FROM metadata').fetchone()[0]
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': entries,
+        }
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.conn.commit()
+            self.conn.close()
@@ -0,0 +1,207 @@
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+# Stage -> (start mark, end mark). A job's time in each stage is the gap
+# between the two monotonic timestamps; stages a job skipped are omitted.
+STAGES = {
+    'queue_wait': ('submitted', 'resolve_started'),
+    'extract': ('resolve_started', 'resolved'),
+    'download_wait': ('resolved', 'download_started'),
+    'transfer': ('download_started', 'transfer_done'),
+    'postprocess': ('transfer_done', 'done'),
+}
+# Histogram upper bounds in seconds, Prometheus style (cumulative)
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800, float('inf'))
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'sum', 'max')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'avg': round(self.sum / self.count, 6) if self.count else 0.0,
+            'max': round(self.max, 6),
+        }
+
+
+def format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+def error_class(error):
+    # yt-dlp wraps the real failure in DownloadError; report the cause
+    cause = getattr(error, 'exc_info', None)
+    if cause and cause[1] is not None:
+        error = cause[1]
+    return type(error).__name__
+
+
+class Metrics:
+    # Per-job lifecycle timestamps folded into per-stage histograms and
+    # counters when the job ends. Marks are plain dict stores from whichever
+    # thread owns the job at that point; aggregation takes one lock per
+    # finished job. With log_path set, every finished job is also appended
+    # to that file as one JSON line.
+
+    def __init__(self, log_path=None):
+        self.lock = Lock()
+        self.marks = {}
+        self.stages = {stage: Histogram() for stage in list(STAGES) + ['total']}
+        self.jobs = {}
+        self.errors = {}
+        self.bytes = 0
+        self.retries = {}
+        self.log_path = log_path
+        self.log = open(log_path, 'a', buffering=1) if log_path else None
+        self.started = time.monotonic()
+
+    def mark(self, job_id, name, at=None):
+        self.marks.setdefault(job_id, {})[name] = at if at is not None else time.monotonic()
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            self.stages[stage].observe(seconds)
+
+    def retry(self, job, kind):
+        job['retries'] = job.get('retries', 0) + 1
+        with self.lock:
+            self.retries[kind] = self.retries.get(kind, 0) + 1
+
+    def finish(self, job, bytes_done):
+        marks = self.marks.pop(job['id'], {})
+        marks['done'] = time.monotonic()
+        timings = {}
+        for stage, (start, end) in STAGES.items():
+            if start in marks and end in marks:
+                timings[stage] = max(0.0, marks[end] - marks[start])
+        if 'submitted' in marks:
+            timings['total'] = marks['done'] - marks['submitted']
+
+        with self.lock:
+            for stage, seconds in timings.items():
+                self.stages[stage].observe(seconds)
+            self.jobs[job['state']] = self.jobs.get(job['state'], 0) + 1
+            if job.get('error_class'):
+                self.errors[job['error_class']] = self.errors.get(job['error_class'], 0) + 1
+            self.bytes += bytes_done
+
+        if self.log:
+            self.log.write(json.dumps({
+                'time': time.time(),
+                'job_id': job['id'],
+                'url': job['url'],
+                'state': job['state'],
+                'error_class': job.get('error_class'),
+                'failure': job.get('failure'),
+                'error': job.get('error'),
+                'bytes': bytes_done,
+                'retries': job.get('retries', 0),
+                'stages': {stage: round(seconds, 6) for stage, seconds in timings.items()},
+            }) + '\n')
+        return timings
+
+    def stats(self):
+        with self.lock:
+            return {
+                'uptime': time.monotonic() - self.started,
+                'jobs': dict(self.jobs),
+                'errors': dict(self.errors),
+                'bytes': self.bytes,
+                'retries': dict(self.retries),
+                'stages': {stage: histogram.as_dict() for stage, histogram in self.stages.items()},
+            }
+
+    def prometheus(self, gauges=None):
+        # Text exposition format; gauges maps name -> value or
+        # name -> {label value: value} (labelled by priority)
+        lines = []
+        with self.lock:
+            lines.append('# TYPE ytdl_jobs_total counter')
+            for state, count in sorted(self.jobs.items()):
+                lines.append(f'ytdl_jobs_total{{state="{state}"}} {count}')
+            lines.append('# TYPE ytdl_errors_total counter')
+            for name, count in sorted(self.errors.items()):
+                lines.append(f'ytdl_errors_total{{class="{name}"}} {count}')
+            lines.append('# TYPE ytdl_bytes_total counter')
+            lines.append(f'ytdl_bytes_total {self.bytes}')
+            lines.append('# TYPE ytdl_retries_total counter')
+            for kind, count in sorted(self.retries.items()):
+                lines.append(f'ytdl_retries_total{{kind="{kind}"}} {count}')
+            lines.append('# TYPE ytdl_stage_seconds histogram')
+            for stage, histogram in self.stages.items():
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram.counts):
+                    cumulative += count
+                    lines.append(f'ytdl_stage_seconds_bucket{{stage="{stage}",le="{format_bound(bound)}"}} '
+                                 f'{cumulative}')
+                lines.append(f'ytdl_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'ytdl_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        for name, value in (gauges or {}).items():
+            lines.append(f'# TYPE ytdl_{name} gauge')
+            if isinstance(value, dict):
+                for label, item in value.items():
+                    lines.append(f'ytdl_{name}{{priority="{label}"}} {item}')
+            else:
+                lines.append(f'ytdl_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        if self.log:
+            self.log.close()
+            self.log = None
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        engine = self.server.engine
+        if self.path == '/metrics':
+            body = engine.metrics.prometheus(engine.gauges()).encode()
+            content_type = 'text/plain; version=0.0.4'
+        elif self.path == '/stats':
+            body = json.dumps(engine.stats()).encode()
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer(ThreadingHTTPServer):
+    # GET /metrics (Prometheus text) and GET /stats (JSON) on localhost only
+    daemon_threads = True
+
+    def __init__(self, engine, port=9464):
+        super().__init__(('127.0.0.1', port), MetricsHandler)
+        self.engine = engine
+        self.thread = Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,127 @@
+import os
+import re
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+
+# Part files are named like yt-dlp's own: "<name>.f<format_id>.<ext>"
+PART_SUFFIX_RE = re.compile(r'\.f[^./\\]+\.[^./\\]+$')
+
+# info field -> container tag embedded while merging
+METADATA_FIELDS = (
+    ('title', 'title'),
+    ('uploader', 'artist'),
+    ('upload_date', 'date'),
+    ('webpage_url', 'comment'),
+)
+
+
+def part_template(template):
+    # Output template for one stream of a split download
+    return os.path.splitext(template)[0] + '.f%(format_id)s.%(ext)s'
+
+
+def merged_filename(part_path, ext='mp4'):
+    return PART_SUFFIX_RE.sub('', part_path) + '.' + ext
+
+
+def info_metadata(info):
+    return {tag: str(info[field]) for field, tag in METADATA_FIELDS if info.get(field)}
+
+
+def merge_command(ffmpeg, parts, output, metadata, audio_only=False):
+    # One part and a new extension is a remux; audio_only drops any video
+    command = [ffmpeg, '-y', '-nostdin', '-loglevel', 'error']
+    for part in parts:
+        command += ['-i', part]
+    for index in range(len(parts)):
+        command += ['-map', f'{index}:a' if audio_only else str(index)]
+    # Stream copy only: the planner picked streams the container can hold
+    command += ['-c', 'copy']
+    for tag, value in metadata.items():
+        command += ['-metadata', f'{tag}={value}']
+    if output.endswith(('.mp4', '.m4a')):
+        command += ['-movflags', '+faststart']
+    return command + [output]
+
+
+def merge_streams(ffmpeg, parts, output, metadata, audio_only=False):
+    # Runs in a pool process. Writes next to the output and renames, so a
+    # half-written file never has the final name.
+    root, ext = os.path.splitext(output)
+    temp = f'{root}.temp{ext}'
+    result = subprocess.run(merge_command(ffmpeg, parts, temp, metadata, audio_only),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        if os.path.exists(temp):
+            os.remove(temp)
+        error = result.stderr.decode('utf-8', 'replace').strip().splitlines()
+        raise RuntimeError(f"ffmpeg merge failed: {error[-1] if error else result.returncode}")
+    os.replace(temp, output)
+    for part in parts:
+        os.remove(part)
+    return output
+
+
+class PostProcessingStage:
+    # Merging, remuxing and tagging run here instead of inside a download
+    # worker, so a worker hands its finished parts over and goes straight
+    # back to the network. Jobs wait in the executor's queue for one of
+    # `workers` processes (default: one per CPU core).
+
+    def __init__(self, workers=None, ffmpeg=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.ffmpeg = ffmpeg or shutil.which('ffmpeg')
+        self.executor = None
+        self.lock = Lock()
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+
+    @property
+    def available(self):
+        # Without ffmpeg on PATH downloads fall back to yt-dlp's in-line merge
+        return self.ffmpeg is not None
+
+    def submit(self, parts, output, metadata, callback, audio_only=False):
+        # callback(output, error) runs on the executor's management thread
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            self.pending += 1
+            try:
+                future = self.executor.submit(merge_streams, self.ffmpeg, parts, output, metadata, audio_only)
+            except BrokenProcessPool:
+                # A pool process died (OOM killer, signal); start a fresh pool
+                self.executor.shutdown(wait=False)
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+                future = self.executor.submit(merge_streams, self.ffmpeg, parts, output, metadata, audio_only)
+        future.add_done_callback(lambda f: self.done(f, callback))
+        return future
+
+    def done(self, future, callback):
+        error = future.exception()
+        with self.lock:
+            self.pending -= 1
+            if error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+        callback(None if error else future.result(), error)
+
+    def close(self, wait=True):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'workers': self.workers,
+                'pending': self.pending,
+                'completed': self.completed,
+                'failed': self.failed,
+            }
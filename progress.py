@@ -0,0 +1,131 @@
+import time
+from threading import Lock
+
+
+class ProgressRecord:
+    # Per-job progress written by exactly one worker thread. Each update is a
+    # handful of plain attribute stores, so the hot path takes no locks;
+    # readers may see a slightly stale mix of fields, which is fine for a
+    # display sampled at a fixed rate.
+    __slots__ = ('job_id', 'url', 'state', 'downloaded_bytes', 'completed_bytes',
+                 'total_bytes', 'speed', 'eta', 'message', 'updated')
+
+    def __init__(self, job_id, url):
+        self.job_id = job_id
+        self.url = url
+        self.state = 'queued'
+        self.downloaded_bytes = 0  # current part (video or audio stream)
+        self.completed_bytes = 0   # earlier parts of the same job
+        self.total_bytes = 0
+        self.speed = 0.0
+        self.eta = None
+        self.message = ''
+        self.updated = time.monotonic()
+
+    @property
+    def bytes_done(self):
+        return self.completed_bytes + self.downloaded_bytes
+
+    @property
+    def percent(self):
+        if self.state == 'finished':
+            return 100.0
+        if not self.total_bytes:
+            return 0.0
+        return min(100.0, 100.0 * self.downloaded_bytes / self.total_bytes)
+
+    def update(self, d):
+        # Called from the yt-dlp progress hook
+        if d['status'] == 'downloading':
+            self.downloaded_bytes = d.get('downloaded_bytes') or 0
+            self.total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+            self.speed = d.get('speed') or 0.0
+            self.eta = d.get('eta')
+        elif d['status'] == 'finished':
+            self.completed_bytes += d.get('downloaded_bytes') or d.get('total_bytes') or 0
+            self.downloaded_bytes = 0
+            self.speed = 0.0
+            self.eta = None
+        self.updated = time.monotonic()
+
+    def as_dict(self):
+        return {
+            'job_id': self.job_id,
+            'url': self.url,
+            'state': self.state,
+            'bytes_done': self.bytes_done,
+            'total_bytes': self.total_bytes,
+            'percent': self.percent,
+            'speed': self.speed,
+            'eta': self.eta,
+            'message': self.message,
+        }
+
+
+class ProgressTracker:
+    # Aggregates ProgressRecords for consumers that sample on a timer (the UI
+    # at 10 Hz, the CLI, metrics). Sampling only walks the active jobs, so its
+    # cost does not depend on queue length or on how often hooks fire.
+
+    def __init__(self):
+        self.records = {}
+        self.active = {}
+        self.lock = Lock()
+        self.finished_bytes = 0
+        self.finished_jobs = 0
+        self.failed_jobs = 0
+
+    def add(self, job_id, url):
+        record = ProgressRecord(job_id, url)
+        self.records[job_id] = record
+        return record
+
+    def get(self, job_id):
+        return self.records.get(job_id)
+
+    def remove(self, job_id):
+        # Forget a finished job; the totals above keep counting it
+        self.active.pop(job_id, None)
+        self.records.pop(job_id, None)
+
+    def set_state(self, job_id, state, message=None):
+        record = self.records[job_id]
+        record.state = state
+        if message is not None:
+            record.message = message
+        if state == 'downloading':
+            self.active[job_id] = record
+            return
+        self.active.pop(job_id, None)
+        record.speed = 0.0
+        record.eta = None
+        with self.lock:
+            if state == 'finished':
+                self.finished_bytes += record.bytes_done
+                self.finished_jobs += 1
+            elif state == 'error':
+                self.failed_jobs += 1
+
+    def snapshot(self):
+        active = [record.as_dict() for record in list(self.active.values())]
+        speed = sum(record['speed'] for record in active)
+        active_bytes = sum(record['bytes_done'] for record in active)
+        percent = sum(record['percent'] for record in active) / len(active) if active else 0.0
+
+        return {
+            'active': active,
+            'active_jobs': len(active),
+            'speed': speed,
+            'percent': percent,
+            'bytes_done': self.finished_bytes + active_bytes,
+            'finished_jobs': self.finished_jobs,
+            'failed_jobs': self.failed_jobs,
+        }
+
+
+def format_bytes(num):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(num) < 1024:
+            return f'{num:.1f} {unit}'
+        num /= 1024.0
+    return f'{num:.1f} TB'
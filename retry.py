@@ -0,0 +1,230 @@
+import errno
+import heapq
+import http.client
+import itertools
+import random
+import time
+import urllib.error
+from threading import Condition, Lock, Thread
+from urllib.parse import urlsplit
+
+from url_ingest import parse_url
+
+# Failure kinds
+TRANSIENT = 'transient'      # network hiccup, expired stream URL, server error
+THROTTLED = 'throttled'      # HTTP 429, bot check: the host wants us to slow down
+UNAVAILABLE = 'unavailable'  # private, removed, region-locked: retrying won't help
+POSTPROCESS = 'postprocess'  # ffmpeg merge/remux failed
+FATAL = 'fatal'              # anything else, e.g. a full disk
+
+# Lower-cased fragments of yt-dlp error messages; checked in this order
+MESSAGE_KINDS = (
+    (THROTTLED, ('http error 429', 'too many requests', 'rate-limit', 'rate limit',
+                 "confirm you're not a bot", 'confirm you’re not a bot')),
+    (UNAVAILABLE, ('video unavailable', 'private video', 'has been removed', 'is not available',
+                   'members-only', 'join this channel', 'copyright', 'has been terminated',
+                   'confirm your age', 'http error 404', 'http error 410', 'unsupported url',
+                   'premieres in', 'live event will begin')),
+    (TRANSIENT, ('timed out', 'connection reset', 'connection aborted', 'remote end closed',
+                 'temporary failure in name resolution', 'network is unreachable',
+                 'incomplete read', 'incompleteread', 'content too short', 'http error 403',
+                 'http error 5', 'unable to download', 'giving up after', 'ssl')),
+)
+# yt-dlp's own network exceptions, matched by name so this module doesn't
+# import yt_dlp
+TRANSIENT_NAMES = ('TransportError', 'ContentTooShortError', 'IncompleteRead')
+
+
+def cause_of(error):
+    # yt-dlp wraps the real failure in DownloadError
+    cause = getattr(error, 'exc_info', None)
+    return cause[1] if cause and cause[1] is not None else error
+
+
+def status_code(error):
+    for candidate in (error, getattr(error, 'response', None)):
+        status = getattr(candidate, 'status', None) or getattr(candidate, 'code', None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def classify(error):
+    # Failure kind of an exception raised by extraction or download
+    cause = cause_of(error)
+    status = status_code(cause)
+    if status == 429:
+        return THROTTLED
+    if status in (404, 410):
+        return UNAVAILABLE
+    if status in (403, 408) or (status and status >= 500):
+        return TRANSIENT
+
+    message = f'{error} {cause}'.lower()
+    for kind, fragments in MESSAGE_KINDS:
+        if any(fragment in message for fragment in fragments):
+            return kind
+
+    if isinstance(cause, OSError) and cause.errno in (errno.ENOSPC, errno.EDQUOT):
+        return FATAL
+    if isinstance(cause, (ConnectionError, TimeoutError, urllib.error.URLError, http.client.HTTPException)):
+        return TRANSIENT
+    if any(cls.__name__ in TRANSIENT_NAMES for cls in type(cause).__mro__):
+        return TRANSIENT
+    return FATAL
+
+
+def retry_after(error):
+    # Seconds from a Retry-After header on an HTTP error, if any
+    cause = cause_of(error)
+    for candidate in (cause, getattr(cause, 'response', None)):
+        headers = getattr(candidate, 'headers', None)
+        value = headers.get('Retry-After') if headers is not None else None
+        if value and str(value).strip().isdigit():
+            return int(value)
+    return None
+
+
+def host_key(url):
+    # Circuit breaker key: every spelling of a YouTube link is one host
+    if parse_url(url):
+        return 'youtube.com'
+    host = (urlsplit(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+class RetryPolicy:
+    # Retries per failure kind and their backoff: the n-th retry waits
+    # between half and all of min(cap, base * 2**n) seconds, so jobs that
+    # failed together don't come back together
+
+    def __init__(self, max_retries=5):
+        self.limits = {TRANSIENT: max_retries, THROTTLED: max_retries, POSTPROCESS: min(1, max_retries)}
+        self.backoff = {TRANSIENT: (2.0, 120.0), THROTTLED: (30.0, 900.0), POSTPROCESS: (5.0, 5.0)}
+
+    def delay(self, kind, retries):
+        # None when a job that has been retried `retries` times gives up
+        if retries >= self.limits.get(kind, 0):
+            return None
+        base, cap = self.backoff[kind]
+        ceiling = min(cap, base * 2 ** retries)
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+class RetryScheduler:
+    # One timer thread for every delayed retry: callbacks wait in a heap
+    # ordered by due time instead of each holding a sleeping worker.
+    # Callbacks run on the timer thread and must be quick (queue puts).
+
+    def __init__(self):
+        self.heap = []
+        self.counter = itertools.count()
+        self.condition = Condition()
+        self.closed = False
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.closed = False
+            self.thread = Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def call_later(self, delay, callback):
+        with self.condition:
+            heapq.heappush(self.heap, (time.monotonic() + delay, next(self.counter), callback))
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.closed:
+                    now = time.monotonic()
+                    if self.heap and self.heap[0][0] <= now:
+                        break
+                    self.condition.wait(self.heap[0][0] - now if self.heap else None)
+                if self.closed:
+                    return
+                _, _, callback = heapq.heappop(self.heap)
+            try:
+                callback()
+            except Exception as e:
+                print(f"Retry callback error: {str(e)}")
+
+    def pending(self):
+        with self.condition:
+            return len(self.heap)
+
+    def close(self):
+        # Pending retries are dropped; journaled jobs resume on the next start
+        with self.condition:
+            self.closed = True
+            self.heap = []
+            self.condition.notify()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+
+class CircuitBreaker:
+    # Per-host gate in front of the resolve and download stages. A throttled
+    # response, or `threshold` transient failures in a row, opens the host's
+    # circuit: its jobs wait instead of burning through the queue. After the
+    # cooldown one job at a time goes through as a probe; a completed job
+    # closes the circuit again, another failure reopens it for twice as long.
+
+    def __init__(self, cooldown=60.0, max_cooldown=900.0, threshold=5, probe_window=30.0):
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.threshold = threshold
+        self.probe_window = probe_window
+        self.lock = Lock()
+        self.hosts = {}  # host -> {'failures', 'trips', 'until', 'probing'}
+
+    def blocked(self, host):
+        # Seconds until a job for host may go ahead; 0 means now
+        return self.check(host)[0]
+
+    def check(self, host):
+        # (seconds to wait, whether this caller is the half-open probe)
+        with self.lock:
+            state = self.hosts.get(host)
+            if state is None or not state['until']:
+                return 0.0, False
+            now = time.monotonic()
+            if now < state['until']:
+                return state['until'] - now, False
+            # Half-open: let this job through and hold the rest for a while
+            state['until'] = now + self.probe_window
+            state['probing'] = True
+            return 0.0, True
+
+    def failure(self, host, kind, wait=None):
+        # Only network-level failures say anything about the host
+        if kind not in (TRANSIENT, THROTTLED):
+            return 0.0
+        with self.lock:
+            state = self.hosts.setdefault(host, {'failures': 0, 'trips': 0, 'until': 0.0, 'probing': False})
+            now = time.monotonic()
+            if state['until'] > now and not state['probing']:
+                # Already open: jobs that started before it opened don't
+                # lengthen the cooldown
+                return state['until'] - now
+            state['failures'] += 1
+            if kind != THROTTLED and state['failures'] < self.threshold:
+                return 0.0
+            cooldown = min(self.max_cooldown, self.cooldown * 2 ** state['trips'])
+            state['trips'] += 1
+            state['failures'] = 0
+            state['probing'] = False
+            state['until'] = now + max(cooldown, wait or 0)
+            return state['until'] - now
+
+    def success(self, host):
+        with self.lock:
+            self.hosts.pop(host, None)
+
+    def open_hosts(self):
+        now = time.monotonic()
+        with self.lock:
+            return {host: round(state['until'] - now, 1) for host, state in self.hosts.items()
+                    if state['until'] > now}
@@ -0,0 +1,173 @@
+import heapq
+import itertools
+import re
+import time
+from threading import Condition, Lock
+
+PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+DEFAULT_WEIGHTS = {'high': 4, 'normal': 2, 'low': 1}
+THROTTLE_SLICE = 0.25  # longest sleep between stop checks while rate limited
+
+
+def parse_rate(text):
+    # '500K', '2.5M', '1G' or a plain number of bytes per second
+    if text in (None, '', '0'):
+        return None
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMG]?)i?B?\s*', str(text), re.IGNORECASE)
+    if not match:
+        raise ValueError(f'Invalid rate: {text}')
+    scale = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}[match.group(2).upper()]
+    return float(match.group(1)) * scale
+
+
+class PriorityJobQueue:
+    # Drop-in for queue.Queue where lower priority numbers come out first and
+    # equal priorities stay FIFO
+
+    def __init__(self):
+        self.heap = []
+        self.counter = itertools.count()
+        self.condition = Condition()
+        self.unfinished = 0
+
+    def put(self, item, priority='normal'):
+        rank = PRIORITIES.get(priority, priority) if item is not None else -1
+        with self.condition:
+            heapq.heappush(self.heap, (rank, next(self.counter), item))
+            self.unfinished += 1
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.heap, timeout=timeout):
+                return None
+            return heapq.heappop(self.heap)[2]
+
+    def task_done(self):
+        with self.condition:
+            self.unfinished -= 1
+
+    def qsize(self):
+        with self.condition:
+            return len(self.heap)
+
+    def depth_by_priority(self):
+        names = {rank: name for name, rank in PRIORITIES.items()}
+        depth = dict.fromkeys(PRIORITIES, 0)
+        with self.condition:
+            for rank, _, item in self.heap:
+                if item is not None:
+                    name = names.get(rank, rank)
+                    depth[name] = depth.get(name, 0) + 1
+        return depth
+
+
+class TokenBucket:
+    # Byte budget refilled at rate bytes/s. consume() always succeeds and
+    # returns how long the caller should sleep to pay back any debt, so a
+    # large chunk is throttled after the fact rather than rejected.
+
+    def __init__(self, rate, burst=1.0):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = rate * burst
+        self.stamp = time.monotonic()
+        self.lock = Lock()
+
+    def set_rate(self, rate):
+        with self.lock:
+            self.refill()
+            self.rate = rate
+            self.tokens = min(self.tokens, rate * self.burst)
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.rate * self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def consume(self, nbytes):
+        with self.lock:
+            self.refill()
+            self.tokens -= nbytes
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class BandwidthScheduler:
+    # Global rate limit shared by every download worker. The limit is split
+    # between the priority classes that currently have transfers running, in
+    # proportion to their weights, so an idle class never strands bandwidth.
+
+    def __init__(self, rate=None, weights=None):
+        self.rate = rate
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+        self.buckets = {}
+        self.running = dict.fromkeys(self.weights, 0)
+        self.lock = Lock()
+        self.throttled_seconds = 0.0
+
+    def set_rate(self, rate):
+        with self.lock:
+            self.rate = rate
+            self.rebalance()
+
+    def set_weights(self, weights):
+        with self.lock:
+            self.weights.update(weights)
+            self.rebalance()
+
+    def start_transfer(self, priority):
+        with self.lock:
+            self.running[priority] = self.running.get(priority, 0) + 1
+            self.rebalance()
+
+    def end_transfer(self, priority):
+        with self.lock:
+            self.running[priority] = max(0, self.running.get(priority, 0) - 1)
+            self.rebalance()
+
+    def rebalance(self):
+        if not self.rate:
+            return
+        active = [name for name, count in self.running.items() if count]
+        total_weight = sum(self.weights.get(name, 1) for name in active) or 1
+        for name in active:
+            share = self.rate * self.weights.get(name, 1) / total_weight
+            bucket = self.buckets.get(name)
+            if bucket is None:
+                self.buckets[name] = TokenBucket(share)
+            else:
+                bucket.set_rate(share)
+
+    def throttle(self, priority, nbytes, check=None):
+        # Called from the progress hook with the bytes read since last call.
+        # The wait is slept in short slices with check() in between, so a
+        # pause or cancel (check raises) doesn't wait out a long delay.
+        if not self.rate or nbytes <= 0:
+            return
+        bucket = self.buckets.get(priority)
+        if bucket is None:
+            return
+        delay = bucket.consume(nbytes)
+        if delay > 0:
+            self.throttled_seconds += delay
+            deadline = time.monotonic() + delay
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                time.sleep(min(remaining, THROTTLE_SLICE))
+                if check is not None:
+                    check()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'rate': self.rate,
+                'weights': dict(self.weights),
+                'running': dict(self.running),
+                'class_rates': {name: bucket.rate for name, bucket in self.buckets.items()
+                                if self.running.get(name)},
+                'throttled_seconds': self.throttled_seconds,
+            }
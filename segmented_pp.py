@@ -0,0 +1,89 @@
+import os
+import time
+from threading import Lock
+
+from yt_dlp.postprocessor.common import PostProcessor
+from yt_dlp.utils import prepend_extension
+
+from segmented import MIN_SEGMENT_SIZE, RangeNotSupported, SegmentedDownloader
+
+# Kept apart from segmented.py because subclassing PostProcessor imports
+# yt_dlp; the engine imports this module only for jobs with segments > 1.
+
+
+class SegmentedPrefetchPP(PostProcessor):
+    # Runs before yt-dlp's own download step. Every selected format that is a
+    # plain HTTP(S) file of known size is fetched with SegmentedDownloader
+    # into the exact path yt-dlp would use, so yt-dlp finds it already there
+    # and goes straight to merging. DASH/HLS formats are left to yt-dlp, which
+    # parallelises their fragments via concurrent_fragment_downloads.
+
+    def __init__(self, downloader=None, segments=4, progress_hook=None):
+        super().__init__(downloader)
+        self.segments = segments
+        self.progress_hook = progress_hook
+        self.lock = Lock()
+
+    def run(self, info):
+        targets = []
+        temp_filename = self._downloader.prepare_filename(info, 'temp')
+        if info.get('requested_formats'):
+            merged_ext = info['ext']
+            base = os.path.splitext(temp_filename)[0]
+            if os.path.splitext(temp_filename)[1][1:] != merged_ext:
+                base = temp_filename
+            for f in info['requested_formats']:
+                name = prepend_extension(f"{base}.{f['ext']}", f"f{f['format_id']}", f['ext'])
+                targets.append((f, name))
+        else:
+            targets.append((info, temp_filename))
+
+        for f, name in targets:
+            size = f.get('filesize')
+            if f.get('protocol') not in ('http', 'https') or not size or size < 2 * MIN_SEGMENT_SIZE:
+                continue
+            if os.path.exists(name):
+                continue
+            os.makedirs(os.path.dirname(os.path.abspath(name)), exist_ok=True)
+            self.fetch(f, name, size)
+        return [], info
+
+    def fetch(self, f, name, size):
+        state = {'downloaded': 0, 'start': time.monotonic()}
+
+        def on_bytes(count):
+            if not self.progress_hook:
+                return
+            with self.lock:
+                state['downloaded'] += count
+                elapsed = time.monotonic() - state['start']
+                speed = state['downloaded'] / elapsed if elapsed > 0 else None
+                progress = {
+                    'status': 'downloading',
+                    'filename': name,
+                    'downloaded_bytes': state['downloaded'],
+                    'total_bytes': size,
+                    'speed': speed,
+                    'eta': (size - state['downloaded']) / speed if speed else None,
+                }
+            # Outside the lock: the hook may sleep for the rate limit, and
+            # the other segment threads shouldn't queue up behind it
+            self.progress_hook(progress)
+
+        downloader = SegmentedDownloader(self.segments, headers=f.get('http_headers'), on_bytes=on_bytes)
+        try:
+            downloader.download(f['url'], name, size)
+        except RangeNotSupported as e:
+            # yt-dlp downloads the format over one connection instead
+            self.report_warning(f'Segmented download unavailable: {str(e)}')
+            for leftover in (name + '.segpart', name + '.segpart.ranges'):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            return
+        if self.progress_hook:
+            self.progress_hook({
+                'status': 'finished',
+                'filename': name,
+                'downloaded_bytes': size,
+                'total_bytes': size,
+            })
@@ -0,0 +1,240 @@
+import ctypes
+import ctypes.util
+import errno
+import glob
+import os
+import shutil
+from threading import Condition, Lock
+
+from postprocess import PART_SUFFIX_RE
+from scheduler import parse_rate
+
+DEFAULT_MIN_FREE = 256 * 1024 ** 2  # never plan to fill a disk past this
+FALLOC_FL_KEEP_SIZE = 0x01
+# What yt-dlp and SegmentedDownloader keep next to a file while writing it
+PARTIAL_SUFFIXES = ('.part', '.ytdl', '.segpart', '.segpart.ranges', '.segpart.ranges.tmp')
+
+_fallocate = None
+_fallocate_loaded = False
+_fallocate_lock = Lock()
+
+
+class InsufficientSpace(OSError):
+    # A job that doesn't fit even with nothing else reserved: waiting for
+    # other jobs to release space won't help
+
+    def __init__(self, shortfall, path):
+        super().__init__(errno.ENOSPC, 'Insufficient disk space', path)
+        self.shortfall = shortfall
+
+
+def parse_size(text):
+    # Same suffixes as rate limits: '500M', '2G' or a plain number of bytes
+    return int(parse_rate(text) or 0)
+
+
+def load_fallocate():
+    # Linux fallocate(2) from libc, or None where it isn't available
+    global _fallocate, _fallocate_loaded
+    with _fallocate_lock:
+        if not _fallocate_loaded:
+            _fallocate_loaded = True
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+                function = getattr(libc, 'fallocate64', None) or libc.fallocate
+                function.argtypes = (ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64)
+                function.restype = ctypes.c_int
+                _fallocate = function
+            except (OSError, AttributeError):
+                _fallocate = None
+    return _fallocate
+
+
+def reserve_blocks(path, size):
+    # Allocates blocks for a file that is still being appended to without
+    # changing its length (FALLOC_FL_KEEP_SIZE), so the writer's appends and
+    # resume offsets are unaffected but a full disk is reported now rather
+    # than halfway through. Returns False where the platform or filesystem
+    # can't do it; raises OSError(ENOSPC) when the space isn't there.
+    fallocate = load_fallocate()
+    if fallocate is None:
+        return False
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        if fallocate(fd, FALLOC_FL_KEEP_SIZE, 0, size) == 0:
+            return True
+        code = ctypes.get_errno()
+    finally:
+        os.close(fd)
+    if code in (errno.ENOSPC, errno.EDQUOT):
+        # A failed call can leave part of the range allocated past EOF;
+        # truncating to the current length hands it back
+        os.truncate(path, os.path.getsize(path))
+        raise OSError(code, os.strerror(code), path)
+    return False  # EOPNOTSUPP and friends: just write without it
+
+
+def partial_files(path):
+    # Leftovers of an unfinished download of path. A stream of a split
+    # download ('name.f137.mp4') is only an input to the merge, so it goes
+    # too; a plain file of that name may be an earlier, complete download.
+    paths = [path + suffix for suffix in PARTIAL_SUFFIXES]
+    paths += glob.glob(glob.escape(path) + '.part-Frag*')
+    if PART_SUFFIX_RE.search(path):
+        paths.append(path)
+    return paths
+
+
+def existing_parent(path):
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def move_file(path, folder):
+    # Renames into folder when both are on one filesystem; otherwise copies
+    # to a temporary name there first, so the final name only ever appears
+    # on a complete file
+    os.makedirs(folder, exist_ok=True)
+    target = os.path.join(folder, os.path.basename(path))
+    try:
+        os.replace(path, target)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        root, ext = os.path.splitext(target)
+        temp = f'{root}.temp{ext}'
+        shutil.copyfile(path, temp)
+        os.replace(temp, target)
+        os.remove(path)
+    return target
+
+
+class StorageManager:
+    # Where downloads are written and whether there is room for them.
+    #
+    # With staging_dir set, each job downloads (and keeps its partial files)
+    # in staging_dir/<job id>, typically on a fast local disk, and finished
+    # files are moved to the job's folder in one step. Before a job starts,
+    # admit() reserves its projected bytes on every filesystem it will write
+    # to; a job that doesn't fit next to the running ones is held back until
+    # space is released. Once a file's blocks are actually allocated
+    # (preallocate) its share of the reservation is dropped, since free space
+    # already reflects it.
+
+    def __init__(self, staging_dir=None, min_free=DEFAULT_MIN_FREE):
+        self.staging_dir = os.path.abspath(staging_dir) if staging_dir else None
+        self.min_free = min_free
+        self.lock = Lock()
+        self.changed = Condition(self.lock)
+        self.reservations = {}  # job id -> {device: bytes}
+        self.preallocated = {}  # job id -> set of paths
+        self.deferred = 0  # admissions refused for lack of space
+
+    def job_folder(self, job_id, folder):
+        # Where the job's files are written while it runs
+        if self.staging_dir is None:
+            return folder
+        return os.path.join(self.staging_dir, str(job_id))
+
+    def requirements(self, job_id, folder, size, merge=False):
+        # Path -> bytes the job will occupy there at its peak. A merge needs
+        # the parts and the merged file at once; merges write straight into
+        # the final folder.
+        work = self.job_folder(job_id, folder)
+        if work == folder:
+            return {folder: size * (2 if merge else 1)}
+        return {work: size, folder: size}
+
+    def admit(self, job_id, folder, size, merge=False):
+        # Reserves space for the job; returns 0 if it was admitted, else the
+        # bytes still missing on the fullest filesystem. Raises
+        # InsufficientSpace if no other job holds a reservation.
+        needs = {}
+        for path, amount in self.requirements(job_id, folder, size or 0, merge).items():
+            existing = existing_parent(path)
+            device = os.stat(existing).st_dev
+            known, total = needs.get(device, (existing, 0))
+            needs[device] = (known, total + amount)
+
+        with self.lock:
+            shortfall = 0
+            fullest = None
+            for device, (path, amount) in needs.items():
+                reserved = sum(r.get(device, 0) for other, r in self.reservations.items() if other != job_id)
+                available = shutil.disk_usage(path).free - reserved - self.min_free
+                if amount - available > shortfall:
+                    shortfall, fullest = amount - available, path
+            if shortfall > 0:
+                if not any(other != job_id for other in self.reservations):
+                    raise InsufficientSpace(shortfall, fullest)
+                self.deferred += 1
+                return shortfall
+            self.reservations[job_id] = {device: amount for device, (_, amount) in needs.items()}
+            return 0
+
+    def preallocate(self, job_id, path, size):
+        # Called once the writer has created path
+        with self.lock:
+            done = self.preallocated.setdefault(job_id, set())
+            if path in done:
+                return
+            done.add(path)
+        if not reserve_blocks(path, size):
+            return
+        device = os.stat(path).st_dev
+        with self.lock:
+            reservation = self.reservations.get(job_id)
+            if reservation and device in reservation:
+                reservation[device] = max(0, reservation[device] - size)
+
+    def release(self, job_id):
+        with self.lock:
+            self.preallocated.pop(job_id, None)
+            if self.reservations.pop(job_id, None) is not None:
+                self.changed.notify_all()
+
+    def discard(self, job_id, folder, files=()):
+        # Partial files of a cancelled job: its whole staging folder, or
+        # without staging the leftovers of each file it was writing
+        self.release(job_id)
+        if self.staging_dir is not None:
+            shutil.rmtree(self.job_folder(job_id, folder), ignore_errors=True)
+            return
+        for path in files:
+            for leftover in partial_files(path):
+                try:
+                    os.remove(leftover)
+                except FileNotFoundError:
+                    pass
+
+    def wait(self, timeout):
+        # Until some job releases its space (or timeout, for space freed by
+        # something other than us)
+        with self.lock:
+            self.changed.wait(timeout)
+
+    def commit(self, job_id, path, folder):
+        # Final path of a finished file: moved out of staging if it is there
+        if self.staging_dir is None or not path:
+            return path
+        work = self.job_folder(job_id, folder)
+        if os.path.dirname(os.path.abspath(path)) == work:
+            path = move_file(path, folder)
+        try:
+            os.rmdir(work)
+        except OSError:
+            pass  # not empty (leftovers of a failed part) or already gone
+        return path
+
+    def stats(self):
+        with self.lock:
+            return {
+                'staging_dir': self.staging_dir,
+                'reserved_bytes': sum(sum(r.values()) for r in self.reservations.values()),
+                'deferred': self.deferred,
+            }
@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+import pytest
+
+from download_daemon import DownloadDaemon, HTTPError, job_request
+from download_engine import DownloadEngine
+
+URL = 'https://www.youtube.com/watch?v=AAAAAAAAAAA'
+
+
+def read(raw):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        return await DownloadDaemon.read_request(None, reader)
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('length', ['abc', '-5', '1.5'])
+def test_bad_content_length_is_a_400(length):
+    with pytest.raises(HTTPError) as error:
+        read(f'POST /jobs HTTP/1.1\r\nContent-Length: {length}\r\n\r\n{{}}'.encode())
+    assert error.value.status == 400
+
+
+def test_json_body_is_read():
+    method, path, _, _, body = read(b'POST /jobs/ HTTP/1.1\r\nContent-Length: 2\r\n\r\n{}')
+    assert (method, path, body) == ('POST', '/jobs', {})
+
+
+@pytest.mark.parametrize('segments', [True, False, 0, 17, '4', 2.0])
+def test_segments_must_be_an_integer_in_range(segments):
+    with pytest.raises(HTTPError) as error:
+        job_request({'url': URL, 'segments': segments})
+    assert error.value.status == 400
+
+
+def test_valid_request():
+    urls, options, mode = job_request({'url': URL, 'segments': 4, 'video_quality': 'Audio Only'})
+    assert urls == [URL] and options['segments'] == 4 and mode == 'Download All'
+
+
+def finish(engine, job_id):
+    engine.update_job(engine.jobs[job_id], 'finished', state='finished', message='done')
+
+
+def test_finished_jobs_are_evicted_after_the_retention_window(tmp_path):
+    engine = DownloadEngine(download_folder=str(tmp_path), retention=0)
+    events = []
+    engine.add_listener(lambda event, job: events.append((event, job['id'])))
+    kept, done = engine.submit(URL), engine.submit(URL)
+    finish(engine, done)
+    assert ('evicted', done) in events
+    assert [job['id'] for job in engine.status()] == [kept]
+    assert engine.progress.get(done) is None and engine.progress.finished_jobs == 1
+
+
+def test_job_list_is_updated_per_job(tmp_path):
+    engine = DownloadEngine(download_folder=str(tmp_path), retention=None)
+    daemon = DownloadDaemon(engine)
+    first, second = engine.submit(URL), engine.submit(URL)
+    daemon.dirty.update((first, second))
+    daemon.update_jobs()
+    assert [job['id'] for job in json.loads(daemon.job_list())] == [first, second]
+
+    finish(engine, second)
+    listed = daemon.job_list()
+    assert daemon.job_list() is listed  # nothing changed, nothing rebuilt
+    daemon.dirty.add(second)
+    daemon.update_jobs()
+    assert [job['id'] for job in json.loads(daemon.job_list({'finished'}))] == [second]
+    assert [job['id'] for job in json.loads(daemon.job_list({'queued'}))] == [first]
+
+    engine.retention = 0
+    engine.finished.append((0.0, second))
+    engine.evict_finished()
+    daemon.dirty.add(second)
+    daemon.update_jobs()
+    assert [job['id'] for job in json.loads(daemon.job_list())] == [first]
@@ -0,0 +1,94 @@
+import sqlite3
+import time
+
+import pytest
+
+from archive import DownloadArchive, format_key
+from download_engine import DownloadEngine
+from journal import JobJournal
+
+URL = 'https://www.youtube.com/watch?v=AAAAAAAAAAA'
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'jobs.sqlite3')
+
+
+def engine(tmp_path, journal):
+    # Never started: submitted jobs just sit in the resolve queue
+    return DownloadEngine(download_folder=str(tmp_path), journal=journal)
+
+
+def test_processes_sharing_a_journal_get_distinct_ids(tmp_path, path):
+    first, second = JobJournal(path), JobJournal(path)
+    ids = [engine(tmp_path, first).submit(URL), engine(tmp_path, second).submit(URL)]
+    assert len(set(ids)) == 2
+    rows = sqlite3.connect(path).execute('SELECT id FROM jobs ORDER BY id').fetchall()
+    assert [row[0] for row in rows] == sorted(ids)
+    first.close()
+    second.close()
+
+
+def test_running_owners_keep_their_jobs(tmp_path, path):
+    running = JobJournal(path)
+    job_id = engine(tmp_path, running).submit(URL)
+    other = JobJournal(path)
+    assert engine(tmp_path, other).restore() == []
+
+    running.close()
+    assert engine(tmp_path, other).restore() == [job_id]
+    # Claimed once: a third instance doesn't take them too
+    assert JobJournal(path).claim_pending() == []
+    other.close()
+
+
+def test_unresponsive_owner_loses_its_jobs(tmp_path, path):
+    crashed = JobJournal(path)
+    crashed.stopped.set()  # no more heartbeats, as if the process had died
+    job_id = engine(tmp_path, crashed).submit(URL)
+    time.sleep(0.1)
+    assert [row['id'] for row in JobJournal(path, lease_seconds=0.05).claim_pending()] == [job_id]
+
+
+def test_old_journal_is_upgraded(path):
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE jobs (id INTEGER PRIMARY KEY, url TEXT NOT NULL, video_quality TEXT,'
+                 ' audio_quality TEXT, filename_format TEXT, download_folder TEXT, priority TEXT,'
+                 ' segments INTEGER, state TEXT NOT NULL, bytes_done INTEGER DEFAULT 0, error TEXT,'
+                 ' created REAL NOT NULL, updated REAL NOT NULL)')
+    conn.execute("INSERT INTO jobs (id, url, state, created, updated) VALUES (7, ?, 'queued', 0, 0)", (URL,))
+    conn.commit()
+    conn.close()
+
+    journal = JobJournal(path)
+    assert [row['id'] for row in journal.claim_pending()] == [7]
+    job = {'id': None, 'url': URL, 'video_quality': '1080p', 'audio_quality': '192kbps',
+           'filename_format': 'Title Only', 'download_folder': '.', 'priority': 'normal',
+           'segments': 1, 'state': 'queued'}
+    assert journal.record(job) == 8
+    journal.close()
+
+
+def test_restored_job_that_is_archived_is_marked_done(tmp_path, path):
+    old = JobJournal(path)
+    job_id = engine(tmp_path, old).submit(URL)
+    old.close()
+
+    archive = DownloadArchive(str(tmp_path / 'archive.sqlite3'))
+    archive.add('youtube', 'AAAAAAAAAAA', format_key('1080p', '192kbps'))
+    restorer = DownloadEngine(download_folder=str(tmp_path), journal=JobJournal(path), archive=archive)
+    assert restorer.restore() == []
+    restorer.stop()
+    state = sqlite3.connect(path).execute('SELECT state FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    assert state == ('skipped',)
+
+
+def test_stop_closes_the_journal(tmp_path, path):
+    journal = JobJournal(path)
+    stopped = engine(tmp_path, journal)
+    stopped.submit(URL)
+    stopped.stop()
+    assert not journal.heartbeat_thread.is_alive()
+    with pytest.raises(sqlite3.ProgrammingError):
+        journal.conn.execute('SELECT 1')
@@ -0,0 +1,39 @@
+import time
+from threading import Thread
+
+from leased_queue import PLAYLIST, VIDEO, ClusterWorker, LeasedJobQueue
+
+
+class SlowListingEngine:
+    # Just enough of DownloadEngine for ClusterWorker to expand a playlist
+
+    def __init__(self, entries, delay):
+        self.entries = entries
+        self.delay = delay
+
+    def iter_playlist_entries(self, url):
+        for video_id in self.entries:
+            time.sleep(self.delay)
+            yield {'id': video_id, 'url': f'https://www.youtube.com/watch?v={video_id}'}
+
+
+def test_playlist_lease_is_renewed_while_it_expands(tmp_path):
+    path = str(tmp_path / 'queue.sqlite3')
+    queue = LeasedJobQueue(path, lease_seconds=0.3, worker_id='a')
+    queue.put(PLAYLIST, 'https://www.youtube.com/@tester/videos', {})
+    worker = ClusterWorker(SlowListingEngine([f'{n:011d}' for n in range(4)], delay=0.25), queue)
+    heartbeat = Thread(target=worker.heartbeat, daemon=True)
+    heartbeat.start()
+
+    expanding = Thread(target=worker.run, args=(queue.claim()[0],))
+    expanding.start()
+    time.sleep(0.7)  # well past the lease
+    other = LeasedJobQueue(path, lease_seconds=0.3, worker_id='b')
+    assert all(item['kind'] == VIDEO for item in other.claim(10))
+    expanding.join()
+    worker.stopped.set()
+    heartbeat.join()
+
+    assert worker.recorded == 1 and worker.lost == 0
+    other.close()
+    queue.close()
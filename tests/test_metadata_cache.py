@@ -0,0 +1,30 @@
+import sqlite3
+
+from metadata_cache import MetadataCache
+
+
+def accessed(path, key):
+    return sqlite3.connect(path).execute('SELECT accessed FROM metadata WHERE key = ?', (key,)).fetchone()[0]
+
+
+def test_hits_write_their_access_time_with_the_next_put(tmp_path):
+    path = str(tmp_path / 'metadata.sqlite3')
+    cache = MetadataCache(path, max_entries=2)
+    cache.put('a', {'id': 'a'})
+    cache.put('b', {'id': 'b'})
+    stored = accessed(path, 'a')
+    assert cache.get('a') == {'id': 'a'}
+    assert accessed(path, 'a') == stored  # no write per hit
+
+    cache.put('c', {'id': 'c'})  # evicts b, the least recently used
+    assert cache.get('b') is None and cache.get('a') == {'id': 'a'}
+    cache.close()
+    assert accessed(path, 'a') > stored
+
+
+def test_values_json_cant_store_are_left_out(tmp_path):
+    cache = MetadataCache(str(tmp_path / 'metadata.sqlite3'))
+    cache.put('a', {'id': 'a', 'entries': iter([]), 'formats': [{'id': 1, 'pp': object()}, object()],
+                    'tags': ('x', 'y')})
+    assert cache.get('a') == {'id': 'a', 'formats': [{'id': 1}], 'tags': ['x', 'y']}
+    cache.close()
@@ -0,0 +1,81 @@
+import sqlite3
+
+import pytest
+
+from archive import DownloadArchive
+from download_engine import FAILED, DownloadEngine
+
+PLAYLIST = 'https://www.youtube.com/playlist?list=PLtest'
+CHANNEL = 'https://www.youtube.com/@tester/videos'
+
+
+def entry(letter):
+    video_id = letter * 11
+    return {'id': video_id, 'url': f'https://www.youtube.com/watch?v={video_id}'}
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # Never started: submitted jobs just sit in the resolve queue
+    engine = DownloadEngine(download_folder=str(tmp_path), archive=DownloadArchive(':memory:'))
+    yield engine
+    engine.archive.close()
+
+
+def sync(engine, url, letters):
+    engine.iter_playlist_entries = lambda _: iter([entry(letter) for letter in letters])
+    return [engine.jobs[job_id] for job_id in engine.submit_playlist(url)]
+
+
+def finish(engine, jobs):
+    for job in jobs:
+        video_id = job['url'].rsplit('=', 1)[1]
+        engine.finish_job(job, ('youtube', video_id), None)
+
+
+def letters(jobs):
+    return [job['url'][-1] for job in jobs]
+
+
+def test_playlist_entry_added_after_a_deletion_is_downloaded(engine):
+    finish(engine, sync(engine, PLAYLIST, 'ABCDE'))
+    assert letters(sync(engine, PLAYLIST, 'ACDEF')) == ['F']
+
+
+def test_failed_playlist_entry_is_offered_again(engine):
+    jobs = sync(engine, PLAYLIST, 'ABC')
+    finish(engine, [jobs[0], jobs[2]])
+    engine.update_job(jobs[1], 'error', state=FAILED, error='boom')
+    assert letters(sync(engine, PLAYLIST, 'ABC')) == ['B']
+
+
+def test_channel_sync_stops_at_the_last_completed_head(engine):
+    finish(engine, sync(engine, CHANNEL, 'CBA'))
+    # Walking past the cursor would hit the None and raise
+    engine.iter_playlist_entries = lambda _: iter([entry('E'), entry('D'), entry('C'), None])
+    assert letters([engine.jobs[job_id] for job_id in engine.submit_playlist(CHANNEL)]) == ['E', 'D']
+
+
+def test_channel_cursor_waits_for_every_job(engine):
+    jobs = sync(engine, CHANNEL, 'DCBA')
+    finish(engine, jobs[:2])
+    engine.update_job(jobs[2], 'error', state=FAILED, error='boom')
+    finish(engine, jobs[3:])
+    # The cursor didn't move, so the walk goes back down to the failed entry
+    assert letters(sync(engine, CHANNEL, 'EDCBA')) == ['E', 'B']
+
+
+def test_cursor_table_from_before_is_migrated(tmp_path):
+    path = str(tmp_path / 'archive.sqlite3')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE playlist_cursors (playlist TEXT PRIMARY KEY, head_id TEXT,'
+                 ' entry_count INTEGER NOT NULL, synced REAL NOT NULL)')
+    conn.execute("INSERT INTO playlist_cursors VALUES ('channel', 'CCCCCCCCCCC', 3, 0)")
+    conn.commit()
+    conn.close()
+
+    archive = DownloadArchive(path)
+    assert archive.get_cursor('channel') == 'CCCCCCCCCCC'
+    archive.set_cursor('channel', 'DDDDDDDDDDD')
+    assert archive.get_cursor('channel') == 'DDDDDDDDDDD'
+    archive.close()
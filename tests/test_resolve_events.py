@@ -0,0 +1,34 @@
+import time
+from threading import Thread
+
+from download_engine import DownloadEngine
+
+URL = 'https://www.youtube.com/watch?v=AAAAAAAAAAA'
+INFO = {'id': 'AAAAAAAAAAA', 'extractor_key': 'Youtube', 'title': 'Title', 'formats': [
+    {'format_id': '18', 'url': 'x', 'vcodec': 'avc1', 'acodec': 'mp4a', 'height': 360, 'ext': 'mp4'},
+]}
+
+
+def test_resolved_comes_after_queued_and_the_download_queue(tmp_path):
+    # Never started: only one resolver thread runs, and nothing downloads
+    engine = DownloadEngine(download_folder=str(tmp_path))
+    engine.fetch_video_info = lambda url: INFO
+    events = []
+    engine.add_listener(lambda event, job: events.append(
+        (event, job['id'], engine.download_queue.qsize(), 'info' in job)))
+
+    first = engine.submit(URL)
+    second = engine.submit(URL + '&t=30')  # collapsed into the first resolution
+    resolver = Thread(target=engine.resolve_worker)
+    resolver.start()
+    deadline = time.monotonic() + 5
+    while len(events) < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    engine.resolve_queue.put(None)
+    resolver.join()
+
+    for job_id in (first, second):
+        names = [event for event, seen_id, _, _ in events if seen_id == job_id]
+        assert names == ['queued', 'resolved']
+    resolved = [(queued, has_info) for event, _, queued, has_info in events if event == 'resolved']
+    assert resolved == [(1, True), (2, True)]
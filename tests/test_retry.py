@@ -0,0 +1,36 @@
+import time
+
+from download_engine import DownloadEngine
+from retry import THROTTLED, TRANSIENT, CircuitBreaker
+
+
+def open_circuit(breaker, host):
+    breaker.failure(host, THROTTLED)
+    breaker.hosts[host]['until'] = time.monotonic() - 1  # cooldown over
+
+
+def test_half_open_circuit_lets_one_probe_through():
+    breaker = CircuitBreaker(probe_window=30)
+    open_circuit(breaker, 'youtube.com')
+    assert breaker.check('youtube.com') == (0.0, True)
+    wait, probe = breaker.check('youtube.com')
+    assert wait > 0 and not probe
+
+
+def test_transient_failures_trip_after_threshold():
+    breaker = CircuitBreaker(threshold=3)
+    assert breaker.failure('example.com', TRANSIENT) == 0
+    assert breaker.failure('example.com', TRANSIENT) == 0
+    assert breaker.failure('example.com', TRANSIENT) > 0
+
+
+def test_resolved_probe_is_not_held_at_the_download_stage(tmp_path):
+    engine = DownloadEngine(download_folder=str(tmp_path))
+    job = engine.jobs[engine.submit('https://www.youtube.com/watch?v=AAAAAAAAAAA')]
+    open_circuit(engine.breaker, job['host'])
+    assert engine.breaker.check(job['host'])[1]
+    job['probe'] = True
+    assert not engine.hold_for_host(job)
+    # Any other job for the host waits out the probe window
+    del job['probe']
+    assert engine.hold_for_host(job)
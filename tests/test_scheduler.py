@@ -0,0 +1,35 @@
+import time
+
+import pytest
+
+from scheduler import THROTTLE_SLICE, BandwidthScheduler
+
+
+class Stopped(Exception):
+    pass
+
+
+def test_throttle_checks_for_a_stop_between_slices():
+    scheduler = BandwidthScheduler(rate=1000)
+    scheduler.start_transfer('normal')
+    checks = []
+
+    def check():
+        checks.append(time.monotonic())
+        if len(checks) == 2:
+            raise Stopped()
+
+    started = time.monotonic()
+    with pytest.raises(Stopped):
+        scheduler.throttle('normal', 60_000, check)  # about a minute over the limit
+    assert time.monotonic() - started < 3 * THROTTLE_SLICE
+
+
+def test_throttle_still_sleeps_out_the_delay():
+    scheduler = BandwidthScheduler(rate=10_000)
+    scheduler.start_transfer('normal')
+    checks = []
+    started = time.monotonic()
+    scheduler.throttle('normal', 15_000, lambda: checks.append(1))  # one second of burst + 0.5 s
+    assert time.monotonic() - started >= 0.45
+    assert len(checks) >= 2
@@ -0,0 +1,62 @@
+import pytest
+
+from download_engine import CANCELLED, DOWNLOADING, FAILED, DownloadEngine
+from storage import InsufficientSpace, StorageManager
+
+TOO_BIG = 10 ** 18
+
+
+def test_job_that_fits_is_admitted(tmp_path):
+    storage = StorageManager(min_free=0)
+    assert storage.admit(1, str(tmp_path), 1024) == 0
+    assert storage.stats()['reserved_bytes'] == 1024
+
+
+def test_job_waits_while_others_hold_space(tmp_path):
+    storage = StorageManager(min_free=0)
+    storage.admit(1, str(tmp_path), 1024)
+    assert storage.admit(2, str(tmp_path), TOO_BIG) > 0
+    assert storage.stats()['deferred'] == 1
+
+
+def test_job_that_can_never_fit_raises(tmp_path):
+    storage = StorageManager(min_free=0)
+    with pytest.raises(InsufficientSpace) as error:
+        storage.admit(1, str(tmp_path), TOO_BIG)
+    assert error.value.shortfall > 0
+
+
+def test_engine_fails_a_job_too_big_for_the_disk(tmp_path):
+    engine = DownloadEngine(download_folder=str(tmp_path))
+    job = engine.jobs[engine.submit('https://www.youtube.com/watch?v=AAAAAAAAAAA')]
+    job['plan'] = {'estimated_bytes': TOO_BIG, 'needs_merge': False, 'remux': None}
+    assert not engine.admit(job)
+    assert job['state'] == FAILED
+    assert job['error'].startswith('Insufficient disk space')
+    assert engine.wait(timeout=1)
+
+
+def touch(folder, *names):
+    for name in names:
+        (folder / name).write_text('x')
+
+
+def test_discard_removes_partials_but_not_finished_files(tmp_path):
+    touch(tmp_path, 'v.mp4', 'v.mp4.part', 'v.mp4.part-Frag3', 'v.mp4.ytdl',
+          'v.f137.mp4', 'v.f140.m4a.part', 'v.f140.m4a.segpart', 'other.mp4.part')
+    storage = StorageManager()
+    storage.discard(1, str(tmp_path), [str(tmp_path / name) for name in ('v.mp4', 'v.f137.mp4', 'v.f140.m4a')])
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['other.mp4.part', 'v.mp4']
+
+
+def test_cancelled_download_leaves_no_partial_files(tmp_path):
+    engine = DownloadEngine(download_folder=str(tmp_path))
+    job = engine.jobs[engine.submit('https://www.youtube.com/watch?v=AAAAAAAAAAA')]
+    job['state'] = DOWNLOADING
+    touch(tmp_path, 'v.mp4.part')
+    engine.progress_hook(job, {'status': 'downloading', 'filename': str(tmp_path / 'v.mp4'),
+                               'tmpfilename': str(tmp_path / 'v.mp4.part'), 'downloaded_bytes': 1})
+    assert engine.cancel(job['id'])
+    engine.interrupted(job)
+    assert job['state'] == CANCELLED
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,31 @@
+import thumbnail_cache
+from download_engine import summarize_info
+from thumbnail_cache import ThumbnailCache, image_extension
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\0' * 32
+
+
+def test_undecodable_thumbnail_keeps_its_own_type(tmp_path, monkeypatch):
+    source = tmp_path / 'hq.jpg'
+    source.write_bytes(PNG)  # served with the wrong extension
+    monkeypatch.setattr(thumbnail_cache, 'Image', None)
+    cache = ThumbnailCache(folder=str(tmp_path / 'cache'))
+
+    path = cache.get('AAAAAAAAAAA', source.as_uri())
+    assert path.endswith('AAAAAAAAAAA.png')
+    assert cache.get('AAAAAAAAAAA', source.as_uri()) == path
+    assert cache.stats()['hits'] == 1
+    # Found again after a restart
+    assert ThumbnailCache(folder=str(tmp_path / 'cache')).get('AAAAAAAAAAA', source.as_uri()) == path
+
+
+def test_unknown_bytes_fall_back_to_the_url_extension():
+    assert image_extension(b'????', 'https://i.ytimg.com/vi/x/hq.webp?sqp=1') == '.webp'
+    assert image_extension(b'????', 'https://example.com/thumb') == '.jpg'
+
+
+def test_preview_uses_the_smallest_thumbnail_that_fills_it():
+    info = {'thumbnail': 'max', 'thumbnails': [
+        {'url': 'small', 'width': 120}, {'url': 'medium', 'width': 320}, {'url': 'max', 'width': 1280},
+    ]}
+    assert summarize_info(info)['thumbnail'] == 'medium'
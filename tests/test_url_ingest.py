@@ -0,0 +1,59 @@
+from url_ingest import CHANNEL, PLAYLIST, VIDEO, contains_youtube_url, extract_links, extract_urls, parse_url
+
+A = 'AAAAAAAAAAA'
+B = 'BBBBBBBBBBB'
+
+
+def watch(video_id):
+    return f'https://www.youtube.com/watch?v={video_id}'
+
+
+def test_link_forms_collapse_to_one_canonical_url():
+    text = f'youtu.be/{A} https://m.youtube.com/watch?t=30&v={A} youtube.com/shorts/{A}'
+    assert extract_urls(text) == [watch(A)]
+
+
+def test_comma_separated_watch_urls():
+    assert extract_urls(f'{watch(A)},{watch(B)}') == [watch(A), watch(B)]
+    assert extract_urls(f'{watch(A)}&t=1, https://youtu.be/{B}') == [watch(A), watch(B)]
+
+
+def test_comma_separated_playlists():
+    text = 'https://www.youtube.com/playlist?list=PL1,https://www.youtube.com/playlist?list=PL2'
+    assert [parse_url(url) for url in extract_urls(text)] == [(PLAYLIST, 'PL1'), (PLAYLIST, 'PL2')]
+
+
+def test_host_must_be_youtube():
+    assert extract_urls(f'https://notyoutube.com/watch?v={A}') == []
+    assert extract_urls(f'https://fakeyoutu.be/{A}') == []
+    assert not contains_youtube_url(f'evilyoutube.com/shorts/{A}')
+    assert extract_urls(f'"https://youtu.be/{A}"') == [watch(A)]
+
+
+def test_video_ids_must_be_eleven_characters():
+    assert extract_urls(f'https://youtu.be/{A}X') == []
+    assert extract_urls(f'{watch(A)}X') == []
+    assert extract_urls(f'https://www.youtube.com/shorts/{A}X') == []
+    assert extract_urls('https://youtu.be/AAAAAAAAAA') == []
+    assert extract_urls(f'https://youtu.be/{A}?t=30') == [watch(A)]
+
+
+def test_watch_without_video_id_is_ignored():
+    assert parse_url('https://www.youtube.com/watch?t=30') is None
+
+
+def test_channels():
+    assert parse_url('https://www.youtube.com/@some.channel/videos') == (CHANNEL, '@some.channel')
+    assert parse_url('https://youtube.com/channel/UC123') == (CHANNEL, 'channel/UC123')
+    assert parse_url(f'https://youtu.be/{A}') == (VIDEO, A)
+
+
+def test_channel_handle_drops_trailing_punctuation():
+    for text in ('see youtube.com/@some.channel.', '(youtube.com/@some.channel)',
+                 'youtube.com/@some.channel, next', 'youtube.com/@some.channel;'):
+        assert parse_url(text) == (CHANNEL, '@some.channel')
+
+
+def test_other_links_pass_through():
+    text = f'https://vimeo.com/123, youtu.be/{A}\nhttps://vimeo.com/123 not-a-link {watch(A)}'
+    assert extract_links(text) == ['https://vimeo.com/123', watch(A)]
@@ -0,0 +1,134 @@
+import io
+import os
+import re
+import urllib.request
+from collections import OrderedDict
+from threading import Lock
+
+from metadata_cache import CACHE_DIR
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it thumbnails are cached as served
+    Image = None
+
+SAFE_ID_RE = re.compile(r'[^0-9A-Za-z_-]')
+IMAGE_EXTENSIONS = ('.jpg', '.webp', '.png')
+
+
+def image_extension(data, url=''):
+    # Kivy picks its image loader by extension, so name files after their
+    # contents; the URL decides when the bytes aren't recognised
+    if data[:3] == b'\xff\xd8\xff':
+        return '.jpg'
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return '.png'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return '.webp'
+    url_ext = os.path.splitext(url.split('?')[0])[1].lower()
+    return url_ext if url_ext in IMAGE_EXTENSIONS else '.jpg'
+
+
+class ThumbnailCache:
+    # Thumbnails stored on disk as small JPEGs sized for the preview widget
+    # (as served if Pillow is missing; the engine already asks for the
+    # smallest variant that fills the preview), one file per video ID. Total size is
+    # kept under max_bytes by evicting the least recently shown files;
+    # recency survives restarts through the files' modification times.
+
+    def __init__(self, folder=None, max_bytes=50 * 1024 * 1024, size=(320, 180)):
+        self.folder = folder or os.path.join(CACHE_DIR, 'thumbnails')
+        self.max_bytes = max_bytes
+        self.size = size
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.folder, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            if name.endswith(IMAGE_EXTENSIONS) and os.path.isfile(path):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name, stat.st_size))
+        # Oldest first, so the OrderedDict front is the eviction candidate
+        self.entries = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self.total_bytes = sum(self.entries.values())
+
+    def cached_name(self, video_id):
+        # A video's file is a JPEG when Pillow re-encoded it, otherwise it
+        # keeps the type it was served as
+        base = SAFE_ID_RE.sub('_', str(video_id))
+        for ext in IMAGE_EXTENSIONS:
+            if base + ext in self.entries:
+                return base + ext
+        return None
+
+    def get(self, video_id, url):
+        # Local path of the thumbnail, fetching and downscaling it on a miss
+        if not video_id or not url:
+            return None
+        with self.lock:
+            name = self.cached_name(video_id)
+            path = os.path.join(self.folder, name) if name else None
+            if path and os.path.exists(path):
+                self.entries.move_to_end(name)
+                self.hits += 1
+            else:
+                self.misses += 1
+                path = None
+        if path:
+            os.utime(path)
+            return path
+
+        try:
+            with urllib.request.urlopen(url, timeout=15) as response:
+                data, ext = self.downscale(response.read(), url)
+        except Exception as e:
+            print(f"Thumbnail error: {str(e)}")
+            return None
+
+        name = SAFE_ID_RE.sub('_', str(video_id)) + ext
+        path = os.path.join(self.folder, name)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            self.total_bytes += len(data) - self.entries.pop(name, 0)
+            self.entries[name] = len(data)
+            self.evict()
+        return path
+
+    def downscale(self, data, url=''):
+        # (bytes, extension): a small JPEG, or the original bytes as served
+        # when Pillow is missing or can't decode them
+        if Image is not None:
+            try:
+                image = Image.open(io.BytesIO(data))
+                image.thumbnail(self.size)
+                out = io.BytesIO()
+                image.convert('RGB').save(out, 'JPEG', quality=85)
+                return out.getvalue(), '.jpg'
+            except Exception:
+                pass
+        return data, image_extension(data, url)
+
+    def evict(self):
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            name, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+            }
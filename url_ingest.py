@@ -0,0 +1,117 @@
+import hashlib
+import re
+
+# One pass over arbitrary text finds every YouTube video, shorts, playlist
+# and channel link; the named group that matched tells us which kind it is.
+# Matching starts at the literal 'youtu' (scheme and subdomain don't affect
+# the result), which lets the regex engine skip ahead between candidates;
+# match_kind() then rejects hosts that merely end in it. Queries stop at a
+# comma, since comma-separated links are an accepted input format, and a
+# handle never ends in the full stop of the sentence around it.
+URL_RE = re.compile(r'''
+    youtu
+    (?:
+        \.be/(?P<short>[0-9A-Za-z_-]{11})(?![0-9A-Za-z_-])
+      | be\.com/
+        (?:
+            watch\?(?P<query>[^\s"'<>,]*)
+          | (?:shorts|embed|live|v)/(?P<path_id>[0-9A-Za-z_-]{11})(?![0-9A-Za-z_-])
+          | playlist\?(?P<playlist_query>[^\s"'<>,]*)
+          | (?P<channel>@[0-9A-Za-z_.-]*[0-9A-Za-z_-]|(?:channel|c|user)/[0-9A-Za-z_-]+)
+        )
+    )
+''', re.VERBOSE)
+VIDEO_PARAM_RE = re.compile(r'(?:^|[&;])v=([0-9A-Za-z_-]{11})(?![0-9A-Za-z_-])')
+# A character that can come before 'youtu' inside a longer host name
+HOST_CHAR_RE = re.compile(r'[0-9A-Za-z-]')
+LIST_PARAM_RE = re.compile(r'(?:^|[&;])list=([0-9A-Za-z_-]+)')
+SEPARATOR_RE = re.compile(r'[\s,]+')
+
+VIDEO = 'video'
+PLAYLIST = 'playlist'
+CHANNEL = 'channel'
+
+
+def match_kind(match):
+    # (kind, id) for one scanner match, or None for e.g. watch?t=30 with no
+    # v= or a host like notyoutube.com
+    start = match.start()
+    if start and HOST_CHAR_RE.match(match.string, start - 1):
+        return None
+    video_id = match.group('short') or match.group('path_id')
+    if video_id:
+        return VIDEO, video_id
+    if match.group('query') is not None:
+        found = VIDEO_PARAM_RE.search(match.group('query'))
+        return (VIDEO, found.group(1)) if found else None
+    if match.group('playlist_query') is not None:
+        found = LIST_PARAM_RE.search(match.group('playlist_query'))
+        return (PLAYLIST, found.group(1)) if found else None
+    return CHANNEL, match.group('channel')
+
+
+def canonical_url(kind, ident):
+    if kind == VIDEO:
+        return f'https://www.youtube.com/watch?v={ident}'
+    if kind == PLAYLIST:
+        return f'https://www.youtube.com/playlist?list={ident}'
+    return f'https://www.youtube.com/{ident}/videos'
+
+
+def parse_url(url):
+    # (kind, id) of the first YouTube link in url, or None
+    for match in URL_RE.finditer(url):
+        parsed = match_kind(match)
+        if parsed:
+            return parsed
+    return None
+
+
+def extract_urls(text):
+    # Canonical URLs of every distinct video/playlist/channel in text, in
+    # order of first appearance. youtu.be/X, watch?v=X&t=30 and shorts/X
+    # all collapse into one entry.
+    seen = set()
+    urls = []
+    for match in URL_RE.finditer(text):
+        parsed = match_kind(match)
+        if parsed and parsed not in seen:
+            seen.add(parsed)
+            urls.append(canonical_url(*parsed))
+    return urls
+
+
+def extract_links(text):
+    # extract_urls() for every comma or whitespace separated piece of text,
+    # plus pieces that are some other http(s) link, passed through as typed
+    # for yt-dlp's other extractors
+    seen = set()
+    urls = []
+    for piece in SEPARATOR_RE.split(text):
+        found = extract_urls(piece)
+        if not found and piece.startswith(('http://', 'https://')):
+            found = [piece]
+        for url in found:
+            if url not in seen:
+                seen.add(url)
+                urls.append(url)
+    return urls
+
+
+def contains_youtube_url(text):
+    return any(match_kind(match) for match in URL_RE.finditer(text or ''))
+
+
+class ClipboardWatcher:
+    # Remembers a digest of the last clipboard contents so the periodic
+    # check only scans text that actually changed
+
+    def __init__(self):
+        self.last_digest = None
+
+    def changed(self, text):
+        digest = hashlib.blake2b((text or '').encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        if digest == self.last_digest:
+            return False
+        self.last_digest = digest
+        return True
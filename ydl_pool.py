@@ -0,0 +1,116 @@
+from contextlib import contextmanager
+from threading import Lock
+
+
+class YoutubeDLPool:
+    # Keeps long-lived YoutubeDL instances so extractor setup, the cookie jar
+    # and keep-alive HTTP connections survive from one job to the next. Each
+    # worker borrows an instance for the length of a job; per-job options are
+    # applied on checkout and undone on return. Instances are closed and
+    # replaced after max_jobs uses or when a job raises. yt_dlp itself is
+    # only imported when the first instance is created (see warm).
+
+    def __init__(self, options=None, max_jobs=50):
+        self.options = dict(options or {})
+        self.max_jobs = max_jobs
+        self.idle = []
+        self.lock = Lock()
+        self.created = 0
+        self.recycled = 0
+
+    def create(self):
+        # Importing yt_dlp loads its whole extractor registry, which takes
+        # seconds on slow machines; nothing needs it before the first job
+        import yt_dlp
+        ydl = yt_dlp.YoutubeDL(dict(self.options))
+        with self.lock:
+            self.created += 1
+        return {
+            'ydl': ydl,
+            'jobs': 0,
+            'params': dict(ydl.params),
+            'format_selector': getattr(ydl, 'format_selector', None),
+            'pps': {when: list(pps) for when, pps in getattr(ydl, '_pps', {}).items()},
+        }
+
+    def warm(self):
+        # Create an idle instance ahead of the first job, typically from a
+        # background thread right after startup
+        with self.lock:
+            if self.idle:
+                return
+        entry = self.create()
+        with self.lock:
+            self.idle.append(entry)
+
+    @contextmanager
+    def acquire(self, overrides=None):
+        with self.lock:
+            entry = self.idle.pop() if self.idle else None
+        if entry is None:
+            entry = self.create()
+
+        ydl = entry['ydl']
+        self.apply(ydl, overrides or {})
+        failed = False
+        try:
+            yield ydl
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self.reset(entry)
+            entry['jobs'] += 1
+            if failed or entry['jobs'] >= self.max_jobs:
+                self.discard(entry)
+            else:
+                with self.lock:
+                    self.idle.append(entry)
+
+    def apply(self, ydl, overrides):
+        for key, value in overrides.items():
+            if key == 'progress_hooks':
+                ydl._progress_hooks = list(value)
+            elif key == 'postprocessor_hooks':
+                ydl._postprocessor_hooks = list(value)
+            elif key == 'outtmpl':
+                # YoutubeDL keeps output templates keyed by type
+                ydl.params['outtmpl'] = value if isinstance(value, dict) else {'default': value}
+            elif key == 'add_postprocessors':
+                # Job-specific (postprocessor, when) pairs, removed on reset
+                for pp, when in value:
+                    ydl.add_post_processor(pp, when=when)
+            elif key == 'format':
+                ydl.params['format'] = value
+                ydl.format_selector = ydl.build_format_selector(value)
+            else:
+                ydl.params[key] = value
+
+    def reset(self, entry):
+        ydl = entry['ydl']
+        ydl.params.clear()
+        ydl.params.update(entry['params'])
+        ydl.format_selector = entry['format_selector']
+        ydl._progress_hooks = []
+        ydl._postprocessor_hooks = []
+        for when, pps in entry['pps'].items():
+            ydl._pps[when] = list(pps)
+        ydl._download_retcode = 0
+
+    def discard(self, entry):
+        try:
+            entry['ydl'].close()
+        except Exception as e:
+            print(f"YoutubeDL close error: {str(e)}")
+        with self.lock:
+            self.recycled += 1
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for entry in idle:
+            entry['ydl'].close()
+
+    def stats(self):
+        with self.lock:
+            return {'created': self.created, 'recycled': self.recycled, 'idle': len(self.idle)}
@@ -1,3 +1,8 @@
+import time
+
+# Startup timings: module import, build, first frame
+STARTUP_BEGIN = time.perf_counter()
+
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.textinput import TextInput
@@ -5,11 +10,8 @@ from kivy.uix.button import Button
 from kivy.uix.label import Label
 from kivy.uix.spinner import Spinner
 from kivy.uix.progressbar import ProgressBar
-from kivy.uix.filechooser import FileChooserListView
-from kivy.uix.popup import Popup
 from kivy.uix.checkbox import CheckBox
 from kivy.uix.scrollview import ScrollView
-from kivy.uix.gridlayout import GridLayout
 from kivy.uix.image import AsyncImage
 from kivy.clock import Clock, mainthread
 from kivy.core.window import Window
@@ -17,26 +19,25 @@ from kivy.core.clipboard import Clipboard
 from kivy.metrics import dp
 from kivy.graphics import Color, Rectangle
 from kivy.properties import StringProperty, BooleanProperty, NumericProperty, ListProperty
-from threading import Thread, Event
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
+import itertools
 import os
-import yt_dlp
-import queue
-import time
-import re
-
-# Colors for UI
-COLORS = {
-    'background': (0.95, 0.95, 0.95, 1),
-    'primary': (0.2, 0.6, 1, 1),
-    'secondary': (0.3, 0.3, 0.3, 1),
-    'success': (0.1, 0.8, 0.3, 1),
-    'warning': (1, 0.6, 0, 1),
-    'danger': (1, 0.3, 0.3, 1),
-    'text': (0.1, 0.1, 0.1, 1),
-    'input_bg': (1, 1, 1, 1),
-    'card_bg': (1, 1, 1, 1),
-    'header_bg': (0.85, 0.85, 0.85, 1),
-}
+
+# Importing these does not import yt_dlp; the engine loads it on first use
+# or when warm_up runs after the first frame
+from download_engine import (DownloadEngine, VIDEO_QUALITIES, AUDIO_QUALITIES, AUDIO_ONLY, FILENAME_FORMATS,
+                             is_playlist_url, summarize_info)
+from archive import DownloadArchive
+from gui_theme import COLORS
+from journal import JobJournal
+from metadata_cache import MetadataCache
+from progress import format_bytes
+from segmented import SEGMENT_CHOICES
+from thumbnail_cache import ThumbnailCache
+from url_ingest import ClipboardWatcher, contains_youtube_url, extract_links
+
+STARTUP_IMPORTED = time.perf_counter()
 
 # Custom CardLayout with background color support
 class CardLayout(BoxLayout):
@@ -52,135 +53,6 @@ class CardLayout(BoxLayout):
         self.rect.pos = self.pos
         self.rect.size = self.size
 
-class FolderChooserPopup(Popup):
-    def __init__(self, callback, **kwargs):
-        super().__init__(**kwargs)
-        self.title = "Select Download Folder"
-        self.size_hint = (0.9, 0.7)
-        self.callback = callback
-
-        layout = BoxLayout(orientation='vertical', spacing=dp(10))
-        
-        self.file_chooser = FileChooserListView(
-            path=os.getcwd(),
-            size_hint=(1, 0.85),
-            dirselect=True
-        )
-        layout.add_widget(self.file_chooser)
-        
-        btn_layout = BoxLayout(size_hint=(1, 0.15), spacing=dp(10))
-        cancel_btn = Button(
-            text="Cancel", 
-            background_color=COLORS['danger'],
-            background_normal='',
-            size_hint=(0.4, 1)
-        )
-        cancel_btn.bind(on_press=self.dismiss)
-        
-        select_btn = Button(
-            text="Select", 
-            background_color=COLORS['success'],
-            background_normal='',
-            size_hint=(0.6, 1)
-        )
-        select_btn.bind(on_press=self.select_folder)
-        
-        btn_layout.add_widget(cancel_btn)
-        btn_layout.add_widget(select_btn)
-        layout.add_widget(btn_layout)
-        
-        self.content = layout
-
-    def select_folder(self, instance):
-        if self.file_chooser.path:
-            self.callback(self.file_chooser.path)
-        self.dismiss()
-
-class VideoInfoPopup(Popup):
-    def __init__(self, videos, callback, **kwargs):
-        super().__init__(**kwargs)
-        self.title = "Select Videos to Download"
-        self.size_hint = (0.9, 0.8)
-        self.callback = callback
-        self.selected_videos = []
-
-        layout = BoxLayout(orientation='vertical', spacing=dp(10))
-        
-        # Header
-        header = GridLayout(cols=3, size_hint=(1, None), height=dp(40))
-        header.add_widget(Label(text='', size_hint=(0.1, 1)))
-        header.add_widget(Label(text='Video Title', bold=True, size_hint=(0.7, 1)))
-        header.add_widget(Label(text='Duration', bold=True, size_hint=(0.2, 1)))
-        layout.add_widget(header)
-        
-        # Scrollable list
-        scroll = ScrollView(size_hint=(1, 0.8))
-        grid = GridLayout(cols=1, size_hint_y=None, spacing=dp(5))
-        grid.bind(minimum_height=grid.setter('height'))
-        
-        for idx, video in enumerate(videos):
-            row = BoxLayout(size_hint_y=None, height=dp(40))
-            
-            # Checkbox
-            chk = CheckBox(size_hint=(0.1, 1), active=True)
-            chk.bind(active=lambda instance, value, idx=idx: self.toggle_video(idx, value))
-            row.add_widget(chk)
-            
-            # Title (truncated)
-            title = video.get('title', f'Video {idx+1}')
-            if len(title) > 40:
-                title = title[:37] + '...'
-            row.add_widget(Label(text=title, size_hint=(0.7, 1), halign='left'))
-            
-            # Duration
-            duration = video.get('duration', 0)
-            minutes, seconds = divmod(duration, 60)
-            duration_str = f'{minutes}:{seconds:02d}'
-            row.add_widget(Label(text=duration_str, size_hint=(0.2, 1)))
-            
-            grid.add_widget(row)
-            self.selected_videos.append(idx)
-        
-        scroll.add_widget(grid)
-        layout.add_widget(scroll)
-        
-        # Buttons
-        btn_layout = BoxLayout(size_hint=(1, 0.1), spacing=dp(10))
-        select_all = Button(text='Select All', size_hint=(0.3, 1))
-        select_all.bind(on_press=lambda x: self.toggle_all(True))
-        select_none = Button(text='Select None', size_hint=(0.3, 1))
-        select_none.bind(on_press=lambda x: self.toggle_all(False))
-        download_btn = Button(text='Download Selected', size_hint=(0.4, 1), 
-                             background_color=COLORS['success'])
-        download_btn.bind(on_press=self.confirm_selection)
-        
-        btn_layout.add_widget(select_all)
-        btn_layout.add_widget(select_none)
-        btn_layout.add_widget(download_btn)
-        layout.add_widget(btn_layout)
-        
-        self.content = layout
-    
-    def toggle_video(self, idx, active):
-        if active:
-            if idx not in self.selected_videos:
-                self.selected_videos.append(idx)
-        else:
-            if idx in self.selected_videos:
-                self.selected_videos.remove(idx)
-    
-    def toggle_all(self, select):
-        self.selected_videos = list(range(len(self.selected_videos))) if select else []
-        for child in self.content.children[1].children[0].children[0].children:
-            if hasattr(child, 'children') and len(child.children) > 0:
-                checkbox = child.children[-1]
-                if isinstance(checkbox, CheckBox):
-                    checkbox.active = select
-    
-    def confirm_selection(self, instance):
-        self.callback(self.selected_videos)
-        self.dismiss()
-
 class YouTubeDownloaderUI(BoxLayout):
     is_fetching = BooleanProperty(False)
     current_progress = NumericProperty(0)
@@ -198,6 +70,7 @@ class YouTubeDownloaderUI(BoxLayout):
         
         # Clipboard monitoring
         self.clipboard_timer = None
+        self.clipboard_watcher = ClipboardWatcher()
         
         # Create a scrollable area
         self.scroll_view = ScrollView(
@@ -243,14 +116,34 @@ class YouTubeDownloaderUI(BoxLayout):
         # Now build the content
         self.build_content()
         
-        # Initialize download queue
-        self.download_queue = queue.Queue()
-        self.active_downloads = []
-        self.max_simultaneous = 3  # Simultaneous downloads
-        self.download_threads = []
+        # Preview thumbnails are fetched and downscaled on their own thread,
+        # never on the engine's resolvers; only the newest preview is loaded
+        self.thumbnails = ThumbnailCache()
+        self.thumbnail_pool = ThreadPoolExecutor(max_workers=1)
+        self.previews = itertools.count(1)
+        self.shown_preview = 0
+        
+        # Queue and workers live in the headless engine
+        self.engine = DownloadEngine(
+            download_folder=self.download_folder,
+            workers=3,
+            metadata_cache=MetadataCache(),
+            journal=JobJournal(),
+            archive=DownloadArchive()
+        )
+        self.engine.add_listener(self.on_engine_event)
+        self.engine.start()
+        
+        # Pick up jobs left unfinished by a previous session
+        restored = self.engine.restore()
+        if restored:
+            self.status_label.text = f'Resumed {len(restored)} unfinished download(s)'
         
-        # Start download processor
-        self.start_download_processor()
+        # Progress is sampled from the engine rather than pushed per chunk
+        self.last_message = ''
+        self.shown_message = ''
+        self.bind(current_progress=self.progress_bar.setter('value'))
+        self.progress_timer = Clock.schedule_interval(self.refresh_progress, 0.1)
 
     def update_rect(self, *args):
         self.rect.pos = self.pos
@@ -366,7 +259,7 @@ class YouTubeDownloaderUI(BoxLayout):
         options_card = CardLayout(
             orientation='vertical',
             size_hint=(1, None),
-            height=dp(250),
+            height=dp(300),
             padding=dp(10),
             spacing=dp(5)
         )
@@ -387,7 +280,7 @@ class YouTubeDownloaderUI(BoxLayout):
         ))
         self.video_quality = Spinner(
             text='1080p',
-            values=('1440p', '2160p (4K)', '1080p', '720p', '480p', '360p', 'Best Available'),
+            values=VIDEO_QUALITIES,
             size_hint=(0.7, 1),
             background_color=COLORS['primary'],
             background_normal='',
@@ -405,7 +298,7 @@ class YouTubeDownloaderUI(BoxLayout):
         ))
         self.audio_quality = Spinner(
             text='192kbps',
-            values=('320kbps', '256kbps', '192kbps', '128kbps', 'Best Available'),
+            values=AUDIO_QUALITIES,
             size_hint=(0.7, 1),
             background_color=COLORS['primary'],
             background_normal='',
@@ -414,6 +307,24 @@ class YouTubeDownloaderUI(BoxLayout):
         audio_layout.add_widget(self.audio_quality)
         options_card.add_widget(audio_layout)
         
+        # Parallel connections per file
+        segments_layout = BoxLayout(size_hint=(1, 0.3))
+        segments_layout.add_widget(Label(
+            text="Connections:", 
+            size_hint=(0.3, 1),
+            color=COLORS['text']
+        ))
+        self.segments = Spinner(
+            text='1',
+            values=SEGMENT_CHOICES,
+            size_hint=(0.7, 1),
+            background_color=COLORS['primary'],
+            background_normal='',
+            color=(1, 1, 1, 1)
+        )
+        segments_layout.add_widget(self.segments)
+        options_card.add_widget(segments_layout)
+        
         # File naming
         file_layout = BoxLayout(size_hint=(1, 0.3))
         file_layout.add_widget(Label(
@@ -423,7 +334,7 @@ class YouTubeDownloaderUI(BoxLayout):
         ))
         self.filename_format = Spinner(
             text='Title Only',
-            values=('Title Only', 'Title + Quality', 'ID + Title', 'Custom'),
+            values=FILENAME_FORMATS,
             size_hint=(0.7, 1),
             background_color=COLORS['primary'],
             background_normal='',
@@ -508,9 +419,29 @@ class YouTubeDownloaderUI(BoxLayout):
             bold=True
         )
         self.download_button.bind(on_press=self.on_download)
+        self.video_quality.bind(text=self.on_quality_change)
         download_card.add_widget(self.download_button)
         self.content_layout.add_widget(download_card)
-        
+
+        # Queue controls: act on every job that is waiting or downloading
+        controls_card = CardLayout(
+            orientation='horizontal',
+            size_hint=(1, None),
+            height=dp(60),
+            padding=dp(10),
+            spacing=dp(10)
+        )
+        for text, action in (('Pause All', 'pause'), ('Resume All', 'resume'), ('Cancel All', 'cancel')):
+            button = Button(
+                text=text,
+                background_color=COLORS['secondary'],
+                background_normal='',
+                color=(1, 1, 1, 1)
+            )
+            button.bind(on_press=lambda instance, action=action: self.control_jobs(action))
+            controls_card.add_widget(button)
+        self.content_layout.add_widget(controls_card)
+
         # Clipboard monitoring
         clipboard_card = CardLayout(
             orientation='vertical',
@@ -542,14 +473,19 @@ class YouTubeDownloaderUI(BoxLayout):
         self.toggle_clipboard_monitor(None, True)
 
     def choose_folder(self, instance):
+        from gui_popups import FolderChooserPopup
         FolderChooserPopup(self.set_download_folder).open()
 
     @mainthread
     def set_download_folder(self, path):
         self.download_folder = path
+        self.engine.download_folder = path
         self.folder_label.text = path
         self.status_label.text = f'Folder set to: {os.path.basename(path)}'
 
+    def on_quality_change(self, instance, value):
+        self.download_button.text = 'Download Audio' if value in AUDIO_ONLY else 'Download MP4'
+
     def paste_from_clipboard(self, instance):
         clipboard_text = Clipboard.paste()
         if clipboard_text:
@@ -569,71 +505,58 @@ class YouTubeDownloaderUI(BoxLayout):
     def check_clipboard(self, dt):
         try:
             clipboard_text = Clipboard.paste()
-            if self.is_youtube_url(clipboard_text) and clipboard_text != self.url_input.text:
+            # Unchanged clipboard contents are not rescanned
+            if not self.clipboard_watcher.changed(clipboard_text):
+                return
+            if contains_youtube_url(clipboard_text) and clipboard_text != self.url_input.text:
                 self.url_input.text = clipboard_text
                 self.status_label.text = 'YouTube URL detected in clipboard!'
         except:
             pass
 
-    def is_youtube_url(self, text):
-        patterns = [
-            r'https?://(www\.)?youtube\.com/watch\?v=',
-            r'https?://youtu\.be/',
-            r'https?://(www\.)?youtube\.com/playlist\?list='
-        ]
-        return any(re.search(pattern, text) for pattern in patterns)
-
     def on_download(self, instance):
         urls = self.url_input.text.strip()
         if not urls:
             self.set_status('Please enter YouTube URLs')
             return
             
-        # Split URLs by comma or newline
-        url_list = [url.strip() for url in urls.replace('\n', ',').split(',') if url.strip()]
+        # YouTube links are canonicalised and deduplicated; other http(s)
+        # links go to yt-dlp as typed
+        url_list = extract_links(urls)
+        if not url_list:
+            self.set_status('No URLs found')
+            return
         
         # Process each URL
         for url in url_list:
-            if 'playlist?list=' in url:
+            if is_playlist_url(url):
                 self.process_playlist(url)
             else:
                 self.add_to_queue(url)
 
     def process_playlist(self, url):
         self.set_status(f'Fetching playlist info...')
-        Thread(target=self.fetch_playlist_info, args=(url,), daemon=True).start()
+        mode = self.playlist_option.text
+        if mode == 'Select Videos':
+            Thread(target=self.fetch_playlist_info, args=(url,), daemon=True).start()
+        else:
+            # Playlist entries yield to URLs submitted one by one
+            options = dict(self.job_options(), priority='low')
+            Thread(target=self.stream_playlist, args=(url, mode, options), daemon=True).start()
+
+    def stream_playlist(self, url, mode, options):
+        # Entries are queued page by page as the listing comes in
+        try:
+            job_ids = self.engine.submit_playlist(url, mode=mode, **options)
+            self.set_status(f'Queued {len(job_ids)} new video(s) from playlist')
+        except Exception as e:
+            self.set_status(f'Error: {str(e)}')
 
     def fetch_playlist_info(self, url):
+        # The selection popup needs the complete listing up front
         try:
-            ydl = yt_dlp.YoutubeDL({
-                'quiet': True,
-                'extract_flat': 'in_playlist',
-                'ignoreerrors': True
-            })
-            info = ydl.extract_info(url, download=False)
-            
-            if not info or 'entries' not in info:
-                self.set_status('Error: Could not fetch playlist info')
-                return
-                
-            self.playlist_videos = []
-            for entry in info['entries']:
-                if entry:
-                    self.playlist_videos.append({
-                        'url': entry.get('url', ''),
-                        'title': entry.get('title', ''),
-                        'duration': entry.get('duration', 0)
-                    })
-            
-            if self.playlist_option.text == 'Download All':
-                for video in self.playlist_videos:
-                    self.add_to_queue(video['url'])
-            elif self.playlist_option.text == 'Download First':
-                if self.playlist_videos:
-                    self.add_to_queue(self.playlist_videos[0]['url'])
-            else:  # Select Videos
-                self.show_video_selection()
-                
+            self.playlist_videos = self.engine.fetch_playlist_info(url)
+            self.show_video_selection()
         except Exception as e:
             self.set_status(f'Error: {str(e)}')
 
@@ -643,210 +566,153 @@ class YouTubeDownloaderUI(BoxLayout):
             self.set_status('No videos in playlist')
             return
             
+        from gui_popups import VideoInfoPopup
         VideoInfoPopup(
             videos=self.playlist_videos,
             callback=self.download_selected_videos
         ).open()
 
     def download_selected_videos(self, selected_indices):
-        for idx in selected_indices:
-            if idx < len(self.playlist_videos):
-                self.add_to_queue(self.playlist_videos[idx]['url'])
+        # Options are read here on the UI thread; each submit touches the
+        # archive and the journal, so they run on a thread of their own
+        urls = [self.playlist_videos[idx]['url'] for idx in selected_indices
+                if idx < len(self.playlist_videos)]
+        options = dict(self.job_options(), priority='low')
+        self.set_status(f'Queueing {len(urls)} video(s)...')
+        Thread(target=self.submit_selected, args=(urls, options), daemon=True).start()
+
+    def submit_selected(self, urls, options):
+        queued = 0
+        try:
+            for url in urls:
+                if self.engine.submit(url, **options) is not None:
+                    queued += 1
+        except Exception as e:
+            self.set_status(f'Error: {str(e)}')
+            return
+        self.report_selected(queued, len(urls) - queued)
 
-    def add_to_queue(self, url):
-        self.download_queue.put({
-            'url': url,
+    @mainthread
+    def report_selected(self, queued, skipped):
+        message = f'Queued {queued} video(s)'
+        if skipped:
+            message += f', {skipped} already downloaded'
+        self.status_label.text = message
+
+    def job_options(self):
+        return {
             'video_quality': self.video_quality.text,
             'audio_quality': self.audio_quality.text,
-            'filename_format': self.filename_format.text
-        })
-        self.set_status(f'Added to queue: {url[:50]}...')
-        self.update_preview(url)
+            'filename_format': self.filename_format.text,
+            'download_folder': self.download_folder,
+            'segments': int(self.segments.text),
+        }
 
-    def update_preview(self, url):
-        Thread(target=self.fetch_video_info, args=(url,), daemon=True).start()
+    def add_to_queue(self, url, priority='normal'):
+        # The preview is filled in from the engine's 'resolved' event
+        job_id = self.engine.submit(url, priority=priority, **self.job_options())
+        if job_id is None:
+            self.set_status(f'Already downloaded: {url[:50]}...')
 
-    def fetch_video_info(self, url):
-        try:
-            ydl = yt_dlp.YoutubeDL({
-                'quiet': True,
-                'ignoreerrors': True
-            })
-            info = ydl.extract_info(url, download=False)
-            
-            if not info:
-                return
-                
-            # Get available formats
-            formats = info.get('formats', [])
-            resolutions = set()
-            audio_qualities = set()
-            
-            for f in formats:
-                if f.get('vcodec') != 'none':  # Video format
-                    res = f.get('format_note', '')
-                    if res:
-                        resolutions.add(res)
-                elif f.get('acodec') != 'none':  # Audio format
-                    abr = f.get('abr', 0)
-                    if abr:
-                        audio_qualities.add(f'{int(abr)}kbps')
-            
-            # Sort and format resolutions
-            resolution_order = ['1440p', '1080p', '720p', '480p', '360p', '240p', '144p']
-            sorted_res = sorted(resolutions, key=lambda x: resolution_order.index(x) if x in resolution_order else 100)
-            res_text = ', '.join(sorted_res) if sorted_res else 'N/A'
-            
-            # Sort audio qualities
-            sorted_audio = sorted(audio_qualities, key=lambda x: int(x.replace('kbps', '')), reverse=True)
-            audio_text = ', '.join(sorted_audio) if sorted_audio else 'N/A'
-            
-            # Duration
-            duration = info.get('duration', 0)
-            minutes, seconds = divmod(duration, 60)
-            hours, minutes = divmod(minutes, 60)
-            if hours > 0:
-                duration_str = f'{hours}:{minutes:02d}:{seconds:02d}'
-            else:
-                duration_str = f'{minutes}:{seconds:02d}'
-            
-            # Update UI
-            self.update_preview_ui(
-                title=info.get('title', 'N/A'),
-                duration=duration_str,
-                resolutions=res_text,
-                audio=audio_text,
-                thumbnail=info.get('thumbnail', '')
-            )
-            
-        except Exception as e:
-            print(f"Preview error: {str(e)}")
+    def control_jobs(self, action):
+        # Engine pause/resume/cancel on every job; those in a state the
+        # action doesn't apply to are left alone, and running downloads stop
+        # at their next chunk
+        action = getattr(self.engine, action)
+        changed = sum(1 for job in self.engine.status() if action(job['id']))
+        self.set_status(f'{changed} job(s) updated' if changed else 'No jobs to update')
 
     @mainthread
-    def update_preview_ui(self, title, duration, resolutions, audio, thumbnail):
+    def update_preview_ui(self, title, duration, resolutions, audio, thumbnail, size='N/A'):
         self.title_label.text = title
-        self.duration_label.text = f'Duration: {duration}'
+        self.duration_label.text = f'Duration: {duration}    Estimated size: {size}'
         self.resolution_label.text = f'Available Resolutions: {resolutions}'
         self.audio_label.text = f'Available Audio: {audio}'
         self.thumbnail.source = thumbnail
 
-    def start_download_processor(self):
-        for _ in range(self.max_simultaneous):
-            thread = Thread(target=self.download_worker, daemon=True)
-            thread.start()
-            self.download_threads.append(thread)
-
-    def download_worker(self):
-        while True:
-            item = self.download_queue.get()
-            if item is None:  # Exit signal
-                break
-            self.download_video(item)
-            self.download_queue.task_done()
-
-    def download_video(self, item):
-        url = item['url']
-        video_quality = item['video_quality']
-        audio_quality = item['audio_quality']
-        filename_format = item['filename_format']
-        
-        try:
-            # Create the download directory if it doesn't exist
-            os.makedirs(self.download_folder, exist_ok=True)
-            
-            # Format selection based on quality
-            format_string = self.get_format_string(video_quality, audio_quality)
-            
-            # Filename template
-            out_template = self.get_filename_template(filename_format)
-            
-            ydl_opts = {
-                'format': format_string,
-                'outtmpl': os.path.join(self.download_folder, out_template),
-                'progress_hooks': [self.progress_hook],
-                'restrictfilenames': True,
-                'merge_output_format': 'mp4',
-                'noplaylist': True,
-            }
-
-            self.set_status(f'Starting download: {url[:50]}...')
-            self.set_progress(0)
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-                
-            self.set_status(f'Download completed: {url[:50]}...')
-            self.set_progress(100)
-            
-        except Exception as e:
-            self.set_status(f'Error: {str(e)}')
-            
-        time.sleep(1)  # Brief pause between downloads
-
-    def get_format_string(self, video_quality, audio_quality):
-        # Map quality names to format specifications
-        video_map = {
-            '2160p (4K)': 'bestvideo[height<=2160][ext=mp4]',
-            '1440p': 'bestvideo[height<=1440][ext=mp4]',
-            '1080p': 'bestvideo[height<=1080][ext=mp4]',
-            '720p': 'bestvideo[height<=720][ext=mp4]',
-            '480p': 'bestvideo[height<=480][ext=mp4]',
-            '360p': 'bestvideo[height<=360][ext=mp4]',
-            'Best Available': 'bestvideo[ext=mp4]'
-        }
-        
-        audio_map = {
-            '320kbps': 'bestaudio[abr>=320]',
-            '256kbps': 'bestaudio[abr>=256]',
-            '192kbps': 'bestaudio[abr>=192]',
-            '128kbps': 'bestaudio[abr>=128]',
-            'Best Available': 'bestaudio'
-        }
-        
-        video_fmt = video_map.get(video_quality, 'bestvideo[ext=mp4]')
-        audio_fmt = audio_map.get(audio_quality, 'bestaudio')
-        
-        return f'{video_fmt}+{audio_fmt}/best'
+    def on_engine_event(self, event, job):
+        # Called from engine worker threads; picked up by refresh_progress
+        if event == 'resolved':
+            summary = summarize_info(job['info'], job.get('plan'))
+            preview = self.shown_preview = next(self.previews)
+            remote = summary['thumbnail']
+            summary['thumbnail'] = ''  # until load_thumbnail has the local copy
+            self.update_preview_ui(**summary)
+            self.thumbnail_pool.submit(self.load_thumbnail, preview, job['info'].get('id'), remote)
+            return
+        if event == 'evicted':
+            return
+        self.last_message = job['message']
 
-    def get_filename_template(self, format_option):
-        templates = {
-            'Title Only': '%(title)s.%(ext)s',
-            'Title + Quality': '%(title)s [%(resolution)s].%(ext)s',
-            'ID + Title': '%(id)s - %(title)s.%(ext)s',
-            'Custom': '%(title)s.%(ext)s'  # Default if custom not implemented
-        }
-        return templates.get(format_option, '%(title)s.%(ext)s')
-
-    def progress_hook(self, d):
-        if d['status'] == 'downloading':
-            percent_str = d.get('_percent_str', '').replace('%', '').strip()
-            try:
-                percent_float = float(percent_str)
-                self.set_progress(percent_float)
-                self.set_status(f"Downloading... {percent_float:.1f}%")
-            except:
-                pass
-        elif d['status'] == 'finished':
-            self.set_status('Finalizing MP4 file...')
+    def load_thumbnail(self, preview, video_id, url):
+        # Runs on the thumbnail thread. Previews replaced while this one
+        # waited (playlist entries resolving in a burst) are never fetched.
+        if preview != self.shown_preview or not url:
+            return
+        # Show the cached, downscaled copy instead of the remote original
+        source = self.thumbnails.get(video_id, url) or url
+        Clock.schedule_once(lambda dt: self.show_thumbnail(preview, source))
+
+    def show_thumbnail(self, preview, source):
+        if preview == self.shown_preview:
+            self.thumbnail.source = source
+
+    def refresh_progress(self, dt):
+        snapshot = self.engine.progress.snapshot()
+        if snapshot['active_jobs']:
+            self.current_progress = snapshot['percent']
+            self.status_label.text = (
+                f"Downloading {snapshot['active_jobs']} job(s): {snapshot['percent']:.1f}% "
+                f"at {format_bytes(snapshot['speed'])}/s"
+            )
+            self.shown_message = ''
+        elif self.last_message != self.shown_message:
+            if snapshot['finished_jobs']:
+                self.current_progress = 100
+            self.status_label.text = self.last_message
+            self.shown_message = self.last_message
 
     @mainthread
     def set_status(self, message):
         self.status_label.text = message
 
-    @mainthread
-    def set_progress(self, value):
-        self.current_progress = value
-
 class YouTubeDownloaderApp(App):
     def build(self):
+        build_begin = time.perf_counter()
         Window.minimum_width = dp(800)
         Window.minimum_height = dp(700)
-        return YouTubeDownloaderUI()
+        root = YouTubeDownloaderUI()
+        self.startup = {
+            'import': STARTUP_IMPORTED - STARTUP_BEGIN,
+            'build': time.perf_counter() - build_begin,
+        }
+        return root
+
+    def on_start(self):
+        # Runs on the first clock tick after the window has been drawn
+        Clock.schedule_once(self.on_first_frame, 0)
+
+    def on_first_frame(self, dt):
+        self.startup['first_frame'] = time.perf_counter() - STARTUP_BEGIN
+        print(f"Startup: import {self.startup['import']:.2f}s, build {self.startup['build']:.2f}s, "
+              f"first frame {self.startup['first_frame']:.2f}s")
+        # Load yt_dlp now, off the UI thread, so the first preview doesn't pay for it
+        Thread(target=self.warm_up, daemon=True).start()
+
+    def warm_up(self):
+        try:
+            self.startup['warm_up'] = self.root.engine.warm_up()
+        except Exception as e:
+            print(f"Warm-up error: {str(e)}")
     
     def on_stop(self):
         # Clean up clipboard monitoring
         if self.root.clipboard_timer:
             self.root.clipboard_timer.cancel()
+        self.root.progress_timer.cancel()
+        self.root.thumbnail_pool.shutdown(wait=False, cancel_futures=True)
+        # Running downloads stop here and resume next time from the journal
+        self.root.engine.stop()
 
 
 if __name__ == '__main__':